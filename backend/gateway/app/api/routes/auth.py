@@ -1,43 +1,102 @@
-from fastapi import APIRouter, FastAPI, HTTPException, Response
+import os
+from typing import Optional
+from fastapi import APIRouter, FastAPI, HTTPException, Response, Depends, Cookie
 from pydantic import BaseModel
-import httpx
 
 from app.core.security import create_access_token
+from app.core.clients import clients
+from app.core.ratelimit import limit_by_ip
+from app.core.sessions import session_store, RefreshTokenReused, REFRESH_TOKEN_TTL
 
-router = APIRouter(prefix="/auth", tags=["auth"])
+#only sent back to /auth, so the refresh token never rides along on ordinary API calls
+REFRESH_COOKIE = "refresh_token"
+REFRESH_COOKIE_PATH = "/auth"
+COOKIE_SECURE = os.getenv("COOKIE_SECURE", "false").lower() == "true"
 
-USERS_SERVICE_URL = "http://user_service:8000"
+router = APIRouter(prefix="/auth", tags=["auth"])
 
 class LoginRequest(BaseModel):
     username: str
     password: str
     
 
-@router.post("/login")
+def set_refresh_cookie(response: Response, refresh_token: str):
+    response.set_cookie(
+        key=REFRESH_COOKIE,
+        value=refresh_token,
+        max_age=REFRESH_TOKEN_TTL,
+        path=REFRESH_COOKIE_PATH,
+        httponly=True,
+        secure=COOKIE_SECURE,
+        samesite="lax"
+    )
+
+
+def clear_refresh_cookie(response: Response):
+    response.delete_cookie(key=REFRESH_COOKIE, path=REFRESH_COOKIE_PATH, httponly=True, secure=COOKIE_SECURE, samesite="lax")
+
+
+def token_response(user: dict) -> dict:
+    return {
+        "access_token": create_access_token(user["user_id"], user["username"], user["active"]),
+        "token_type": "bearer"
+    }
+
+
+@router.post("/login", dependencies=[Depends(limit_by_ip("login"))])
 async def login(data: LoginRequest, response: Response):
     
-    async with httpx.AsyncClient() as client:
-        res = await client.post(f"{USERS_SERVICE_URL}/auth/verify", json=data.model_dump(), timeout=5.0)
-        
-    if res.status_code != 200:
+    res = await clients["user"].post("/auth/verify", json=data.model_dump())
+
+    if res.status_code == 401:
         raise HTTPException(status_code=401, detail="Invalid username or password")
     
+    #user_service sheds bcrypt work with 429 + Retry-After under load; that is not a wrong password
+    if res.status_code == 429:
+        headers = {"Retry-After": res.headers["Retry-After"]} if "Retry-After" in res.headers else None
+        raise HTTPException(status_code=429, detail="Too many login attempts in progress, try again shortly", headers=headers)
+    
+    if res.status_code != 200:
+        raise HTTPException(status_code=502 if res.status_code < 500 else 503, detail="Authentication is unavailable, try again shortly")
+    
     user_data = res.json()
     
     if not user_data["active"]:
         raise HTTPException(status_code=403, detail="User is not active")
     
-    access_token = create_access_token(user_data["user_id"])
+    refresh_token = await session_store.create(user_data)
+    set_refresh_cookie(response, refresh_token)
     
-    response.set_cookie(
-        key="refresh_token",
-        value="fake-refresh-token",
-        httponly=True,
-        secure=False,
-        samesite="lax"
-    )
+    return token_response(user_data)
+
+
+#new access token from the refresh cookie: no password and no bcrypt, just Redis
+@router.post("/refresh", dependencies=[Depends(limit_by_ip("refresh"))])
+async def refresh(response: Response, refresh_token: Optional[str] = Cookie(default=None)):
     
-    return {
-        "access_token": access_token,
-        "token_type": "bearer"
-    }
\ No newline at end of file
+    if not refresh_token:
+        raise HTTPException(status_code=401, detail="Missing refresh token")
+    
+    try:
+        rotated = await session_store.rotate(refresh_token)
+    except RefreshTokenReused:
+        raise HTTPException(status_code=401, detail="Refresh token already used, please log in again")
+    
+    if rotated is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+    
+    user_data, new_refresh_token = rotated
+    set_refresh_cookie(response, new_refresh_token)
+    
+    return token_response(user_data)
+
+
+@router.post("/logout", status_code=204)
+async def logout(refresh_token: Optional[str] = Cookie(default=None)):
+    
+    if refresh_token:
+        await session_store.revoke_token(refresh_token)
+    
+    response = Response(status_code=204)
+    clear_refresh_cookie(response)
+    return response
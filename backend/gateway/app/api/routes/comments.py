@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Depends
+from pydantic import BaseModel, Field
+
+from app.deps import get_current_user, identity_headers
+from app.core.proxy import relay
+from app.core.clients import clients
+from app.core.ratelimit import limit_by_user
+from common.identity import Identity
+
+router = APIRouter(prefix="/comments", tags=["comments"])
+
+class CommentCreateRequest(BaseModel):
+    post_id: str
+    content: str = Field(..., min_length=1, max_length=500)
+    
+class CommentEditRequest(BaseModel):
+    content: str = Field(..., min_length=1, max_length=500)
+    
+
+@router.post("", status_code=201, dependencies=[Depends(limit_by_user("writes"))])
+async def create_comment(data: CommentCreateRequest, user: Identity = Depends(get_current_user)):
+    
+    #the author comes from the token, never from the request body
+    comment = {**data.model_dump(), "user_id": user.user_id, "username": user.username}
+    
+    res = await clients["comment"].post("/comments", json=comment, headers=identity_headers(user))
+    return relay(res)
+
+
+@router.put("/{comment_id}")
+async def edit_comment(comment_id: str, data: CommentEditRequest, user: Identity = Depends(get_current_user)):
+    
+    res = await clients["comment"].put(f"/comments/{user.user_id}/{comment_id}", json=data.model_dump(), headers=identity_headers(user))
+    return relay(res)
+
+
+@router.delete("/{comment_id}")
+async def delete_comment(comment_id: str, user: Identity = Depends(get_current_user)):
+    
+    res = await clients["comment"].delete(f"/comments/delete/{user.user_id}/{comment_id}", headers=identity_headers(user))
+    return relay(res)
@@ -0,0 +1,93 @@
+from fastapi import APIRouter, Query
+from pydantic import BaseModel
+from typing import Optional
+import asyncio
+import logging
+import httpx
+import os
+
+from app.core.proxy import relay
+from app.core.clients import clients
+
+router = APIRouter(prefix="/api/posts", tags=["pages"])
+
+logger = logging.getLogger(__name__)
+
+PAGE_COMMENTS_LIMIT = int(os.getenv("PAGE_COMMENTS_LIMIT", "20"))
+#comments and author profiles are optional; past this budget the page is returned without them
+PAGE_OPTIONAL_TIMEOUT = float(os.getenv("PAGE_OPTIONAL_TIMEOUT", "1.0"))
+
+class PostPage(BaseModel):
+    post: dict
+    comments: list[dict]
+    next_cursor: Optional[str] = None
+    authors: dict[str, dict]
+    partial: bool = False
+    missing: list[str] = []
+
+
+async def fetch_optional(part: str, missing: list[str], upstream: str, method: str, path: str, **kwargs):
+    try:
+        res = await asyncio.wait_for(clients[upstream].request(method, path, **kwargs), PAGE_OPTIONAL_TIMEOUT)
+        res.raise_for_status()
+        return res.json()
+    except (asyncio.TimeoutError, httpx.HTTPError) as e:
+        logger.warning("Post page served without %s: %r", part, e)
+        missing.append(part)
+        return None
+
+
+async def fetch_authors(user_ids: list[str], missing: list[str]) -> dict[str, dict]:
+    if not user_ids:
+        return {}
+
+    body = await fetch_optional("authors", missing, "user", "POST", "/users:batch", json={"user_ids": user_ids})
+    if body is None:
+        return {}
+
+    return {profile["user_id"]: profile for profile in body["users"] if profile}
+
+
+@router.get("/{post_id}/page", response_model=PostPage)
+async def get_post_page(post_id: str, limit: int = Query(default=PAGE_COMMENTS_LIMIT, ge=1, le=100)):
+
+    missing = []
+
+    #post and comments in parallel; one extra comment tells us whether there is a next page
+    comments_task = asyncio.create_task(fetch_optional(
+        "comments", missing, "comment", "GET", f"/posts/{post_id}/comments", params={"limit": limit + 1}
+    ))
+
+    try:
+        post_res = await clients["post"].get(f"/posts/{post_id}")
+    except httpx.HTTPError:
+        comments_task.cancel()
+        raise
+
+    if post_res.status_code >= 400:
+        comments_task.cancel()
+        return relay(post_res)
+
+    post = post_res.json()
+
+    #the author lookup starts while comments may still be in flight
+    author_task = asyncio.create_task(fetch_authors([post["user_id"]], missing))
+
+    comments = await comments_task or []
+    next_cursor = None
+    if len(comments) > limit:
+        comments = comments[:limit]
+        next_cursor = comments[-1]["comment_id"]
+
+    #each commenter looked up once, and never the post author twice
+    commenter_ids = list(dict.fromkeys(comment["user_id"] for comment in comments if comment["user_id"] != post["user_id"]))
+    authors, commenters = await asyncio.gather(author_task, fetch_authors(commenter_ids, missing))
+
+    return PostPage(
+        post=post,
+        comments=comments,
+        next_cursor=next_cursor,
+        authors={**authors, **commenters},
+        partial=bool(missing),
+        missing=sorted(set(missing))
+    )
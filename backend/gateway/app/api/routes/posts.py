@@ -0,0 +1,69 @@
+from fastapi import APIRouter, Depends, Request
+from pydantic import BaseModel, Field
+from typing import Optional
+
+from app.deps import get_current_user, identity_headers
+from app.core.proxy import relay
+from app.core.clients import clients
+from app.core.cache import cached_get
+from app.core.ratelimit import limit_by_user
+from common.identity import Identity
+
+router = APIRouter(prefix="/posts", tags=["posts"])
+
+class PostCreateRequest(BaseModel):
+    title: str = Field(..., min_length=1, max_length=200)
+    content: str = Field(..., min_length=1, max_length=5000)
+    category: str = "Other"
+    
+class PostEditRequest(BaseModel):
+    title: Optional[str] = Field(default=None, min_length=1, max_length=200)
+    content: Optional[str] = Field(default=None, min_length=1, max_length=5000)
+    
+
+@router.get("/{post_id}")
+async def get_post(post_id: str, request: Request):
+    return await cached_get(request, "post", f"/posts/{post_id}")
+
+
+@router.get("/{post_id}/summary")
+async def get_post_summary(post_id: str, request: Request):
+    return await cached_get(request, "post", f"/posts/{post_id}/summary")
+
+
+@router.post("", status_code=201, dependencies=[Depends(limit_by_user("writes"))])
+async def create_post(data: PostCreateRequest, user: Identity = Depends(get_current_user)):
+    
+    #the author comes from the token, never from the request body
+    post = {**data.model_dump(), "user_id": user.user_id, "username": user.username}
+    
+    res = await clients["post"].post("/posts", json=post, headers=identity_headers(user))
+    return relay(res)
+
+
+@router.put("/{post_id}")
+async def edit_post(post_id: str, data: PostEditRequest, user: Identity = Depends(get_current_user)):
+    
+    res = await clients["post"].put(f"/posts/{user.user_id}/{post_id}", json=data.model_dump(), headers=identity_headers(user))
+    return relay(res)
+
+
+@router.delete("/{post_id}")
+async def delete_post(post_id: str, user: Identity = Depends(get_current_user)):
+    
+    res = await clients["post"].delete(f"/posts/delete/{user.user_id}/{post_id}", headers=identity_headers(user))
+    return relay(res)
+
+
+@router.put("/{post_id}/like", dependencies=[Depends(limit_by_user("reactions"))])
+async def like_post(post_id: str, user: Identity = Depends(get_current_user)):
+    
+    res = await clients["post"].put(f"/posts/{post_id}/like", headers=identity_headers(user))
+    return relay(res)
+
+
+@router.put("/{post_id}/dislike", dependencies=[Depends(limit_by_user("reactions"))])
+async def dislike_post(post_id: str, user: Identity = Depends(get_current_user)):
+    
+    res = await clients["post"].put(f"/posts/{post_id}/dislike", headers=identity_headers(user))
+    return relay(res)
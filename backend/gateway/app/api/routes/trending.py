@@ -0,0 +1,10 @@
+from fastapi import APIRouter, Request
+
+from app.core.cache import cached_get
+
+router = APIRouter(prefix="/trending", tags=["trending"])
+
+
+@router.get("/{path:path}")
+async def get_trending(path: str, request: Request):
+    return await cached_get(request, "trending", f"/trending/{path}")
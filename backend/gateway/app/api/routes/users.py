@@ -0,0 +1,11 @@
+from fastapi import APIRouter, Request
+
+from app.core.cache import cached_get
+
+router = APIRouter(prefix="/users", tags=["users"])
+
+
+@router.get("/{user_id}")
+async def get_user(user_id: str, request: Request):
+    #public, so only the profile view; the full record carries the email
+    return await cached_get(request, "user", f"/users/{user_id}/profile")
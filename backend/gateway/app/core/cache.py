@@ -0,0 +1,216 @@
+import os
+import re
+import time
+import logging
+import threading
+import httpx
+import redis
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Optional
+from fastapi import Request, Response
+
+from app.core.clients import clients
+from common.http_cache import HTTP_INVALIDATION_CHANNEL, etag_matches
+from common.tracing import trace_redis
+
+REDIS_HOST = os.getenv("REDIS_HOST", "redis")
+
+RESPONSE_CACHE_ENTRIES = int(os.getenv("RESPONSE_CACHE_ENTRIES", "5000"))
+RESPONSE_CACHE_BYTES = int(os.getenv("RESPONSE_CACHE_BYTES", str(64 * 1024 * 1024)))
+#recent invalidations remembered to check fills against; a fill older than all of them is refused
+RESPONSE_CACHE_INVALIDATION_LOG = int(os.getenv("RESPONSE_CACHE_INVALIDATION_LOG", "1024"))
+
+#response headers worth keeping with a cached body
+KEPT_HEADERS = ("content-type", "etag", "cache-control")
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    headers: dict[str, str]
+    etag: str
+    expires: float
+
+
+def shared_max_age(cache_control: str) -> Optional[int]:
+    """Seconds a shared cache may reuse a response, or None if it must not be stored."""
+    directives = {part.strip().split("=")[0].lower(): part.strip() for part in cache_control.split(",") if part.strip()}
+
+    if "no-store" in directives or "private" in directives:
+        return None
+
+    for directive in ("s-maxage", "max-age"):
+        if directive in directives:
+            match = re.search(r"=(\d+)", directives[directive])
+            return int(match.group(1)) if match else None
+
+    return None
+
+
+def covers(path: str, key: str) -> bool:
+    #"/posts/<id>" covers "/posts/<id>", "/posts/<id>/summary" and any query variants
+    return key == path or key.startswith((path + "/", path + "?"))
+
+
+class ResponseCache:
+    """Bounded LRU of upstream GET responses keyed by path and query.
+
+    Entries are stored only with an ETag and a positive s-maxage/max-age. Fresh
+    entries are served without calling the upstream; stale ones are revalidated
+    with If-None-Match. Services publish changed paths on HTTP_INVALIDATION_CHANNEL.
+
+    Each invalidation bumps a generation. A fill passes the generation it read
+    before calling the upstream, and is dropped if its key was invalidated since,
+    so a response fetched before a change cannot be cached after it.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_ENTRIES, max_bytes: int = RESPONSE_CACHE_BYTES,
+                 client: Optional[redis.Redis] = None, invalidation_log: int = RESPONSE_CACHE_INVALIDATION_LOG):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.client = client or trace_redis(redis.Redis(host=REDIS_HOST, port=6379, decode_responses=True))
+
+        self._entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self._bytes = 0
+        self._generation = 0
+        self._invalidated: deque[tuple[int, str]] = deque(maxlen=invalidation_log)
+        self._lock = threading.Lock()
+        self._listener = None
+        self._stats = {"hits": 0, "revalidated": 0, "misses": 0, "not_modified": 0, "invalidations": 0,
+                       "evictions": 0, "stale_fills": 0}
+
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def store(self, key: str, res: httpx.Response, generation: Optional[int] = None):
+        etag = res.headers.get("etag")
+        max_age = shared_max_age(res.headers.get("cache-control", ""))
+
+        if res.status_code != 200 or not etag or not max_age or len(res.content) > self.max_bytes:
+            return
+
+        entry = CachedResponse(
+            body=res.content,
+            headers={name: res.headers[name] for name in KEPT_HEADERS if name in res.headers},
+            etag=etag,
+            expires=time.monotonic() + max_age
+        )
+
+        with self._lock:
+            if generation is not None and self._invalidated_since(key, generation):
+                self._stats["stale_fills"] += 1
+                return
+
+            self._remove(key)
+            self._entries[key] = entry
+            self._bytes += len(entry.body)
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.body)
+                self._stats["evictions"] += 1
+
+    def refresh(self, entry: CachedResponse, res: httpx.Response):
+        max_age = shared_max_age(res.headers.get("cache-control", "")) or 0
+        entry.expires = time.monotonic() + max_age
+
+    def invalidate(self, path: str):
+        with self._lock:
+            self._generation += 1
+            self._invalidated.append((self._generation, path))
+
+            stale = [key for key in self._entries if covers(path, key)]
+            for key in stale:
+                self._remove(key)
+            self._stats["invalidations"] += len(stale)
+
+    def count(self, stat: str):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries), bytes=self._bytes)
+
+        lookups = stats["hits"] + stats["revalidated"] + stats["misses"]
+        stats["upstream_saved_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+    def start(self):
+        try:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{HTTP_INVALIDATION_CHANNEL: lambda message: self.invalidate(message["data"])})
+            self._listener = pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+        except redis.RedisError as e:
+            logger.warning("Response cache invalidation listener not started, relying on max-age: %s", e)
+
+    def close(self):
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+    def _invalidated_since(self, key: str, generation: int) -> bool:
+        if generation == self._generation:
+            return False
+        #the log no longer reaches back to the fill's generation, so assume the worst
+        if not self._invalidated or self._invalidated[0][0] > generation + 1:
+            return True
+        return any(seen > generation and covers(path, key) for seen, path in self._invalidated)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry.body)
+
+
+response_cache = ResponseCache()
+
+
+def cached_entry_response(entry: CachedResponse, if_none_match: str) -> Response:
+    if etag_matches(if_none_match, entry.etag):
+        response_cache.count("not_modified")
+        return Response(status_code=304, headers={"ETag": entry.etag, "Cache-Control": entry.headers.get("cache-control", "")})
+
+    return Response(content=entry.body, status_code=200, headers=entry.headers)
+
+
+async def cached_get(request: Request, upstream: str, path: str) -> Response:
+    """GET through the shared response cache, answering If-None-Match locally when possible."""
+    key = f"{path}?{request.url.query}" if request.url.query else path
+    if_none_match = request.headers.get("if-none-match", "")
+    entry = response_cache.get(key)
+    #read before the upstream call; an invalidation landing while it is in flight voids the fill
+    generation = response_cache.generation()
+
+    if entry is not None and entry.expires > time.monotonic():
+        response_cache.count("hits")
+        return cached_entry_response(entry, if_none_match)
+
+    headers = {"If-None-Match": entry.etag} if entry is not None else {}
+    res = await clients[upstream].get(path, params=request.query_params, headers=headers)
+
+    if entry is not None and res.status_code == 304:
+        response_cache.count("revalidated")
+        response_cache.refresh(entry, res)
+        return cached_entry_response(entry, if_none_match)
+
+    response_cache.count("misses")
+    response_cache.store(key, res, generation)
+
+    headers = {name: res.headers[name] for name in ("etag", "cache-control") if name in res.headers}
+    if res.status_code == 200 and "etag" in headers and etag_matches(if_none_match, headers["etag"]):
+        response_cache.count("not_modified")
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=res.content, status_code=res.status_code, headers=headers, media_type=res.headers.get("content-type"))
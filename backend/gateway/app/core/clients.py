@@ -0,0 +1,317 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import httpx
+from typing import Optional
+
+from common.metrics import UPSTREAM_ERRORS, instrument_client
+from common.tracing import trace_client
+from app.core.resilience import DEADLINE_HEADER, CircuitBreaker, CircuitOpenError, DeadlineExceeded, LatencyWindow, RetryBudget, remaining
+
+logger = logging.getLogger(__name__)
+
+#name -> default base URL; everything else per upstream comes from <NAME>_* env vars
+UPSTREAMS = {
+    "user": "http://user_service:8000",
+    "post": "http://post_service:8000",
+    "comment": "http://comment_service:8000",
+    "trending": "http://trending_service:8000",
+}
+
+
+#only these are safe to send twice
+IDEMPOTENT_METHODS = ("GET", "HEAD")
+RETRYABLE_STATUSES = (502, 503, 504)
+
+
+def _env(name: str, setting: str, default: str) -> str:
+    return os.getenv(f"{name.upper()}_{setting}", default)
+
+
+class Upstream:
+    """One pooled keep-alive client for a single upstream service, plus pool usage counters.
+
+    Every call goes through the upstream's circuit breaker and is cut short by the
+    current request's deadline. GETs are retried on connection errors and 502-504
+    while the retry budget allows; with hedging on, a second copy of a slow GET
+    is sent once the first has taken longer than the recent p95.
+    """
+
+    def __init__(self, name: str, base_url: str, max_connections: int = 100, max_keepalive: int = 20,
+                 timeout: float = 5.0, connect_timeout: float = 2.0, pool_timeout: float = 2.0, http2: bool = False,
+                 retries: int = 1, hedge: bool = False, breaker: Optional[CircuitBreaker] = None,
+                 budget: Optional[RetryBudget] = None, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.name = name
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout, pool=pool_timeout)
+        self.http2 = http2
+        self.retries = retries
+        self.hedge = hedge
+        self.breaker = breaker or CircuitBreaker()
+        self.budget = budget or RetryBudget()
+        self.latency = LatencyWindow()
+        self.transport = transport
+        self.client: Optional[httpx.AsyncClient] = None
+
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.queued = 0
+        self.pool_timeouts = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.retried = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.deadline_exceeded = 0
+
+    @classmethod
+    def from_env(cls, name: str, default_base: str) -> "Upstream":
+        return cls(
+            name,
+            _env(name, "SERVICE_BASE", default_base),
+            max_connections=int(_env(name, "MAX_CONNECTIONS", "100")),
+            max_keepalive=int(_env(name, "MAX_KEEPALIVE", "20")),
+            timeout=float(_env(name, "TIMEOUT", "5.0")),
+            connect_timeout=float(_env(name, "CONNECT_TIMEOUT", "2.0")),
+            pool_timeout=float(_env(name, "POOL_TIMEOUT", "2.0")),
+            http2=_env(name, "HTTP2", "false").lower() in ("1", "true", "yes"),
+            retries=int(_env(name, "RETRIES", "1")),
+            hedge=_env(name, "HEDGE", "false").lower() in ("1", "true", "yes"),
+            breaker=CircuitBreaker(
+                error_rate=float(_env(name, "BREAKER_ERROR_RATE", "0.5")),
+                slow_call=float(_env(name, "BREAKER_SLOW_CALL", "2.0")),
+                slow_rate=float(_env(name, "BREAKER_SLOW_RATE", "0.8")),
+                min_calls=int(_env(name, "BREAKER_MIN_CALLS", "20")),
+                open_seconds=float(_env(name, "BREAKER_OPEN_SECONDS", "5.0"))
+            ),
+            budget=RetryBudget(ratio=float(_env(name, "RETRY_BUDGET_RATIO", "0.1")))
+        )
+
+    def start(self):
+        limits = httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_keepalive)
+
+        #services gzip large bodies for outside callers; on the internal network that is CPU for nothing
+        headers = {"Accept-Encoding": "identity"}
+
+        try:
+            self.client = httpx.AsyncClient(base_url=self.base_url, limits=limits, timeout=self.timeout, http2=self.http2,
+                                            transport=self.transport, headers=headers)
+        except ImportError:
+            #http2 needs the h2 package
+            logger.warning("HTTP/2 unavailable for %s upstream, using HTTP/1.1", self.name)
+            self.http2 = False
+            self.client = httpx.AsyncClient(base_url=self.base_url, limits=limits, timeout=self.timeout,
+                                            transport=self.transport, headers=headers)
+
+        #latency histograms for /metrics; stats() keeps serving /metrics/upstreams
+        instrument_client(self.client, self.name)
+        #every attempt, retry and hedge carries the request's trace to the service
+        trace_client(self.client)
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        if self.client is None:
+            raise RuntimeError(f"{self.name} upstream client is not started")
+
+        self.budget.record_request()
+
+        if method not in IDEMPOTENT_METHODS:
+            return await self._attempt(method, path, kwargs)
+        if self.hedge and self.latency.p95() is not None:
+            return await self._hedged(method, path, kwargs)
+        return await self._with_retries(method, path, kwargs)
+
+    async def _with_retries(self, method: str, path: str, kwargs: dict) -> httpx.Response:
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+
+            try:
+                res = await self._attempt(method, path, kwargs)
+            except (CircuitOpenError, DeadlineExceeded):
+                raise
+            except httpx.TransportError:
+                if last_attempt or not self._may_retry():
+                    raise
+            else:
+                if res.status_code not in RETRYABLE_STATUSES or last_attempt or not self._may_retry():
+                    return res
+
+            self.retried += 1
+            #jittered backoff so retries from many requests do not land together
+            await asyncio.sleep(random.uniform(0, 0.05 * 2 ** attempt))
+
+    async def _hedged(self, method: str, path: str, kwargs: dict) -> httpx.Response:
+        primary = asyncio.create_task(self._attempt(method, path, kwargs))
+        pending = {primary}
+        hedge = None
+        can_hedge = True
+        last = primary
+
+        try:
+            while pending:
+                #wait out the p95 before hedging; after that, wait for whichever finishes
+                done, pending = await asyncio.wait(pending, timeout=self.latency.p95() if can_hedge else None,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    last = task
+                    error = task.exception()
+                    if error is None and task.result().status_code not in RETRYABLE_STATUSES:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        return task.result()
+                    if isinstance(error, (CircuitOpenError, DeadlineExceeded)):
+                        can_hedge = False
+
+                #a slow or failed primary gets one extra copy, paid for from the retry budget
+                if can_hedge:
+                    can_hedge = False
+                    if self._may_retry():
+                        self.hedges += 1
+                        hedge = asyncio.create_task(self._attempt(method, path, kwargs))
+                        pending.add(hedge)
+        finally:
+            for task in pending:
+                task.cancel()
+
+        return last.result()
+
+    def _may_retry(self) -> bool:
+        left = remaining()
+        if left is not None and left <= 0:
+            return False
+        return self.budget.try_spend()
+
+    async def _attempt(self, method: str, path: str, kwargs: dict) -> httpx.Response:
+        left = remaining()
+        if left is not None:
+            if left <= 0:
+                self.deadline_exceeded += 1
+                raise DeadlineExceeded(f"Deadline exceeded before calling {self.name}")
+
+            #never wait on the upstream longer than our own caller will wait on us
+            kwargs = dict(kwargs, headers={**(kwargs.get("headers") or {}), DEADLINE_HEADER: str(int(left * 1000))})
+            if left < self.timeout.read:
+                kwargs["timeout"] = httpx.Timeout(left, connect=min(self.timeout.connect, left), pool=min(self.timeout.pool, left))
+
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.name, self.breaker.retry_after())
+
+        #a request that starts with every connection busy waits for the pool
+        if self.in_flight >= self.max_connections:
+            self.queued += 1
+
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        self.requests += 1
+        started = time.perf_counter()
+
+        try:
+            res = await self.client.request(method, path, **kwargs)
+        except httpx.TimeoutException as e:
+            self.errors += 1
+            UPSTREAM_ERRORS.inc(self.name, method)
+            if isinstance(e, httpx.PoolTimeout):
+                self.pool_timeouts += 1
+
+            #running out of the caller's deadline says nothing about the upstream's health
+            if "timeout" in kwargs:
+                self.deadline_exceeded += 1
+                self.breaker.release()
+                raise DeadlineExceeded(f"Deadline exceeded calling {self.name}") from e
+
+            self.breaker.record(True, time.perf_counter() - started)
+            raise
+        except httpx.HTTPError:
+            self.errors += 1
+            UPSTREAM_ERRORS.inc(self.name, method)
+            self.breaker.record(True, time.perf_counter() - started)
+            raise
+        except BaseException:
+            #cancelled, e.g. the losing copy of a hedged read
+            self.breaker.release()
+            raise
+        finally:
+            self.in_flight -= 1
+            self.total_ms += (time.perf_counter() - started) * 1000
+
+        elapsed = time.perf_counter() - started
+        self.breaker.record(res.status_code >= 500, elapsed)
+        if res.status_code < 500:
+            self.latency.add(elapsed)
+        return res
+
+    async def get(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", path, **kwargs)
+
+    async def put(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("PUT", path, **kwargs)
+
+    async def delete(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("DELETE", path, **kwargs)
+
+    def stats(self) -> dict:
+        p95 = self.latency.p95()
+        return {
+            "base_url": self.base_url,
+            "http2": self.http2,
+            "max_connections": self.max_connections,
+            "max_keepalive": self.max_keepalive,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "saturation": round(self.in_flight / self.max_connections, 3),
+            "peak_saturation": round(self.peak_in_flight / self.max_connections, 3),
+            "requests": self.requests,
+            "queued": self.queued,
+            "pool_timeouts": self.pool_timeouts,
+            "errors": self.errors,
+            "avg_ms": round(self.total_ms / self.requests, 2) if self.requests else 0.0,
+            "p95_ms": round(p95 * 1000, 2) if p95 is not None else None,
+            "breaker": self.breaker.stats(),
+            "retries": self.retried,
+            "retry_budget_exhausted": self.budget.exhausted,
+            "deadline_exceeded": self.deadline_exceeded,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedge_win_rate": round(self.hedge_wins / self.hedges, 4) if self.hedges else 0.0
+        }
+
+
+class ClientRegistry:
+    """The gateway's upstream clients, opened and closed with the app lifespan."""
+
+    def __init__(self, upstreams: dict[str, Upstream]):
+        self.upstreams = upstreams
+
+    @classmethod
+    def from_env(cls) -> "ClientRegistry":
+        return cls({name: Upstream.from_env(name, base) for name, base in UPSTREAMS.items()})
+
+    def __getitem__(self, name: str) -> Upstream:
+        return self.upstreams[name]
+
+    def start(self):
+        for upstream in self.upstreams.values():
+            upstream.start()
+
+    async def close(self):
+        for upstream in self.upstreams.values():
+            await upstream.close()
+
+    def stats(self) -> dict:
+        return {name: upstream.stats() for name, upstream in self.upstreams.items()}
+
+
+clients = ClientRegistry.from_env()
@@ -0,0 +1,7 @@
+import httpx
+from fastapi import Response
+
+
+def relay(res: httpx.Response) -> Response:
+    #pass the upstream status and body through unchanged
+    return Response(content=res.content, status_code=res.status_code, media_type=res.headers.get("content-type"))
@@ -0,0 +1,219 @@
+import os
+import math
+import ipaddress
+import time
+import logging
+import redis
+import redis.asyncio as aioredis
+from dataclasses import dataclass
+from fastapi import Depends, HTTPException, Request
+
+from app.deps import get_current_user
+from common.identity import Identity
+from common.tracing import trace_redis
+
+REDIS_HOST = os.getenv("REDIS_HOST", "redis")
+
+#proxies whose X-Forwarded-For / X-Real-IP are believed, as IPs or CIDRs; empty trusts no one
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(entry.strip(), strict=False)
+    for entry in os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "").split(",") if entry.strip()
+]
+
+#leased tokens not used within this many seconds are forfeited, never handed back
+RATE_LIMIT_LEASE_TTL = float(os.getenv("RATE_LIMIT_LEASE_TTL", "2"))
+
+logger = logging.getLogger(__name__)
+
+#refill the bucket for the time since the last call, then take up to ARGV[3] whole tokens.
+#returns {granted, ms until the next token when nothing was granted}
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local want = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = clock[1] * 1000 + math.floor(clock[2] / 1000)
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - ts) / 1000 * rate)
+
+local granted = math.min(want, math.floor(tokens))
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+
+local wait = 0
+if granted < 1 then
+    wait = math.ceil((1 - tokens) / rate * 1000)
+end
+return {granted, wait}
+"""
+
+
+@dataclass
+class RatePolicy:
+    name: str
+    rate: float
+    burst: int
+    lease: int
+
+    @classmethod
+    def from_env(cls, name: str, rate: float, burst: int, lease: int) -> "RatePolicy":
+        prefix = f"RATE_LIMIT_{name.upper()}"
+        return cls(
+            name,
+            float(os.getenv(f"{prefix}_RATE", str(rate))),
+            int(os.getenv(f"{prefix}_BURST", str(burst))),
+            int(os.getenv(f"{prefix}_LEASE", str(lease)))
+        )
+
+
+#rate is tokens per second; lease is how many tokens a worker takes from Redis at once
+POLICIES = {
+    #bcrypt-expensive downstream, so no leasing: every attempt is counted centrally
+    "login": RatePolicy.from_env("login", rate=5 / 60, burst=5, lease=1),
+    "refresh": RatePolicy.from_env("refresh", rate=1, burst=20, lease=1),
+    "reactions": RatePolicy.from_env("reactions", rate=2, burst=30, lease=5),
+    "writes": RatePolicy.from_env("writes", rate=0.5, burst=10, lease=2),
+}
+
+
+@dataclass
+class Lease:
+    tokens: int
+    expires: float
+
+
+class RateLimiter:
+    """Token buckets in Redis, drawn on in batches.
+
+    A worker leases up to policy.lease tokens per Redis round trip and spends
+    them locally, so most requests never leave the process. Denials are cached
+    locally until the bucket refills. Leasing can only make a worker stricter
+    than the shared bucket, never looser.
+    """
+
+    def __init__(self, client: aioredis.Redis, lease_ttl: float = RATE_LIMIT_LEASE_TTL):
+        self.client = client
+        self.lease_ttl = lease_ttl
+        self.script = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+        self._leases: dict[str, Lease] = {}
+        self._blocked: dict[str, float] = {}
+        self._stats = {"allowed": 0, "local": 0, "redis_calls": 0, "denied": 0, "errors": 0}
+
+    async def acquire(self, policy: RatePolicy, subject: str) -> float:
+        """Take one token; returns 0 if allowed, else the seconds to wait."""
+        key = f"ratelimit:{policy.name}:{subject}"
+        now = time.monotonic()
+
+        blocked_until = self._blocked.get(key)
+        if blocked_until is not None:
+            if blocked_until > now:
+                self._stats["denied"] += 1
+                return blocked_until - now
+            del self._blocked[key]
+
+        lease = self._leases.get(key)
+        if lease is not None and lease.tokens > 0 and lease.expires > now:
+            lease.tokens -= 1
+            self._stats["allowed"] += 1
+            self._stats["local"] += 1
+            return 0
+
+        try:
+            self._stats["redis_calls"] += 1
+            granted, wait_ms = await self.script(keys=[key], args=[policy.rate, policy.burst, policy.lease])
+        except redis.RedisError as e:
+            #fail open: losing Redis must not take the API down with it
+            self._stats["errors"] += 1
+            logger.warning("Rate limiter unavailable, allowing request: %s", e)
+            return 0
+
+        self._sweep(now)
+
+        if granted < 1:
+            self._leases.pop(key, None)
+            self._blocked[key] = now + wait_ms / 1000
+            self._stats["denied"] += 1
+            return wait_ms / 1000
+
+        self._leases[key] = Lease(tokens=int(granted) - 1, expires=now + self.lease_ttl)
+        self._stats["allowed"] += 1
+        return 0
+
+    def stats(self) -> dict:
+        return dict(self._stats, leases=len(self._leases), blocked=len(self._blocked))
+
+    async def close(self):
+        await self.client.aclose()
+
+    def _sweep(self, now: float):
+        #bounded memory: drop spent leases and lapsed blocks once the maps grow
+        if len(self._leases) > 10000:
+            self._leases = {key: lease for key, lease in self._leases.items() if lease.expires > now and lease.tokens > 0}
+        if len(self._blocked) > 10000:
+            self._blocked = {key: until for key, until in self._blocked.items() if until > now}
+
+
+rate_limiter = RateLimiter(trace_redis(aioredis.Redis(host=REDIS_HOST, port=6379, decode_responses=True)))
+
+
+def client_ip(request: Request) -> str:
+    """The address to rate limit: the TCP peer, unless the peer is a trusted proxy.
+
+    The gateway is published directly, so forwarding headers are client-controlled
+    unless they were set by a proxy listed in RATE_LIMIT_TRUSTED_PROXIES.
+    """
+    peer = request.client.host if request.client else "unknown"
+    if not _trusted(peer):
+        return peer
+
+    #walk X-Forwarded-For from the right; the first hop not added by a trusted proxy is the client
+    forwarded = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+    for hop in reversed(forwarded):
+        if not _trusted(hop):
+            return hop
+
+    real_ip = request.headers.get("x-real-ip")
+    return real_ip.strip() if real_ip else peer
+
+
+def _trusted(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in TRUSTED_PROXIES)
+
+
+async def enforce(policy: RatePolicy, subject: str):
+    wait = await rate_limiter.acquire(policy, subject)
+
+    if wait > 0:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many requests, retry in {math.ceil(wait)}s",
+            headers={"Retry-After": str(math.ceil(wait))}
+        )
+
+
+def limit_by_ip(policy_name: str):
+    policy = POLICIES[policy_name]
+
+    async def dependency(request: Request):
+        await enforce(policy, f"ip:{client_ip(request)}")
+
+    return dependency
+
+
+def limit_by_user(policy_name: str):
+    policy = POLICIES[policy_name]
+
+    #get_current_user is cached per request, so the route's own Depends does not decode the token again
+    async def dependency(user: Identity = Depends(get_current_user)):
+        await enforce(policy, f"user:{user.user_id}")
+
+    return dependency
@@ -0,0 +1,211 @@
+import os
+import time
+import contextvars
+import httpx
+from collections import deque
+from typing import Optional
+
+#remaining milliseconds the caller will wait; read from clients, forwarded to upstreams
+DEADLINE_HEADER = "X-BlogSpot-Deadline"
+GATEWAY_DEADLINE_MS = int(os.getenv("GATEWAY_DEADLINE_MS", "10000"))
+
+#monotonic time by which the current gateway request must be answered
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+
+class CircuitOpenError(httpx.TransportError):
+    """The upstream's breaker is open; the call was not attempted."""
+
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"{upstream} circuit open")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(httpx.TimeoutException):
+    """The caller's deadline ran out before or while calling the upstream."""
+
+
+def remaining() -> Optional[float]:
+    """Seconds left for the current request, or None outside a request."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class DeadlineMiddleware:
+    """Starts each request's deadline clock from its X-BlogSpot-Deadline header, capped at GATEWAY_DEADLINE_MS."""
+
+    def __init__(self, app, default_ms: int = GATEWAY_DEADLINE_MS):
+        self.app = app
+        self.default_ms = default_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        budget_ms = self.default_ms
+        for name, value in scope["headers"]:
+            if name == DEADLINE_HEADER.lower().encode():
+                try:
+                    budget_ms = max(0, min(budget_ms, int(value)))
+                except ValueError:
+                    pass
+                break
+
+        token = _deadline.set(time.monotonic() + budget_ms / 1000)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _deadline.reset(token)
+
+
+class LatencyWindow:
+    """The last few hundred successful call latencies, for the hedging delay."""
+
+    def __init__(self, size: int = 256, min_samples: int = 50):
+        self.samples: deque[float] = deque(maxlen=size)
+        self.min_samples = min_samples
+        self._p95: Optional[float] = None
+        self._since_sort = 0
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+        self._since_sort += 1
+
+    def p95(self) -> Optional[float]:
+        if len(self.samples) < self.min_samples:
+            return None
+
+        #re-sorting every call would cost more than the calls it is meant to speed up
+        if self._p95 is None or self._since_sort >= 32:
+            ordered = sorted(self.samples)
+            self._p95 = ordered[int(0.95 * (len(ordered) - 1))]
+            self._since_sort = 0
+
+        return self._p95
+
+
+class CircuitBreaker:
+    """Closed -> open on a high error or slow-call rate over the recent window.
+
+    Open rejects calls without trying them for open_seconds, then half-open lets
+    a few probes through: one success closes the breaker, one failure re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, window: float = 10.0, min_calls: int = 20, error_rate: float = 0.5,
+                 slow_call: float = 2.0, slow_rate: float = 0.8, open_seconds: float = 5.0, half_open_calls: int = 3):
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call = slow_call
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.probes = 0
+        self.trips = 0
+        self.rejected = 0
+
+        #(finished at, failed, slow)
+        self._calls: deque[tuple[float, bool, bool]] = deque()
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+
+        if self.state == self.OPEN:
+            if now - self.opened_at < self.open_seconds:
+                self.rejected += 1
+                return False
+            self.state = self.HALF_OPEN
+            self.probes = 0
+
+        if self.state == self.HALF_OPEN:
+            if self.probes >= self.half_open_calls:
+                self.rejected += 1
+                return False
+            self.probes += 1
+
+        return True
+
+    def release(self):
+        #a probe that ended without an outcome (cancelled, or cut off by the caller's deadline)
+        if self.state == self.HALF_OPEN and self.probes > 0:
+            self.probes -= 1
+
+    def retry_after(self) -> float:
+        return max(0.0, self.open_seconds - (time.monotonic() - self.opened_at))
+
+    def record(self, failed: bool, elapsed: float):
+        now = time.monotonic()
+
+        if self.state == self.HALF_OPEN:
+            if failed:
+                self._open(now)
+            else:
+                self.state = self.CLOSED
+                self._calls.clear()
+            return
+
+        self._calls.append((now, failed, elapsed >= self.slow_call))
+        while self._calls and self._calls[0][0] < now - self.window:
+            self._calls.popleft()
+
+        total = len(self._calls)
+        if self.state == self.CLOSED and total >= self.min_calls:
+            failures = sum(1 for _, failed_call, _ in self._calls if failed_call)
+            slow = sum(1 for _, _, slow_call in self._calls if slow_call)
+            if failures / total >= self.error_rate or slow / total >= self.slow_rate:
+                self._open(now)
+
+    def stats(self) -> dict:
+        return {"state": self.state, "trips": self.trips, "rejected": self.rejected, "window_calls": len(self._calls)}
+
+    def _open(self, now: float):
+        self.state = self.OPEN
+        self.opened_at = now
+        self.trips += 1
+        self._calls.clear()
+
+
+class RetryBudget:
+    """Retries (and hedges) may add at most ratio of the recent request volume, plus a small floor.
+
+    Without a budget every caller retries during an outage and the struggling
+    upstream sees a multiple of its normal load.
+    """
+
+    def __init__(self, ratio: float = 0.1, min_per_second: float = 2.0, window: float = 10.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.window = window
+
+        self._requests: deque[float] = deque()
+        self._retries: deque[float] = deque()
+        self.exhausted = 0
+
+    def record_request(self):
+        now = time.monotonic()
+        self._requests.append(now)
+        self._expire(now)
+
+    def try_spend(self) -> bool:
+        now = time.monotonic()
+        self._expire(now)
+
+        if len(self._retries) >= self.min_per_second * self.window + self.ratio * len(self._requests):
+            self.exhausted += 1
+            return False
+
+        self._retries.append(now)
+        return True
+
+    def _expire(self, now: float):
+        for calls in (self._requests, self._retries):
+            while calls and calls[0] < now - self.window:
+                calls.popleft()
@@ -1,20 +1,24 @@
+import os
 from datetime import datetime, timedelta, timezone
 from jose import jwt
 from passlib.context import CryptContext
 
-SECRET_KEY = "gateway_secret_key",
+SECRET_KEY = os.getenv("JWT_SECRET_KEY", "gateway_secret_key")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 15
 
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-def create_access_token(user_id: str) -> str:
+def create_access_token(user_id: str, username: str, active: bool = True) -> str:
     
+    #username and active ride along so the gateway can vouch for the user without asking user_service
     payload = {
         "sub": user_id,
+        "username": username,
+        "active": active,
         "iat": datetime.now(timezone.utc),
         "exp": datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     }
     
-    return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
\ No newline at end of file
+    return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
@@ -0,0 +1,110 @@
+import os
+import uuid
+import secrets
+import logging
+import redis.asyncio as aioredis
+from typing import Optional
+
+from common.sessions import token_key, successor_key, family_key, user_sessions_key
+from common.tracing import trace_redis
+
+REDIS_HOST = os.getenv("REDIS_HOST", "redis")
+
+#each token is single-use; the login it came from expires after REFRESH_SESSION_MAX_AGE regardless of use
+REFRESH_TOKEN_TTL = int(os.getenv("REFRESH_TOKEN_TTL", str(14 * 24 * 3600)))
+REFRESH_SESSION_MAX_AGE = int(os.getenv("REFRESH_SESSION_MAX_AGE", str(30 * 24 * 3600)))
+#a token presented again this soon after its rotation (two tabs refreshing at once) gets the same successor
+REFRESH_REUSE_GRACE = max(1, int(os.getenv("REFRESH_REUSE_GRACE", "10")))
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshTokenReused(Exception):
+    pass
+
+
+class SessionStore:
+    """Rotating, opaque refresh tokens stored hashed in Redis.
+
+    Every refresh consumes the presented token and issues a new one in the same
+    family. Within REFRESH_REUSE_GRACE seconds of the rotation, presenting the
+    old token again returns the same successor, so concurrent refreshes from
+    one browser do not look like theft. After that, presenting an
+    already-rotated token means it was copied, so the whole family is revoked
+    and both holders must log in again.
+    """
+
+    def __init__(self, client: aioredis.Redis):
+        self.client = client
+
+    async def create(self, user: dict) -> str:
+        family_id = str(uuid.uuid4())
+
+        pipe = self.client.pipeline()
+        pipe.hset(family_key(family_id), mapping={"user_id": user["user_id"]})
+        pipe.expire(family_key(family_id), REFRESH_SESSION_MAX_AGE)
+        pipe.sadd(user_sessions_key(user["user_id"]), family_id)
+        pipe.expire(user_sessions_key(user["user_id"]), REFRESH_SESSION_MAX_AGE)
+        await pipe.execute()
+
+        return await self._issue(family_id, user, REFRESH_TOKEN_TTL, secrets.token_urlsafe(32))
+
+    async def rotate(self, token: str) -> Optional[tuple[dict, str]]:
+        """The session's user and a fresh token, or None if the token is unknown, expired or revoked."""
+        key = token_key(token)
+        record = await self.client.hgetall(key)
+        if not record:
+            return None
+
+        family_id = record["family"]
+        family_ttl = await self.client.ttl(family_key(family_id))
+        if family_ttl <= 0:
+            return None
+
+        user = {"user_id": record["user_id"], "username": record["username"], "active": record["active"] == "1"}
+        successor = secrets.token_urlsafe(32)
+
+        #only the first presenter of a token gets to rotate it; SET NX picks it and records the successor in one step
+        if "rotated" in record or not await self.client.set(successor_key(token), successor, nx=True, ex=REFRESH_REUSE_GRACE):
+            issued = await self.client.get(successor_key(token))
+            if issued is not None:
+                return user, issued
+
+            await self.revoke(family_id, record["user_id"])
+            logger.warning("Refresh token reuse for user %s, session %s revoked", record["user_id"], family_id)
+            raise RefreshTokenReused()
+
+        await self.client.hset(key, "rotated", 1)
+        return user, await self._issue(family_id, user, min(REFRESH_TOKEN_TTL, family_ttl), successor)
+
+    async def revoke_token(self, token: str):
+        record = await self.client.hgetall(token_key(token))
+        if record:
+            await self.revoke(record["family"], record["user_id"])
+
+    async def revoke(self, family_id: str, user_id: str):
+        pipe = self.client.pipeline()
+        pipe.delete(family_key(family_id))
+        pipe.srem(user_sessions_key(user_id), family_id)
+        await pipe.execute()
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def _issue(self, family_id: str, user: dict, ttl: int, token: str) -> str:
+        key = token_key(token)
+
+        pipe = self.client.pipeline()
+        pipe.hset(key, mapping={
+            "family": family_id,
+            "user_id": user["user_id"],
+            "username": user["username"],
+            "active": "1" if user["active"] else "0"
+        })
+        pipe.expire(key, ttl)
+        await pipe.execute()
+
+        return token
+
+
+session_store = SessionStore(trace_redis(aioredis.Redis(host=REDIS_HOST, port=6379, decode_responses=True)))
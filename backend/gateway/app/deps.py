@@ -4,13 +4,24 @@ from fastapi import Depends, HTTPException
 
 
 from app.core.security import SECRET_KEY, ALGORITHM
+from common.identity import Identity, IDENTITY_HEADER, sign_identity
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
+def get_current_user(token: str = Depends(oauth2_scheme)) -> Identity:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload["sub"]
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
\ No newline at end of file
+        user = Identity(user_id=payload["sub"], username=payload["username"], active=payload["active"], exp=payload["exp"])
+    except (JWTError, KeyError):
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    
+    if not user.active:
+        raise HTTPException(status_code=403, detail="User is not active")
+    
+    return user
+
+
+def identity_headers(user: Identity) -> dict:
+    #signed for downstream services, never valid for longer than the token itself
+    return {IDENTITY_HEADER: sign_identity(user.user_id, user.username, user.active, expires_at=user.exp)}
@@ -0,0 +1,88 @@
+import httpx
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from app.api.routes import auth, posts, comments, pages, users, trending
+from app.core.clients import clients
+from app.core.resilience import CircuitOpenError, DeadlineMiddleware
+from common.metrics import add_metrics
+from common.tracing import add_tracing
+from common.responses import ORJSONResponse, add_compression
+from app.core.cache import response_cache
+from app.core.ratelimit import rate_limiter
+from app.core.sessions import session_store
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    clients.start()
+    response_cache.start()
+    yield
+    response_cache.close()
+    await rate_limiter.close()
+    await session_store.close()
+    await clients.close()
+
+
+app = FastAPI(
+    title="BlogSpot Gateway",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
+
+app.add_middleware(DeadlineMiddleware)
+#compress for clients here; the hops to services stay uncompressed (see Upstream.start)
+add_compression(app)
+add_metrics(app)
+add_tracing(app, "gateway")
+
+app.include_router(auth.router)
+app.include_router(posts.router)
+app.include_router(comments.router)
+app.include_router(pages.router)
+app.include_router(users.router)
+app.include_router(trending.router)
+
+
+@app.exception_handler(CircuitOpenError)
+async def upstream_circuit_open(request: Request, exc: CircuitOpenError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"{exc.upstream} service temporarily unavailable"},
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))}
+    )
+
+
+#DeadlineExceeded is a TimeoutException, so a spent deadline is also a 504
+@app.exception_handler(httpx.TimeoutException)
+async def upstream_timeout(request: Request, exc: httpx.TimeoutException):
+    return JSONResponse(status_code=504, content={"detail": "Upstream service timed out"})
+
+
+@app.exception_handler(httpx.HTTPError)
+async def upstream_error(request: Request, exc: httpx.HTTPError):
+    return JSONResponse(status_code=502, content={"detail": "Upstream service unavailable"})
+
+
+@app.get("/health")
+async def health_check():
+    return {"status": "healthy", "service": "Gateway"}
+
+
+@app.get("/metrics/upstreams")
+async def upstream_metrics():
+    #per-upstream pool usage; peak_saturation near 1.0 or any pool_timeouts means the pool is too small.
+    #also breaker state, retries and how often a hedged read beat the original
+    return clients.stats()
+
+
+@app.get("/metrics/cache")
+async def cache_metrics():
+    return response_cache.stats()
+
+
+@app.get("/metrics/ratelimit")
+async def rate_limit_metrics():
+    #"local" allowed without a Redis round trip
+    return rate_limiter.stats()
@@ -0,0 +1,105 @@
+import os
+import logging
+import redis
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlmodel import Session
+from db import iter_comment_counts
+from common.tracing import trace_redis
+
+REDIS_HOST = os.getenv("REDIS_HOST", "redis")
+
+#daily buckets are kept long enough to answer the widest window we serve
+WINDOW_RETENTION_DAYS = int(os.getenv("COMMENTER_WINDOW_RETENTION_DAYS", "30"))
+WINDOW_CACHE_SECONDS = int(os.getenv("COMMENTER_WINDOW_CACHE_SECONDS", "60"))
+
+ALL_TIME_KEY = "trending:commenters:all"
+
+redis_client = trace_redis(redis.Redis(
+    host=REDIS_HOST,
+    port=6379,
+    decode_responses=True
+))
+
+logger = logging.getLogger(__name__)
+
+
+def day_key(day: datetime) -> str:
+    return f"trending:commenters:day:{day.strftime('%Y%m%d')}"
+
+
+def comment_day_key(comment_id: str) -> str:
+    return f"comment:{comment_id}:day"
+
+
+def record_comment_created(comment_id: str, user_id: str, created: Optional[datetime] = None):
+    created = created or datetime.now()
+    bucket = day_key(created)
+    ttl = timedelta(days=WINDOW_RETENTION_DAYS + 1)
+
+    try:
+        pipe = redis_client.pipeline()
+        pipe.zincrby(ALL_TIME_KEY, 1, user_id)
+        pipe.zincrby(bucket, 1, user_id)
+        pipe.expire(bucket, ttl)
+        #remember which bucket the comment landed in so a delete can undo it
+        pipe.set(comment_day_key(comment_id), bucket, ex=ttl)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning("Could not count comment %s for user %s: %s", comment_id, user_id, e)
+
+
+def record_comment_deleted(comment_id: str, user_id: str):
+    try:
+        bucket = redis_client.getdel(comment_day_key(comment_id))
+
+        pipe = redis_client.pipeline()
+        pipe.zincrby(ALL_TIME_KEY, -1, user_id)
+        pipe.zremrangebyscore(ALL_TIME_KEY, "-inf", 0)
+
+        if bucket:
+            pipe.zincrby(bucket, -1, user_id)
+            pipe.zremrangebyscore(bucket, "-inf", 0)
+
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning("Could not uncount comment %s for user %s: %s", comment_id, user_id, e)
+
+
+def top_commenters(limit: int = 10, days: Optional[int] = None) -> list[dict]:
+    if days is None:
+        key = ALL_TIME_KEY
+    else:
+        today = datetime.now()
+        key = f"trending:commenters:window:{days}:{today.strftime('%Y%m%d')}"
+
+        #the union over the daily buckets is shared by every request in the cache window
+        if not redis_client.exists(key):
+            buckets = [day_key(today - timedelta(days=offset)) for offset in range(days)]
+            pipe = redis_client.pipeline()
+            pipe.zunionstore(key, buckets)
+            pipe.expire(key, WINDOW_CACHE_SECONDS)
+            pipe.execute()
+
+    results = redis_client.zrevrange(key, 0, limit - 1, withscores=True)
+
+    return [{"user_id": user_id, "comment_count": int(count)} for user_id, count in results]
+
+
+def rebuild_commenter_counts(session: Session, batch_size: int = 1000):
+    if redis_client.exists(ALL_TIME_KEY):
+        return
+
+    pipe = redis_client.pipeline(transaction=False)
+    pending = 0
+
+    for user_id, count in iter_comment_counts(session, batch_size=batch_size):
+        pipe.zadd(ALL_TIME_KEY, {user_id: count})
+        pending += 1
+
+        if pending >= batch_size:
+            pipe.execute()
+            pending = 0
+
+    pipe.execute()
+    logger.info("Top commenter counts rebuilt from the comments table")
@@ -21,3 +21,11 @@ CREATE TABLE post_reactions (
     UNIQUE (user_id, post_id)
 );
 
+
+CREATE TABLE IF NOT EXISTS outbox (
+    id           BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    stream       VARCHAR(100) NOT NULL,
+    type         VARCHAR(100) NOT NULL,
+    data         TEXT NOT NULL,
+    created_at   TIMESTAMP NOT NULL DEFAULT NOW()
+);
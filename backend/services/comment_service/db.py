@@ -1,12 +1,16 @@
 from sqlmodel import SQLModel, Field, create_engine, select, Enum, Session
-from sqlalchemy import Column, Integer, String, TIMESTAMP, func, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, TIMESTAMP, text, func, delete, Enum as SQLEnum
 from typing import Optional
 from pydantic import EmailStr
 from models import CommentCreate, CommentResponse, CommentEdit
 from datetime import datetime
 import os
 from fastapi import HTTPException
-import uuid
+from common.metrics import instrument_engine
+from common.tracing import trace_engine
+from common.ids import UUIDKey, new_id, uuid_column_upgrades
+from common.events import CommentCreated, CommentDeleted, ReactionChanged
+from common.outbox import add_events
 import enum
 
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -16,14 +20,16 @@ engine = create_engine(DATABASE_URL,
                         pool_size=5,
                         max_overflow=10,
                         echo=False, )
+instrument_engine(engine, "comments")
+trace_engine(engine, "comments")
 
 class CommentCreateDB(SQLModel, table=True):
     
     __tablename__ = "comments"
     
-    comment_id: str = Field(sa_column=Column(String, primary_key=True, unique=True))
-    user_id: str = Field(sa_column=Column(String, nullable=False))
-    post_id: str = Field(sa_column=Column(String, nullable=False))
+    comment_id: str = Field(sa_column=Column(UUIDKey, primary_key=True, unique=True))
+    user_id: str = Field(sa_column=Column(UUIDKey, nullable=False, index=True))
+    post_id: str = Field(sa_column=Column(UUIDKey, nullable=False))
     username: str = Field(sa_column=Column(String(50), nullable=False))
     content: str = Field(sa_column=Column(String(500), nullable=False))
     likes: int = Field(sa_column=Column(Integer, nullable=False, default=0, server_default="0"))
@@ -35,27 +41,45 @@ class CommentPostReaction(SQLModel, table=True):
     
     __tablename__ = "comment_reactions"
     
-    reaction_id: str = Field(sa_column=Column(String, primary_key=True, unique=True))
-    user_id: str = Field(sa_column=Column(String, nullable=False))
-    post_id: str = Field(sa_column=Column(String, nullable=False))
-    comment_id: str = Field(sa_column=Column(String, nullable=False))
+    reaction_id: str = Field(sa_column=Column(UUIDKey, primary_key=True, unique=True))
+    user_id: str = Field(sa_column=Column(UUIDKey, nullable=False))
+    post_id: str = Field(sa_column=Column(UUIDKey, nullable=False))
+    comment_id: str = Field(sa_column=Column(UUIDKey, nullable=False))
     reaction_type: int = Field(sa_column=Column(Integer, nullable=False))
     created_at: str = Field(sa_column=Column(TIMESTAMP, server_default=func.now(), nullable=False))
 
 
+SCHEMA_UPGRADES = [
+    #per-author comment stats for counter reconciliation
+    "CREATE INDEX IF NOT EXISTS ix_comments_user_id ON comments (user_id)",
+    #ids used to be varchar uuid4 strings
+    *uuid_column_upgrades("comments", "comment_id", "user_id", "post_id"),
+    *uuid_column_upgrades("comment_reactions", "reaction_id", "user_id", "post_id", "comment_id"),
+    "CREATE INDEX IF NOT EXISTS ix_comments_post_id ON comments (post_id, comment_id)",
+]
+
+
 def init_db():
     SQLModel.metadata.create_all(engine)
+    with engine.begin() as connection:
+        for statement in SCHEMA_UPGRADES:
+            connection.execute(text(statement))
     print("Database initialized and tables created (if not exist).")
 
 
 def close_db_connection():
     engine.dispose()
     print("Database connection closed.")
+
+def ping_db():
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
     
     
 def create_new_comment(session: Session, comment: CommentCreate) -> CommentResponse:
     created = str(datetime.now().isoformat())
-    comment_id = str(uuid.uuid4())
+    comment_id = new_id()
     
     db_comment = CommentCreateDB(
         comment_id=comment_id,
@@ -69,6 +93,8 @@ def create_new_comment(session: Session, comment: CommentCreate) -> CommentRespo
     )
     
     session.add(db_comment)
+    #the event commits or rolls back with the comment
+    add_events(session, CommentCreated(comment_id=comment_id, post_id=comment.post_id, user_id=comment.user_id))
     session.commit()
     session.refresh(db_comment)
     
@@ -97,12 +123,34 @@ def retrieve_user_comments(session: Session, user_id: str) -> list[CommentRespon
     
     return results
 
-def retrieve_post_comments(session: Session, post_id: str) -> list[CommentResponse]:
-    statement = select(CommentCreateDB).where(CommentCreateDB.post_id == post_id)
+def retrieve_post_comments(session: Session, post_id: str, cursor: Optional[str] = None, limit: Optional[int] = None) -> list[CommentResponse]:
+    #comment ids are UUIDv7, so id order is creation order and ix_comments_post_id serves the page
+    statement = select(CommentCreateDB).where(CommentCreateDB.post_id == post_id).order_by(CommentCreateDB.comment_id)
+    if cursor:
+        statement = statement.where(CommentCreateDB.comment_id > cursor)
+    if limit is not None:
+        statement = statement.limit(limit)
     results = session.exec(statement).all()
     
     return results
 
+def delete_post_comments(session: Session, post_id: str) -> list[dict]:
+    """Delete every comment on a post, with their reactions and CommentDeleted events, in one transaction; returns what was deleted."""
+    session.execute(delete(CommentPostReaction).where(CommentPostReaction.post_id == post_id))
+    deleted = session.execute(
+        delete(CommentCreateDB)
+        .where(CommentCreateDB.post_id == post_id)
+        .returning(CommentCreateDB.comment_id, CommentCreateDB.user_id, CommentCreateDB.likes, CommentCreateDB.dislikes)
+    ).all()
+    deleted = [
+        {"comment_id": comment_id, "user_id": user_id, "likes": likes, "dislikes": dislikes}
+        for comment_id, user_id, likes, dislikes in deleted
+    ]
+    add_events(session, *(CommentDeleted(post_id=post_id, **comment) for comment in deleted))
+    session.commit()
+    
+    return deleted
+
 def edit_comment_info(session: Session, comment: CommentCreateDB, comment_edit: CommentEdit) -> CommentResponse:
     
     if not comment:
@@ -140,7 +188,7 @@ def add_like(session: Session, comment_id: str) -> CommentResponse:
     
     if not comment_reaction:
         new_reaction = CommentPostReaction(
-            reaction_id=str(uuid.uuid4()),
+            reaction_id=new_id(),
             user_id=comment.user_id,
             post_id=comment.post_id,
             comment_id=comment_id,
@@ -155,6 +203,7 @@ def add_like(session: Session, comment_id: str) -> CommentResponse:
         setattr(comment, "likes", comment.likes + 1)
     
         session.add(comment)
+        add_events(session, ReactionChanged(target="comment", target_id=comment_id, author_id=comment.user_id, likes=1))
         session.commit()
         session.refresh(comment)
         
@@ -166,6 +215,7 @@ def add_like(session: Session, comment_id: str) -> CommentResponse:
             setattr(comment, "dislikes", comment.dislikes - 1)
             
             session.add(comment)
+            add_events(session, ReactionChanged(target="comment", target_id=comment_id, author_id=comment.user_id, likes=1, dislikes=-1))
             session.commit()
             session.refresh(comment)
             
@@ -190,7 +240,7 @@ def add_dislike(session: Session, comment_id: str) -> CommentResponse:
     
     if not comment_reaction:
         new_reaction = CommentPostReaction(
-            reaction_id=str(uuid.uuid4()),
+            reaction_id=new_id(),
             user_id=comment.user_id,
             post_id=comment.post_id,
             comment_id=comment_id,
@@ -205,6 +255,7 @@ def add_dislike(session: Session, comment_id: str) -> CommentResponse:
         setattr(comment, "dislikes", comment.dislikes + 1)
     
         session.add(comment)
+        add_events(session, ReactionChanged(target="comment", target_id=comment_id, author_id=comment.user_id, dislikes=1))
         session.commit()
         session.refresh(comment)
     else:
@@ -215,6 +266,7 @@ def add_dislike(session: Session, comment_id: str) -> CommentResponse:
             setattr(comment, "likes", comment.likes - 1)
             
             session.add(comment)
+            add_events(session, ReactionChanged(target="comment", target_id=comment_id, author_id=comment.user_id, likes=-1, dislikes=1))
             session.commit()
             session.refresh(comment)
             
@@ -263,6 +315,26 @@ def get_most_liked_comments(session: Session) -> list[CommentResponse]:
     return liked_comments
 
 
+def iter_comment_counts(session: Session, batch_size: int = 1000):
+    statement = select(CommentCreateDB.user_id, func.count(CommentCreateDB.comment_id)).group_by(CommentCreateDB.user_id)
+    
+    for user_id, count in session.exec(statement.execution_options(yield_per=batch_size)):
+        yield user_id, count
+
+
+def get_user_comment_stats(session: Session, user_ids: list[str]) -> dict[str, dict]:
+    statement = (
+        select(CommentCreateDB.user_id, func.count(CommentCreateDB.comment_id), func.coalesce(func.sum(CommentCreateDB.likes), 0), func.coalesce(func.sum(CommentCreateDB.dislikes), 0))
+        .where(CommentCreateDB.user_id.in_(user_ids))
+        .group_by(CommentCreateDB.user_id)
+    )
+    
+    return {
+        user_id: {"count": count, "likes": int(likes), "dislikes": int(dislikes)}
+        for user_id, count, likes, dislikes in session.exec(statement).all()
+    }
+
+
 def get_top_commenters(session: Session) -> list[dict]:
     statement = select(CommentCreateDB.user_id, func.count(CommentCreateDB.comment_id).label("comment_count")).group_by(CommentCreateDB.user_id).order_by(func.count(CommentCreateDB.comment_id).desc()).limit(10)
     results = session.exec(statement).all()
@@ -1,25 +1,51 @@
-from fastapi import FastAPI, HTTPException
-from models import CommentCreate, CommentResponse, CommentEdit
-import httpx
+from fastapi import FastAPI, HTTPException, Response, Depends, Query
+from models import CommentCreate, CommentResponse, CommentEdit, UserStatsRequest
 import os
 import redis
 import logging
+from typing import Optional
 from contextlib import asynccontextmanager, contextmanager
 from sqlmodel import Session
-from db import init_db, close_db_connection, engine, create_new_comment, retrieve_comment, retrieve_user_comments, retrieve_post_comments, edit_comment_info, add_like, add_dislike
+from db import init_db, close_db_connection, ping_db, engine, create_new_comment, retrieve_comment, retrieve_user_comments, retrieve_post_comments, delete_post_comments, edit_comment_info, add_like, add_dislike, get_user_comment_stats, get_trending_comments, get_most_liked_comments, get_most_disliked_comments, get_top_commenters
+from commenters import record_comment_created, record_comment_deleted, rebuild_commenter_counts
+from common.health import DependencyHealth
+from common.events import CommentDeleted, PostDeleted, EventConsumer
+from common.outbox import OutboxRelay, add_events
+from common.identity import Identity, verified_identity, ensure_user
+from common.metrics import add_metrics
+from common.tracing import add_tracing, trace_redis
+from common.responses import ORJSONResponse, RowSerializer, add_compression
+from common.log_setup import configure_logging
 
 USER_SERVICE_BASE = os.getenv("USER_SERVICE_BASE", "http://user-service:8000")
 
-redis_client = redis.Redis(
+redis_client = trace_redis(redis.Redis(
     host="redis", 
     port=6379, 
     decode_responses=True
+))
+
+health = DependencyHealth(
+    "Comment Service",
+    dependencies={"User Service": USER_SERVICE_BASE},
+    checks={"Database": ping_db, "Redis": redis_client.ping}
 )
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     init_db()
+    await health.start()
+    with Session(engine) as session:
+        try:
+            rebuild_commenter_counts(session)
+        except redis.RedisError as e:
+            logger.warning("Skipping commenter count rebuild: %s", e)
+    post_events.start()
+    outbox_relay.start()
     yield
+    await outbox_relay.close()
+    await post_events.close()
+    await health.close()
     close_db_connection()
     
     
@@ -33,87 +59,139 @@ def get_session():
         
         
 #LOGGING SETUP
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
-        logging.FileHandler("./logs/cache_log.txt", mode="a"),
-        logging.StreamHandler()
-    ]
-)
+#reads log a 10% sample at INFO; warnings and errors are always written
+configure_logging("comment_service", sample_rates={
+    "GET /comments/{comment_id}": 0.1,
+    "GET /users/{user_id}/comments": 0.1,
+    "GET /posts/{post_id}/comments": 0.1
+})
 
 logger = logging.getLogger(__name__)
    
 
 app = FastAPI(
     title="Comment Service",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
+add_compression(app)
+add_metrics(app)
+add_tracing(app, "comment_service")
+
+#comment threads serialize rows straight to JSON
+comment_list = RowSerializer(list[CommentResponse])
+
+
+#EVENTS
+def on_post_deleted(event: PostDeleted):
+    #replaces post_service deleting each comment over HTTP; a redelivery finds nothing left to delete
+    with get_session() as session:
+        deleted = delete_post_comments(session, event.post_id)
+    
+    for comment in deleted:
+        record_comment_deleted(comment["comment_id"], comment["user_id"])
+    
+    if deleted:
+        logger.info("Deleted %s comments of deleted post %s", len(deleted), event.post_id)
+
+
+post_events = EventConsumer(redis_client, "comment_service", {PostDeleted: on_post_deleted})
+#domain events are written to the outbox table with the change and published from here
+outbox_relay = OutboxRelay(engine, redis_client)
+
 #endpoints
+@app.get("/livez")
+async def liveness_check():
+    return health.liveness()
+
+
+@app.get("/readyz")
+async def readiness_check(response: Response):
+    report = await health.readiness()
+    
+    if report["status"] != "healthy":
+        response.status_code = 503
+    return report
+
+
 @app.get("/health")
 async def health_check():
-    try:
-        async with httpx.AsyncClient(timeout=2.0) as client:
-            resp = await client.get(f"{USER_SERVICE_BASE}/health")
-        if resp.status_code != 200:
-            return {
-                "status": "unhealthy",
-                "details": "User Service returned non-200",
-                "code": resp.status_code
-            }
-        return {
-            "service": "Comment Service",
-            "status": "healthy",
-            "dependencies": {
-                "User Service": {
-                    "status": "healthy",
-                    "response_time_ms": resp.elapsed.total_seconds() * 1000
-                }
-            }
-        }
-    except Exception as e:
-        return {
-            "status": "starting",
-            "details": f"User Service not reachable: {str(e)}"
-        }
+    return await health.readiness()
+
+
+@app.get("/events/stats", status_code=200)
+def get_event_stats():
+    return post_events.stats()
+
+
+@app.get("/outbox/stats", status_code=200)
+def get_outbox_stats():
+    #"backlog" is events committed but not yet on their streams
+    return outbox_relay.stats()
       
        
     
 @app.post("/comments", status_code=201, response_model=CommentResponse)
-async def create_comment(comment:CommentCreate):
+async def create_comment(comment:CommentCreate, identity: Optional[Identity] = Depends(verified_identity)):
     
-    user_req = f"{USER_SERVICE_BASE}/users/{comment.user_id}"
-    user = httpx.get(user_req)
-    
-    if not user.status_code == 200:
-        raise HTTPException(status_code=404, detail= f"User {comment.user_id} not found!")
+    ensure_user(identity, comment.user_id, USER_SERVICE_BASE)
     
     with get_session() as session:
         new_comment = create_new_comment(session, comment)
+        record_comment_created(new_comment.comment_id, new_comment.user_id)
 
-        logger.info(f"Post {new_comment['comment_id']} created by user {comment.user_id}")
+        logger.info("Comment %s created by user %s", new_comment.comment_id, comment.user_id)
         
-        return CommentResponse({
-            "comment_id": new_comment.comment_id,
-            "user_id": new_comment.user_id,
-            "post_id": new_comment.post_id,
-            "username": new_comment.username,
-            "content": new_comment.content,
-            "likes": new_comment.likes,
-            "dislikes": new_comment.dislikes,
-            "edited_at": new_comment.edited_at
-        })
+        return new_comment
+    
+    
     
+@app.post("/stats/users", status_code=200)
+async def get_user_stats(request: UserStatsRequest):
     
+    #per-author comment counts and reactions received, used to reconcile user counters
+    with get_session() as session:
+        return get_user_comment_stats(session, request.user_ids)
+    
+    
+#rankings trending_service serves; it reads them here rather than from this service's tables
+@app.get("/rankings/comments", status_code=200, response_model=list[CommentResponse])
+async def get_comment_rankings():
+    
+    with get_session() as session:
+        return comment_list.response(get_trending_comments(session))
+
+
+@app.get("/rankings/comments/likes", status_code=200, response_model=list[CommentResponse])
+async def get_most_liked_comment_rankings():
+    
+    with get_session() as session:
+        return comment_list.response(get_most_liked_comments(session))
+
+
+@app.get("/rankings/comments/dislikes", status_code=200, response_model=list[CommentResponse])
+async def get_most_disliked_comment_rankings():
+    
+    with get_session() as session:
+        return comment_list.response(get_most_disliked_comments(session))
+
+
+@app.get("/rankings/commenters", status_code=200)
+async def get_commenter_rankings():
     
+    #all-time counts from the table, for when the Redis counts are unavailable
+    with get_session() as session:
+        return get_top_commenters(session)
+    
+
 @app.get("/comments/{comment_id}")
 async def get_comment(comment_id: str):
     
     with get_session() as session:
         comment = retrieve_comment(session, comment_id)
         
-        logger.info(f"Retrieved comment {comment_id}")
+        logger.info("Retrieved comment %s", comment_id)
         return comment
    
     
@@ -124,30 +202,27 @@ async def get_user_comments(user_id: str):
     with get_session() as session:
         comments = retrieve_user_comments(session, user_id)
         
-        logger.info(f"Retrieved comments for user {user_id}")
-        return comments
+        logger.info("Retrieved comments for user %s", user_id)
+        return comment_list.response(comments)
     
    
     
 @app.get("/posts/{post_id}/comments", status_code=200)
-async def get_post_comments(post_id: str):
+async def get_post_comments(post_id: str, cursor: Optional[str] = None, limit: Optional[int] = Query(default=None, ge=1, le=100)):
     
+    #oldest first; pass the last comment_id back as cursor for the next page
     with get_session() as session:
-        comments = retrieve_post_comments(session, post_id)
+        comments = retrieve_post_comments(session, post_id, cursor, limit)
         
-        logger.info(f"Retrieved comments for post {post_id}!")
-        return comments
+        logger.info("Retrieved comments for post %s!", post_id)
+        return comment_list.response(comments)
 
 
 
 @app.put("/comments/{user_id}/{comment_id}", response_model=CommentResponse)
-async def edit_comment(user_id: str, comment_id: str, comment_edit: CommentEdit):
+async def edit_comment(user_id: str, comment_id: str, comment_edit: CommentEdit, identity: Optional[Identity] = Depends(verified_identity)):
     
-    user_req = f"{USER_SERVICE_BASE}/users/{user_id}"
-    user = httpx.get(user_req)
-    
-    if not user.status_code == 200:
-        raise HTTPException(status_code=404, detail= f"User {user_id} not found!")
+    ensure_user(identity, user_id, USER_SERVICE_BASE)
     
     with get_session() as session:
         comment = retrieve_comment(session, comment_id)
@@ -157,32 +232,30 @@ async def edit_comment(user_id: str, comment_id: str, comment_edit: CommentEdit)
         
         edited_comment = edit_comment_info(session, comment, comment_edit)
         
-        logger.info(f"Comment {comment_id} edited by user {user_id}!")
+        logger.info("Comment %s edited by user %s!", comment_id, user_id)
         return edited_comment
     
     
 
 @app.delete("/comments/delete/{user_id}/{comment_id}", status_code=204)
-async def delete_comment(comment_id: str, user_id: str):
-    
-    user_req = f"{USER_SERVICE_BASE}/users/{user_id}"
-    user = httpx.get(user_req)
+async def delete_comment(comment_id: str, user_id: str, identity: Optional[Identity] = Depends(verified_identity)):
     
-    if not user.status_code == 200:
-        logger.warning(f"User {user_id} not found when trying to delete comment {comment_id}")
-        raise HTTPException(status_code=404, detail= f"User {user_id} not found!")
+    ensure_user(identity, user_id, USER_SERVICE_BASE)
     
     with get_session() as session:
         comment = retrieve_comment(session, comment_id)
         
         if comment.user_id != user_id:
-            logger.warning(f"User {user_id} unauthorized to delete comment {comment_id}")
+            logger.warning("User %s unauthorized to delete comment %s", user_id, comment_id)
             raise HTTPException(status_code=403, detail="User not authorized to delete the post!")
         
+        post_id, likes, dislikes = comment.post_id, comment.likes, comment.dislikes
         session.delete(comment)
+        add_events(session, CommentDeleted(comment_id=comment_id, post_id=post_id, user_id=user_id, likes=likes, dislikes=dislikes))
         session.commit()
+        record_comment_deleted(comment_id, user_id)
         
-        logger.info(f"Comment {comment_id} deleted by user {user_id}!")
+        logger.info("Comment %s deleted by user %s!", comment_id, user_id)
         
     return {"detail": "Comment deleted successfully!"}
 
@@ -191,20 +264,21 @@ async def delete_comment(comment_id: str, user_id: str):
 @app.put("/comments/{comment_id}/like", status_code=200)
 async def like_comment(comment_id: str):
     
-    comment = get_comment(comment_id)
+    with get_session() as session:
+        comment = retrieve_comment(session, comment_id)
 
     reaction_key = f"comment:{comment_id}:reactions:{comment.user_id}"
     cached_reaction = redis_client.get(reaction_key)
     
     if cached_reaction == 1:
-        logger.warning(f"User {comment.user_id} already liked comment {comment_id}")
+        logger.warning("User %s already liked comment %s", comment.user_id, comment_id)
         raise HTTPException(status_code=403, detail="User has already liked the comment!")
     else:
         with get_session() as session:
             liked_comment = add_like(session, comment_id)
             
             #logging
-            logger.info(f"Comment {comment_id} liked!")
+            logger.info("Comment %s liked!", comment_id)
             
             #caching
             pipe = redis_client.pipeline()
@@ -220,12 +294,13 @@ async def like_comment(comment_id: str):
 @app.put("/comments/{comment_id}/dislike", status_code=200)
 async def dislike_comment(comment_id: str):
     
-    comment = get_comment(comment_id)
+    with get_session() as session:
+        comment = retrieve_comment(session, comment_id)
     reaction_key = f"comment:{comment_id}:reactions:{comment.user_id}"
     cached_reaction = redis_client.get(reaction_key)
     
     if cached_reaction == -1:
-        logger.warning(f"User {comment.user_id} already disliked comment {comment_id}")
+        logger.warning("User %s already disliked comment %s", comment.user_id, comment_id)
         raise HTTPException(status_code=403, detail="User has already disliked the comment!")
     
     else:
@@ -241,5 +316,5 @@ async def dislike_comment(comment_id: str):
             pipe.execute()
             
             #logging
-            logger.info(f"Comment {comment_id} disliked!")
+            logger.info("Comment %s disliked!", comment_id)
             return disliked_comment
\ No newline at end of file
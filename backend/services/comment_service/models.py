@@ -18,7 +18,11 @@ class CommentResponse(BaseModel):
     content: str = Field(..., min_length=1, max_length=500)
     likes: int
     dislikes: int
-    edited_at: str
+    edited_at: datetime
 
 class CommentEdit(BaseModel):
-    content: Optional[str] = Field(..., min_length=1, max_length=500)
\ No newline at end of file
+    content: Optional[str] = Field(..., min_length=1, max_length=500)
+
+
+class UserStatsRequest(BaseModel):
+    user_ids: list[str] = Field(..., min_length=1, max_length=1000)
@@ -0,0 +1,110 @@
+import logging
+import redis
+
+#per-user hashes of pending counter deltas, plus the set of users that have any
+PENDING_KEY_PREFIX = "user_counters:pending:"
+DIRTY_KEY = "user_counters:dirty"
+
+COUNTER_FIELDS = ("posts", "comments", "total_likes", "total_dislikes")
+
+logger = logging.getLogger(__name__)
+
+
+def pending_key(user_id: str) -> str:
+    return f"{PENDING_KEY_PREFIX}{user_id}"
+
+
+def record_counter_deltas(client: redis.Redis, user_id: str, **deltas: int):
+    """Queue counter changes for a user; user_service coalesces and applies them in batches."""
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    unknown = set(deltas) - set(COUNTER_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown user counters: {sorted(unknown)}")
+
+    try:
+        pipe = client.pipeline()
+        for field, delta in deltas.items():
+            pipe.hincrby(pending_key(user_id), field, delta)
+        pipe.sadd(DIRTY_KEY, user_id)
+        pipe.execute()
+    except redis.RedisError as e:
+        #the reconciliation job repairs whatever is lost here
+        logger.warning("Could not record counter deltas %s for user %s: %s", deltas, user_id, e)
+
+
+#queue an event's deltas unless its id was seen before; the marker and the HINCRBYs happen atomically.
+#KEYS: marker, pending hash, dirty set. ARGV: marker ttl, user id, then field/delta pairs
+RECORD_ONCE_SCRIPT = """
+if not redis.call('SET', KEYS[1], 1, 'NX', 'EX', ARGV[1]) then
+    return 0
+end
+for i = 3, #ARGV, 2 do
+    redis.call('HINCRBY', KEYS[2], ARGV[i], ARGV[i + 1])
+end
+redis.call('SADD', KEYS[3], ARGV[2])
+return 1
+"""
+
+
+def event_marker_key(event_id: str) -> str:
+    return f"user_counters:seen:{event_id}"
+
+
+def record_counter_deltas_once(client: redis.Redis, event_id: str, user_id: str, ttl: int, **deltas: int) -> bool:
+    """Queue counter changes for an event at most once per ttl seconds; False for a duplicate.
+
+    Raises RedisError, so the caller's event stays pending and is retried.
+    """
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    unknown = set(deltas) - set(COUNTER_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown user counters: {sorted(unknown)}")
+
+    args = [ttl, user_id]
+    for field, delta in deltas.items():
+        args += [field, delta]
+
+    keys = [event_marker_key(event_id), pending_key(user_id), DIRTY_KEY]
+    return bool(client.eval(RECORD_ONCE_SCRIPT, len(keys), *keys, *args))
+
+
+def drain_counter_deltas(client: redis.Redis, batch_size: int = 500) -> dict[str, dict[str, int]]:
+    """Atomically take the pending deltas of up to batch_size users."""
+    user_ids = client.spop(DIRTY_KEY, batch_size)
+    if not user_ids:
+        return {}
+
+    pipe = client.pipeline(transaction=True)
+    for user_id in user_ids:
+        pipe.hgetall(pending_key(user_id))
+        pipe.delete(pending_key(user_id))
+    results = pipe.execute()
+
+    drained = {}
+    for user_id, values in zip(user_ids, results[::2]):
+        deltas = {field: int(value) for field, value in values.items() if int(value)}
+        if deltas:
+            drained[user_id] = deltas
+
+    return drained
+
+
+def pending_counter_deltas(client: redis.Redis, user_ids: list[str]) -> dict[str, dict[str, int]]:
+    """The deltas queued for user_ids, left in place."""
+    pipe = client.pipeline(transaction=False)
+    for user_id in user_ids:
+        pipe.hgetall(pending_key(user_id))
+
+    return {
+        user_id: {field: int(value) for field, value in values.items()}
+        for user_id, values in zip(user_ids, pipe.execute()) if values
+    }
+
+
+def requeue_counter_deltas(client: redis.Redis, drained: dict[str, dict[str, int]]):
+    """Put drained deltas back, e.g. after the database write failed."""
+    for user_id, deltas in drained.items():
+        record_counter_deltas(client, user_id, **deltas)
@@ -0,0 +1,286 @@
+import os
+import time
+import socket
+import asyncio
+import logging
+import redis
+from typing import Callable, ClassVar, Literal, Optional
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+
+from common.ids import new_id
+
+#approximate cap per stream; consumers that fall further behind than this lose the oldest events
+EVENT_STREAM_MAXLEN = int(os.getenv("EVENT_STREAM_MAXLEN", "1000000"))
+EVENT_BATCH_SIZE = int(os.getenv("EVENT_BATCH_SIZE", "100"))
+EVENT_BLOCK_MS = int(os.getenv("EVENT_BLOCK_MS", "1000"))
+#a delivery not acked within this long is taken over by another consumer
+EVENT_CLAIM_IDLE_MS = int(os.getenv("EVENT_CLAIM_IDLE_MS", "60000"))
+#after this many deliveries an event goes to <stream>:dead instead of being retried again
+EVENT_MAX_DELIVERIES = int(os.getenv("EVENT_MAX_DELIVERIES", "5"))
+
+POST_STREAM = "events:posts"
+COMMENT_STREAM = "events:comments"
+REACTION_STREAM = "events:reactions"
+USER_STREAM = "events:users"
+
+logger = logging.getLogger(__name__)
+
+
+class Event(BaseModel):
+    """Base for domain events; subclasses set stream and are looked up by class name."""
+
+    stream: ClassVar[str]
+
+    event_id: str = Field(default_factory=new_id)
+    occurred_at: int = Field(default_factory=lambda: int(time.time() * 1000))
+
+    @property
+    def type(self) -> str:
+        return type(self).__name__
+
+
+class PostCreated(Event):
+    stream: ClassVar[str] = POST_STREAM
+    post_id: str
+    user_id: str
+    category: str
+
+
+class PostDeleted(Event):
+    stream: ClassVar[str] = POST_STREAM
+    post_id: str
+    user_id: str
+    category: str
+    likes: int
+    dislikes: int
+
+
+class CommentCreated(Event):
+    stream: ClassVar[str] = COMMENT_STREAM
+    comment_id: str
+    post_id: str
+    user_id: str
+
+
+class CommentDeleted(Event):
+    stream: ClassVar[str] = COMMENT_STREAM
+    comment_id: str
+    post_id: str
+    user_id: str
+    likes: int
+    dislikes: int
+
+
+class ReactionChanged(Event):
+    """Net change to a post's or comment's likes/dislikes; author_id owns the target."""
+
+    stream: ClassVar[str] = REACTION_STREAM
+    target: Literal["post", "comment"]
+    target_id: str
+    author_id: str
+    likes: int = 0
+    dislikes: int = 0
+
+
+class UserFollowed(Event):
+    """following is False for an unfollow."""
+
+    stream: ClassVar[str] = USER_STREAM
+    follower_id: str
+    followee_id: str
+    following: bool = True
+
+
+EVENT_TYPES: dict[str, type[Event]] = {
+    event_type.__name__: event_type
+    for event_type in (PostCreated, PostDeleted, CommentCreated, CommentDeleted, ReactionChanged, UserFollowed)
+}
+
+
+def encode(event: Event) -> dict[str, str]:
+    return {"type": event.type, "data": event.model_dump_json()}
+
+
+def decode(fields: dict[str, str]) -> Event:
+    return EVENT_TYPES[fields["type"]].model_validate_json(fields["data"])
+
+
+def publish(client: redis.Redis, *events: Event):
+    """Append events to their streams in one round trip."""
+    if not events:
+        return
+
+    try:
+        pipe = client.pipeline(transaction=False)
+        for event in events:
+            pipe.xadd(event.stream, encode(event), maxlen=EVENT_STREAM_MAXLEN, approximate=True)
+        pipe.execute()
+    except redis.RedisError as e:
+        #consumers' effects are repaired by the counter reconciliation and leaderboard rebuilds
+        logger.error("Could not publish %s: %s", [event.type for event in events], e)
+
+
+def dead_letter_stream(stream: str) -> str:
+    return f"{stream}:dead"
+
+
+Handler = Callable[[Event], None]
+
+
+class EventConsumer:
+    """One member of a consumer group reading domain events, at least once.
+
+    Reads batches with XREADGROUP and acks each event once its handler returns.
+    A failed event stays pending and is retried when it has been idle for
+    claim_idle_ms (possibly by another replica). After max_deliveries it is
+    copied to <stream>:dead and acked. Handlers must be idempotent.
+    """
+
+    def __init__(self, client: redis.Redis, group: str, handlers: dict[type[Event], Handler],
+                 consumer: Optional[str] = None, batch_size: int = EVENT_BATCH_SIZE, block_ms: int = EVENT_BLOCK_MS,
+                 claim_idle_ms: int = EVENT_CLAIM_IDLE_MS, max_deliveries: int = EVENT_MAX_DELIVERIES):
+        self.client = client
+        self.group = group
+        self.handlers = {event_type.__name__: handler for event_type, handler in handlers.items()}
+        self.streams = sorted({event_type.stream for event_type in handlers})
+        self.consumer = consumer or f"{group}-{socket.gethostname()}-{os.getpid()}"
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.claim_idle_ms = claim_idle_ms
+        self.max_deliveries = max_deliveries
+
+        self._task: Optional[asyncio.Task] = None
+        self._last_claim = 0.0
+        self._stats = {"processed": 0, "failed": 0, "dead_lettered": 0, "claimed": 0}
+
+    def ensure_groups(self):
+        for stream in self.streams:
+            try:
+                #"0" so a new group also sees events published before it existed
+                self.client.xgroup_create(stream, self.group, id="0", mkstream=True)
+            except redis.ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def poll(self) -> int:
+        """Handle one batch of new events; returns how many were read."""
+        response = self.client.xreadgroup(self.group, self.consumer, {stream: ">" for stream in self.streams},
+                                          count=self.batch_size, block=self.block_ms)
+        read = 0
+        for stream, messages in response or []:
+            read += len(messages)
+            self._handle(stream, messages)
+        return read
+
+    def reclaim(self) -> int:
+        """Retry events another consumer (or an earlier attempt) left unacked; dead-letter the hopeless ones."""
+        reclaimed = 0
+
+        for stream in self.streams:
+            pending = self.client.xpending_range(stream, self.group, min="-", max="+", count=self.batch_size,
+                                                 idle=self.claim_idle_ms)
+            if not pending:
+                continue
+
+            hopeless = [entry["message_id"] for entry in pending if entry["times_delivered"] >= self.max_deliveries]
+            retry = [entry["message_id"] for entry in pending if entry["times_delivered"] < self.max_deliveries]
+
+            if hopeless:
+                self._dead_letter(stream, hopeless)
+            if retry:
+                messages = self.client.xclaim(stream, self.group, self.consumer, self.claim_idle_ms, retry)
+                self._stats["claimed"] += len(messages)
+                reclaimed += len(messages)
+                self._handle(stream, messages)
+
+        return reclaimed
+
+    def lag(self) -> dict[str, dict]:
+        """Per stream: events not yet delivered to the group (lag) and delivered but unacked (pending)."""
+        lag = {}
+        for stream in self.streams:
+            for group in self.client.xinfo_groups(stream):
+                if group["name"] == self.group:
+                    lag[stream] = {"lag": group.get("lag"), "pending": group["pending"]}
+        return lag
+
+    def stats(self) -> dict:
+        stats = dict(self._stats, group=self.group, consumer=self.consumer)
+        try:
+            stats["streams"] = self.lag()
+        except redis.RedisError as e:
+            stats["streams"] = {"error": str(e)}
+        return stats
+
+    def _handle(self, stream: str, messages: list):
+        acked = []
+
+        for message_id, fields in messages:
+            if not fields:
+                #trimmed from the stream while pending; nothing left to handle
+                acked.append(message_id)
+                continue
+
+            try:
+                event = decode(fields)
+                handler = self.handlers.get(event.type)
+                if handler is not None:
+                    handler(event)
+            except Exception as e:
+                self._stats["failed"] += 1
+                logger.error("%s failed on %s %s from %s: %s", self.group, fields.get("type"), message_id, stream, e)
+                continue
+
+            acked.append(message_id)
+            self._stats["processed"] += 1
+
+        if acked:
+            self.client.xack(stream, self.group, *acked)
+
+    def _dead_letter(self, stream: str, message_ids: list[str]):
+        pipe = self.client.pipeline(transaction=True)
+        for message_id in message_ids:
+            for _, fields in self.client.xrange(stream, min=message_id, max=message_id):
+                pipe.xadd(dead_letter_stream(stream), dict(fields, source_id=message_id, group=self.group),
+                          maxlen=EVENT_STREAM_MAXLEN, approximate=True)
+        pipe.xack(stream, self.group, *message_ids)
+        pipe.execute()
+
+        self._stats["dead_lettered"] += len(message_ids)
+        logger.error("%s dead-lettered %s events from %s", self.group, len(message_ids), stream)
+
+    async def _run(self):
+        while True:
+            try:
+                await run_in_threadpool(self.ensure_groups)
+                break
+            except redis.RedisError as e:
+                logger.warning("Event consumer %s waiting for Redis: %s", self.group, e)
+                await asyncio.sleep(5)
+
+        while True:
+            try:
+                if time.monotonic() - self._last_claim > self.claim_idle_ms / 1000:
+                    self._last_claim = time.monotonic()
+                    await run_in_threadpool(self.reclaim)
+                await run_in_threadpool(self.poll)
+            except redis.RedisError as e:
+                logger.warning("Event consumer %s lost Redis: %s", self.group, e)
+                await asyncio.sleep(1)
+            except Exception as e:
+                logger.error("Event consumer %s failed: %s", self.group, e)
+                await asyncio.sleep(1)
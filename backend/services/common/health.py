@@ -0,0 +1,111 @@
+import asyncio
+import time
+import httpx
+from typing import Callable, Optional
+
+
+class DependencyHealth:
+    """Readiness checks for a service's dependencies.
+
+    HTTP dependencies are probed concurrently on one shared client, local checks
+    (database, redis) run in worker threads, and the combined report is cached for
+    a few seconds so frequent probes do not fan out into a cascade of requests.
+    Dependencies are probed on /livez, never on their own readiness endpoint.
+    """
+
+    def __init__(self, service: str, dependencies: Optional[dict[str, str]] = None,
+                 checks: Optional[dict[str, Callable[[], None]]] = None,
+                 ttl: float = 5.0, timeout: float = 2.0):
+        self.service = service
+        self.dependencies = dependencies or {}
+        self.checks = checks or {}
+        self.ttl = ttl
+        self.timeout = timeout
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._report: Optional[dict] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def start(self):
+        self._client = httpx.AsyncClient(timeout=self.timeout)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def liveness(self) -> dict:
+        return {
+            "service": self.service,
+            "status": "alive"
+        }
+
+    async def readiness(self) -> dict:
+        if self._is_fresh():
+            return {**self._report, "cached": True}
+
+        async with self._lock:
+            #another probe may have refreshed the report while we waited
+            if self._is_fresh():
+                return {**self._report, "cached": True}
+
+            names = list(self.dependencies) + list(self.checks)
+            results = await asyncio.gather(
+                *(self._probe_http(url) for url in self.dependencies.values()),
+                *(self._probe_check(check) for check in self.checks.values())
+            )
+            dependencies = dict(zip(names, results))
+            healthy = all(result["status"] == "healthy" for result in results)
+
+            self._report = {
+                "service": self.service,
+                "status": "healthy" if healthy else "unhealthy",
+                "dependencies": dependencies
+            }
+            self._checked_at = time.monotonic()
+
+        return {**self._report, "cached": False}
+
+    def _is_fresh(self) -> bool:
+        return self._report is not None and time.monotonic() - self._checked_at < self.ttl
+
+    async def _probe_http(self, base_url: str) -> dict:
+        if self._client is None:
+            await self.start()
+
+        started = time.perf_counter()
+        try:
+            resp = await self._client.get(f"{base_url}/livez")
+        except Exception as e:
+            return {
+                "status": "unreachable",
+                "details": str(e),
+                "response_time_ms": _elapsed_ms(started)
+            }
+
+        return {
+            "status": "healthy" if resp.status_code == 200 else "unhealthy",
+            "code": resp.status_code,
+            "response_time_ms": _elapsed_ms(started)
+        }
+
+    async def _probe_check(self, check: Callable[[], None]) -> dict:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.to_thread(check), timeout=self.timeout)
+        except Exception as e:
+            return {
+                "status": "unhealthy",
+                "details": str(e) or type(e).__name__,
+                "response_time_ms": _elapsed_ms(started)
+            }
+
+        return {
+            "status": "healthy",
+            "response_time_ms": _elapsed_ms(started)
+        }
+
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 3)
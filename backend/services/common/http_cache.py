@@ -0,0 +1,77 @@
+import re
+import hashlib
+import logging
+import redis
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+
+#services publish changed resource paths here; the gateway drops matching cached responses
+HTTP_INVALIDATION_CHANNEL = "http_cache:invalidate"
+
+logger = logging.getLogger(__name__)
+
+
+def etag_for(body: bytes) -> str:
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip() for tag in if_none_match.split(","))
+
+
+def cache_control(shared_max_age: int) -> str:
+    #browsers always revalidate (cheap with the ETag); the gateway may serve it for shared_max_age
+    return f"public, max-age=0, must-revalidate, s-maxage={shared_max_age}"
+
+
+class ETagMiddleware(BaseHTTPMiddleware):
+    """Strong ETags and Cache-Control for successful GETs on the given paths.
+
+    rules is a list of (path regex, seconds a shared cache may reuse the response).
+    The ETag is a hash of the exact body, so any change to the resource (an edit,
+    a like) changes it. A matching If-None-Match gets an empty 304.
+    """
+
+    def __init__(self, app, rules: list[tuple[str, int]]):
+        super().__init__(app)
+        self.rules = [(re.compile(pattern), max_age) for pattern, max_age in rules]
+
+    def _max_age(self, path: str):
+        for pattern, max_age in self.rules:
+            if pattern.search(path):
+                return max_age
+        return None
+
+    async def dispatch(self, request: Request, call_next):
+        max_age = self._max_age(request.url.path) if request.method == "GET" else None
+        response = await call_next(request)
+
+        if max_age is None or response.status_code != 200:
+            return response
+
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        etag = etag_for(body)
+        headers = {"ETag": etag, "Cache-Control": cache_control(max_age)}
+
+        if etag_matches(request.headers.get("if-none-match", ""), etag):
+            return Response(status_code=304, headers=headers)
+
+        headers = {**{key: value for key, value in response.headers.items() if key.lower() != "content-length"}, **headers}
+        return Response(content=body, status_code=200, headers=headers, media_type=response.media_type)
+
+
+def publish_invalidation(client: redis.Redis, *paths: str):
+    """Tell gateways to drop cached responses under these paths (e.g. "/posts/<id>")."""
+    try:
+        pipe = client.pipeline()
+        for path in paths:
+            pipe.publish(HTTP_INVALIDATION_CHANNEL, path)
+        pipe.execute()
+    except redis.RedisError as e:
+        #cached copies then live until their s-maxage runs out
+        logger.warning("Could not publish cache invalidation for %s: %s", paths, e)
@@ -0,0 +1,96 @@
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+import httpx
+from typing import Optional
+from fastapi import Header, HTTPException
+from pydantic import BaseModel
+
+from common.tracing import outgoing_headers
+
+#set to the same value on the gateway and every service that trusts it; unset disables the header
+IDENTITY_SECRET = os.getenv("IDENTITY_SECRET")
+IDENTITY_HEADER = "X-BlogSpot-Identity"
+IDENTITY_TTL = int(os.getenv("IDENTITY_TTL", "60"))
+
+
+class Identity(BaseModel):
+    user_id: str
+    username: str
+    active: bool
+    exp: int
+
+
+def _sign(payload: bytes, secret: str) -> str:
+    return hmac.new(secret.encode(), payload, hashlib.sha256).hexdigest()
+
+
+def sign_identity(user_id: str, username: str, active: bool, expires_at: Optional[int] = None,
+                  secret: Optional[str] = IDENTITY_SECRET) -> str:
+    """Header value the gateway attaches for a user it has already authenticated."""
+    if not secret:
+        raise RuntimeError("IDENTITY_SECRET is not configured")
+
+    exp = int(time.time()) + IDENTITY_TTL
+    if expires_at is not None:
+        exp = min(exp, int(expires_at))
+
+    payload = json.dumps({"sub": user_id, "name": username, "active": active, "exp": exp}, separators=(",", ":")).encode()
+    encoded = base64.urlsafe_b64encode(payload).rstrip(b"=")
+
+    return f"{encoded.decode()}.{_sign(encoded, secret)}"
+
+
+def verify_identity(value: str, secret: Optional[str] = IDENTITY_SECRET) -> Optional[Identity]:
+    """The identity in a signed header, or None if it is malformed, forged or expired."""
+    if not secret or not value or "." not in value:
+        return None
+
+    encoded, signature = value.rsplit(".", 1)
+    if not hmac.compare_digest(signature, _sign(encoded.encode(), secret)):
+        return None
+
+    try:
+        claims = json.loads(base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)))
+        identity = Identity(user_id=claims["sub"], username=claims["name"], active=claims["active"], exp=claims["exp"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+    if identity.exp < time.time():
+        return None
+
+    return identity
+
+
+async def verified_identity(x_blogspot_identity: Optional[str] = Header(default=None)) -> Optional[Identity]:
+    """FastAPI dependency: the caller's identity when the gateway vouched for it, else None."""
+    if x_blogspot_identity is None:
+        return None
+
+    identity = verify_identity(x_blogspot_identity)
+    if identity is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired identity")
+    if not identity.active:
+        raise HTTPException(status_code=403, detail="User is not active")
+
+    return identity
+
+
+def ensure_user(identity: Optional[Identity], user_id: str, user_service_base: str):
+    """Check that user_id may act here.
+
+    Gateway traffic carries a verified identity, so this is a local comparison;
+    only direct service-to-service calls still ask user_service.
+    """
+    if identity is not None:
+        if identity.user_id != user_id:
+            raise HTTPException(status_code=403, detail="Identity does not match the requested user!")
+        return
+
+    user = httpx.head(f"{user_service_base}/users/{user_id}", headers=outgoing_headers())
+
+    if not user.status_code == 200:
+        raise HTTPException(status_code=404, detail=f"User {user_id} not found!")
@@ -0,0 +1,135 @@
+import os
+import sys
+import queue
+import atexit
+import random
+import logging
+import orjson
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
+
+from common.tracing import current_route, current_span
+
+LOG_PATH = os.getenv("LOG_PATH", "./logs/cache_log.txt")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+#rotate at this size, keeping LOG_BACKUP_COUNT old files
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+#records waiting for the writer thread; past this they are dropped rather than blocking a request
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+#"GET /posts/{post_id}=0.01,GET /users/{user_id}/feed=0.1"; overrides the rates a service passes in
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+
+
+def parse_sample_rates(value: str) -> dict[str, float]:
+    rates = {}
+    for rule in filter(None, (part.strip() for part in value.split(","))):
+        route, _, rate = rule.rpartition("=")
+        rates[route.strip()] = float(rate)
+    return rates
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line. Runs on the writer thread, so the message is only built there."""
+
+    def __init__(self, service: str):
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "service": self.service,
+            "logger": record.name,
+            "trace_id": getattr(record, "trace_id", "-"),
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry).decode()
+
+
+class RouteSampler(logging.Filter):
+    """Keeps a fraction of INFO and DEBUG records per route; warnings, errors and sampled traces are always kept.
+
+    Runs on the caller's thread, before the record is queued, so dropped
+    records cost a dict lookup and a random number.
+    """
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+
+        rate = self.rates.get(current_route())
+        if rate is None or rate >= 1.0:
+            return True
+
+        #a sampled trace keeps its logs, so spans and log lines line up
+        span = current_span()
+        if (span is not None and span.sampled) or random.random() < rate:
+            return True
+
+        self.dropped += 1
+        return False
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hands records to the writer thread without formatting them; drops them if the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        #the stock prepare() formats here, on the caller's thread; the listener's handlers format instead
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(service: str, sample_rates: Optional[dict[str, float]] = None,
+                      path: str = LOG_PATH) -> QueueListener:
+    """Replace the root handlers with a queue drained by one thread writing JSON to a rotating file and stdout.
+
+    sample_rates maps "METHOD /route/{template}" to the fraction of its INFO
+    records to keep; LOG_SAMPLE_RATES overrides individual routes.
+    """
+    rates = {**(sample_rates or {}), **parse_sample_rates(LOG_SAMPLE_RATES)}
+    formatter = JSONFormatter(service)
+
+    handlers = []
+    if path:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handlers.append(RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT))
+    handlers.append(logging.StreamHandler(sys.stdout))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(RouteSampler(rates))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    #flush what is queued when the process exits
+    atexit.register(listener.stop)
+    return listener
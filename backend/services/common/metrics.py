@@ -0,0 +1,251 @@
+import time
+import threading
+import httpx
+from bisect import bisect_left
+from typing import TYPE_CHECKING, Optional
+from fastapi import FastAPI, Response
+
+if TYPE_CHECKING:
+    #the gateway has no SQLAlchemy; only the services instrument engines
+    from sqlalchemy.engine import Engine
+
+#seconds; fine at the low end, where most requests and queries land
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """One named metric with a fixed set of labels; one series per distinct label values."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str, labels: tuple = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._series: dict[tuple, object] = {}
+        #request handlers update from the event loop, DB and Redis hooks from worker threads
+        self._lock = threading.Lock()
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = list(self._series.items())
+        for values, value in series:
+            lines.extend(self._render_series(values, value))
+        return lines
+
+    def _render_series(self, values: tuple, value) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labels, values)} {value}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *values, amount: float = 1):
+        with self._lock:
+            self._series[values] = self._series.get(values, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, *values, amount: float = 1):
+        with self._lock:
+            self._series[values] = self._series.get(values, 0) + amount
+
+    def dec(self, *values, amount: float = 1):
+        self.inc(*values, amount=-amount)
+
+    def set(self, value: float, *values):
+        with self._lock:
+            self._series[values] = value
+
+
+class Histogram(Metric):
+    """Bucket counts are kept per bucket and summed when rendered, so observe() touches one slot."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, seconds: float, *values):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(values)
+            if series is None:
+                #one slot per bucket plus +Inf, then sum
+                series = self._series[values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += seconds
+
+    def _render_series(self, values: tuple, series: list) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), series):
+            cumulative += count
+            le = f'le="{bound}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, values, le)} {cumulative}")
+        labels = _format_labels(self.labels, values)
+        lines.append(f"{self.name}_sum{labels} {series[-1]}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+
+    def _register(self, metric: Metric) -> Metric:
+        #re-importing a module (trending imports other services' db modules) returns the existing metric
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, description: str, labels: tuple = ()) -> Counter:
+        return self._register(Counter(name, description, labels))
+
+    def gauge(self, name: str, description: str, labels: tuple = ()) -> Gauge:
+        return self._register(Gauge(name, description, labels))
+
+    def histogram(self, name: str, description: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, description, labels, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+#one registry per process; every service runs a single uvicorn worker
+registry = MetricsRegistry()
+
+HTTP_REQUESTS = registry.counter("http_requests_total", "Requests handled, by route template and status.",
+                                 ("method", "route", "status"))
+HTTP_LATENCY = registry.histogram("http_request_duration_seconds", "Time from request to the end of the response body.",
+                                  ("method", "route"))
+HTTP_IN_FLIGHT = registry.gauge("http_requests_in_flight", "Requests currently being handled.")
+
+DB_CHECKOUT_WAIT = registry.histogram("db_pool_checkout_wait_seconds",
+                                      "Time to get a connection from the pool, including opening a new one.", ("engine",))
+DB_CONNECTIONS_IN_USE = registry.gauge("db_pool_connections_in_use", "Connections checked out of the pool.", ("engine",))
+
+UPSTREAM_LATENCY = registry.histogram("http_client_request_duration_seconds",
+                                      "Outbound call latency to response headers, by upstream.", ("upstream", "method", "status"))
+UPSTREAM_ERRORS = registry.counter("http_client_errors_total", "Outbound calls that got no response.", ("upstream", "method"))
+
+
+_route_paths: dict[object, str] = {}
+
+
+def route_template(scope) -> str:
+    """The matched route's path template ("/posts/{post_id}"), or "unmatched"; call after the app has run."""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+
+    #older Starlette only leaves the endpoint in the scope
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+
+    path = _route_paths.get(endpoint)
+    if path is None:
+        path = next((route.path for route in scope["app"].routes if getattr(route, "endpoint", None) is endpoint), "unmatched")
+        _route_paths[endpoint] = path
+    return path
+
+
+class MetricsMiddleware:
+    """Counts and times every request by its route template, not its raw path, to keep series bounded."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_FLIGHT.dec()
+
+            route = route_template(scope)
+            HTTP_LATENCY.observe(elapsed, scope["method"], route)
+            HTTP_REQUESTS.inc(scope["method"], route, status)
+
+
+def add_metrics(app: FastAPI):
+    """Serve /metrics and time every request; call last so the timing includes the other middleware."""
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return Response(content=registry.render(), media_type=CONTENT_TYPE)
+
+
+def instrument_engine(engine: "Engine", name: str):
+    """Time pool checkouts and track connections in use for one engine."""
+    from sqlalchemy import event
+    #the pool has no event before a checkout starts, so time the call that does it;
+    #patched on the engine, not the pool, so it survives engine.dispose()
+    raw_connection = engine.raw_connection
+
+    def timed_raw_connection():
+        started = time.perf_counter()
+        try:
+            return raw_connection()
+        finally:
+            DB_CHECKOUT_WAIT.observe(time.perf_counter() - started, name)
+
+    engine.raw_connection = timed_raw_connection
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_CONNECTIONS_IN_USE.inc(name)
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        DB_CONNECTIONS_IN_USE.dec(name)
+
+
+def instrument_client(client: httpx.AsyncClient, upstream: Optional[str] = None) -> httpx.AsyncClient:
+    """Record latency of every call made with client, labelled by upstream or else by the host called."""
+
+    async def on_request(request: httpx.Request):
+        request.extensions["metrics_started"] = time.perf_counter()
+
+    async def on_response(response: httpx.Response):
+        started = response.request.extensions.get("metrics_started")
+        if started is not None:
+            UPSTREAM_LATENCY.observe(time.perf_counter() - started, upstream or response.request.url.host,
+                                     response.request.method, response.status_code)
+
+    client.event_hooks["request"].append(on_request)
+    client.event_hooks["response"].append(on_response)
+    return client
@@ -0,0 +1,128 @@
+import os
+import asyncio
+import logging
+import redis
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import BigInteger, Column, Identity, Integer, String, Text, TIMESTAMP, delete, func, select, text
+from sqlalchemy.engine import Engine
+from sqlmodel import SQLModel, Field, Session
+from starlette.concurrency import run_in_threadpool
+
+from common.events import EVENT_STREAM_MAXLEN, Event, encode
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+#how long the relay sleeps once the outbox is empty
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "0.2"))
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxRecord(SQLModel, table=True):
+    """An event waiting to be published, committed in the same transaction as the change it describes."""
+
+    __tablename__ = "outbox"
+
+    #sqlite (unit tests) only autoincrements INTEGER keys
+    id: Optional[int] = Field(default=None, sa_column=Column(BigInteger().with_variant(Integer, "sqlite"), Identity(), primary_key=True))
+    stream: str = Field(sa_column=Column(String(100), nullable=False))
+    type: str = Field(sa_column=Column(String(100), nullable=False))
+    data: str = Field(sa_column=Column(Text, nullable=False))
+    created_at: Optional[datetime] = Field(default=None, sa_column=Column(TIMESTAMP, server_default=func.now(), nullable=False))
+
+
+def add_events(session: Session, *events: Event):
+    """Stage events in the caller's transaction; they are published only if it commits."""
+    for event in events:
+        fields = encode(event)
+        session.add(OutboxRecord(stream=event.stream, type=fields["type"], data=fields["data"]))
+
+
+def claim_batch(limit: int):
+    #oldest first; SKIP LOCKED lets several relays take disjoint batches instead of queueing on each other
+    return (
+        select(OutboxRecord.id, OutboxRecord.stream, OutboxRecord.type, OutboxRecord.data, OutboxRecord.created_at, func.now())
+        .order_by(OutboxRecord.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+
+
+class OutboxRelay:
+    """Publishes outbox rows to Redis Streams and deletes them, one locked batch per transaction.
+
+    If Redis is down the transaction rolls back and the rows wait. A crash after
+    the XADDs but before the commit publishes that batch twice, which consumers
+    tolerate (at-least-once). Ordering holds within a batch, not across relays.
+    """
+
+    def __init__(self, engine: Engine, client: redis.Redis, batch_size: int = OUTBOX_BATCH_SIZE,
+                 interval: float = OUTBOX_POLL_INTERVAL):
+        self.engine = engine
+        self.client = client
+        self.batch_size = batch_size
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"relayed": 0, "batches": 0, "errors": 0, "last_lag_ms": 0.0}
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def relay_once(self) -> int:
+        """Publish and delete up to batch_size rows; returns how many."""
+        with self.engine.begin() as connection:
+            rows = connection.execute(claim_batch(self.batch_size)).all()
+            if not rows:
+                return 0
+
+            pipe = self.client.pipeline(transaction=False)
+            for _, stream, event_type, data, _, _ in rows:
+                pipe.xadd(stream, {"type": event_type, "data": data}, maxlen=EVENT_STREAM_MAXLEN, approximate=True)
+            pipe.execute()
+
+            connection.execute(delete(OutboxRecord).where(OutboxRecord.id.in_([row[0] for row in rows])))
+
+        #age of the oldest row in the batch, by the database's clock. created_at is a naive timestamp in the
+        #session's time zone, and now() comes back in that same zone, so the wall clocks compare directly
+        _, _, _, _, created_at, now = rows[0]
+        self._stats["last_lag_ms"] = round((now.replace(tzinfo=None) - created_at).total_seconds() * 1000, 1)
+        self._stats["relayed"] += len(rows)
+        self._stats["batches"] += 1
+        return len(rows)
+
+    def backlog(self) -> int:
+        with self.engine.connect() as connection:
+            return connection.execute(text("SELECT count(*) FROM outbox")).scalar_one()
+
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        try:
+            stats["backlog"] = self.backlog()
+        except Exception as e:
+            stats["backlog"] = None
+            logger.warning("Could not count outbox backlog: %s", e)
+        return stats
+
+    async def _run(self):
+        while True:
+            try:
+                relayed = await run_in_threadpool(self.relay_once)
+            except Exception as e:
+                self._stats["errors"] += 1
+                logger.warning("Outbox relay failed, will retry: %s", e)
+                relayed = 0
+                await asyncio.sleep(1)
+
+            #drain back to back while there is a backlog
+            if relayed < self.batch_size:
+                await asyncio.sleep(self.interval)
@@ -0,0 +1,43 @@
+import os
+import orjson
+from typing import Any
+from fastapi import FastAPI, Response
+from pydantic import TypeAdapter
+from starlette.middleware.gzip import GZipMiddleware
+
+#responses smaller than this are sent uncompressed; gzip costs more than it saves on a few hundred bytes
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "5"))
+
+
+class ORJSONResponse(Response):
+    """Default response class for every service: orjson instead of json.dumps for the final encode."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+class RowSerializer:
+    """Turns ORM rows into JSON bytes in one pass inside pydantic-core.
+
+    The type is usually list[SomeResponse], or a page model holding such a
+    list. Skips building a response model per row in Python and FastAPI's
+    second jsonable_encoder walk over the result; the model still decides which
+    fields go out and how they are typed.
+    """
+
+    def __init__(self, response_type: Any):
+        self.adapter = TypeAdapter(response_type)
+
+    def dump(self, rows: Any) -> bytes:
+        return self.adapter.dump_json(self.adapter.validate_python(rows, from_attributes=True))
+
+    def response(self, rows: Any, status_code: int = 200) -> Response:
+        return Response(content=self.dump(rows), status_code=status_code, media_type="application/json")
+
+
+def add_compression(app: FastAPI, minimum_size: int = GZIP_MIN_SIZE):
+    #added after ETagMiddleware so it wraps it: ETags are taken over the uncompressed body
+    app.add_middleware(GZipMiddleware, minimum_size=minimum_size, compresslevel=GZIP_LEVEL)
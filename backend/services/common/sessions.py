@@ -0,0 +1,39 @@
+import hashlib
+import logging
+import redis
+
+#refresh sessions live in Redis, written by the gateway:
+#  refresh:<sha256(token)>      hash of one refresh token (family, user_id, username, active[, rotated])
+#  refresh:<sha256(token)>:successor   the token it was rotated to, for a few seconds after rotation
+#  refresh_family:<family_id>   one login; deleting it revokes every token rotated from that login
+#  refresh_user:<user_id>       set of the user's family ids
+logger = logging.getLogger(__name__)
+
+
+def token_key(token: str) -> str:
+    return f"refresh:{hashlib.sha256(token.encode()).hexdigest()}"
+
+
+def successor_key(token: str) -> str:
+    return f"{token_key(token)}:successor"
+
+
+def family_key(family_id: str) -> str:
+    return f"refresh_family:{family_id}"
+
+
+def user_sessions_key(user_id: str) -> str:
+    return f"refresh_user:{user_id}"
+
+
+def revoke_user_sessions(client: redis.Redis, user_id: str):
+    """Log a user out everywhere, e.g. after a password change, deactivation or deletion."""
+    try:
+        families = client.smembers(user_sessions_key(user_id))
+        pipe = client.pipeline()
+        for family_id in families:
+            pipe.delete(family_key(family_id))
+        pipe.delete(user_sessions_key(user_id))
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.error("Could not revoke refresh sessions of user %s: %s", user_id, e)
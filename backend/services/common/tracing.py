@@ -0,0 +1,401 @@
+import os
+import json
+import time
+import queue
+import random
+import inspect
+import logging
+import threading
+import contextvars
+import httpx
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Optional
+from fastapi import FastAPI
+
+from common.metrics import route_template
+
+if TYPE_CHECKING:
+    from sqlalchemy.engine import Engine
+
+#fraction of new traces that record spans; a request arriving with a traceparent follows its caller's decision
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+#JSON lines, one span per line; empty disables export
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "./logs/traces.jsonl")
+#spans waiting to be written; past this they are dropped rather than slowing requests down
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", "10000"))
+
+#W3C trace context: 00-<trace id>-<parent span id>-<flags>
+TRACEPARENT = "traceparent"
+TRACE_ID_HEADER = "X-Trace-Id"
+
+logger = logging.getLogger(__name__)
+
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+#the ASGI scope of the request being handled; routing fills in its route before the endpoint runs
+_scope: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("request_scope", default=None)
+
+
+def _new_trace_id() -> str:
+    return f"{random.getrandbits(128):032x}"
+
+
+def _new_span_id() -> str:
+    return f"{random.getrandbits(64):016x}"
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "sampled", "attributes", "started", "_start")
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, kind: str, sampled: bool,
+                 attributes: Optional[dict] = None):
+        self.trace_id = trace_id
+        self.span_id = _new_span_id()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.sampled = sampled
+        self.attributes = attributes or {}
+        self.started = time.time()
+        self._start = time.perf_counter()
+
+    def child(self, name: str, kind: str = "internal", **attributes) -> "Span":
+        return Span(self.trace_id, self.span_id, name, kind, self.sampled, attributes)
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def end(self, error: Optional[BaseException] = None):
+        if not self.sampled:
+            return
+        if error is not None:
+            self.attributes["error"] = f"{type(error).__name__}: {error}"
+        exporter.export(self, (time.perf_counter() - self._start) * 1000)
+
+
+class FileSpanExporter:
+    """Writes finished spans as JSON lines from a background thread, a stand-in for a collector."""
+
+    def __init__(self, path: str, max_queue: int = TRACE_QUEUE_SIZE):
+        self.path = path
+        self.service = "unknown"
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+
+    def export(self, span: Span, duration_ms: float):
+        if not self.path:
+            return
+        if self._thread is None:
+            self._start()
+
+        try:
+            self._queue.put_nowait({
+                "service": self.service,
+                "trace_id": span.trace_id,
+                "span_id": span.span_id,
+                "parent_id": span.parent_id,
+                "name": span.name,
+                "kind": span.kind,
+                "start": span.started,
+                "duration_ms": round(duration_ms, 3),
+                "attributes": span.attributes,
+            })
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            #take whatever else is waiting so a burst is one write
+            while len(batch) < 1000:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                with open(self.path, "a") as file:
+                    file.write("".join(json.dumps(record, default=str) + "\n" for record in batch))
+            except OSError as e:
+                logger.warning("Could not export %s spans: %s", len(batch), e)
+
+
+exporter = FileSpanExporter(TRACE_EXPORT_PATH)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def current_trace_id() -> Optional[str]:
+    span = _current.get()
+    return span.trace_id if span is not None else None
+
+
+def current_route() -> Optional[str]:
+    """"GET /posts/{post_id}" for the request being handled, or None outside one."""
+    scope = _scope.get()
+    return f"{scope['method']} {route_template(scope)}" if scope is not None else None
+
+
+def outgoing_headers() -> dict[str, str]:
+    """Headers that carry the current trace to another service; for calls not made through a traced client."""
+    span = _current.get()
+    return {TRACEPARENT: span.traceparent()} if span is not None else {}
+
+
+@contextmanager
+def start_span(name: str, kind: str = "internal", **attributes):
+    """Run a block as a child span of the current one; does nothing outside a sampled trace."""
+    parent = _current.get()
+    if parent is None or not parent.sampled:
+        yield parent
+        return
+
+    span = parent.child(name, kind, **attributes)
+    token = _current.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.end(e)
+        raise
+    else:
+        span.end()
+    finally:
+        _current.reset(token)
+
+
+def _parse_traceparent(value: str) -> Optional[tuple[str, str, bool]]:
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) != 2:
+        return None
+    try:
+        flags = int(parts[3], 16)
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+class TracingMiddleware:
+    """Opens a server span per request, continuing the caller's trace from traceparent or starting one.
+
+    Unsampled requests still get a trace id, for log records and the X-Trace-Id
+    response header, but record no spans.
+    """
+
+    def __init__(self, app, sample_rate: float = TRACE_SAMPLE_RATE):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        incoming = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                incoming = _parse_traceparent(value.decode("latin-1"))
+                break
+
+        if incoming is not None:
+            trace_id, parent_id, sampled = incoming
+        else:
+            trace_id, parent_id, sampled = _new_trace_id(), None, random.random() < self.sample_rate
+
+        span = Span(trace_id, parent_id, scope["method"], "server", sampled, {"http.method": scope["method"]})
+        trace_header = (TRACE_ID_HEADER.lower().encode(), trace_id.encode())
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                span.attributes["http.status"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [trace_header]
+            await send(message)
+
+        token = _current.set(span)
+        scope_token = _scope.set(scope)
+        error = None
+        try:
+            await self.app(scope, receive, send_with_trace)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            _scope.reset(scope_token)
+            _current.reset(token)
+            span.name = f"{scope['method']} {route_template(scope)}"
+            span.end(error)
+
+
+def add_tracing(app: FastAPI, service: str):
+    """Trace every request; call after add_metrics so the span covers the whole middleware stack."""
+    exporter.service = service
+    app.add_middleware(TracingMiddleware)
+
+
+def trace_client(client: httpx.AsyncClient) -> httpx.AsyncClient:
+    """Propagate the current trace on every call made with client, with a client span per call when sampled."""
+
+    async def on_request(request: httpx.Request):
+        parent = _current.get()
+        if parent is None:
+            return
+
+        if parent.sampled:
+            span = parent.child(f"{request.method} {request.url.host}", "client", **{"http.url": str(request.url)})
+            request.extensions["trace_span"] = span
+            request.headers[TRACEPARENT] = span.traceparent()
+        else:
+            request.headers[TRACEPARENT] = parent.traceparent()
+
+    async def on_response(response: httpx.Response):
+        span = response.request.extensions.get("trace_span")
+        if span is not None:
+            span.attributes["http.status"] = response.status_code
+            span.end()
+
+    client.event_hooks["request"].append(on_request)
+    client.event_hooks["response"].append(on_response)
+    return client
+
+
+#statements are recorded without their parameters, which can hold user data
+MAX_STATEMENT_LENGTH = 500
+
+
+def trace_engine(engine: "Engine", name: str):
+    """A span per statement executed on engine, while the current request is sampled."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        parent = _current.get()
+        if parent is not None and parent.sampled:
+            context._trace_span = parent.child("db.query", "client", **{"db.name": name, "db.statement": statement[:MAX_STATEMENT_LENGTH]})
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        span = getattr(context, "_trace_span", None)
+        if span is not None:
+            #-1 for most SELECTs
+            if cursor.rowcount >= 0:
+                span.attributes["db.rows"] = cursor.rowcount
+            span.end()
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        span = getattr(exception_context.execution_context, "_trace_span", None)
+        if span is not None:
+            span.end(exception_context.original_exception)
+
+
+def trace_redis(client, name: str = "redis"):
+    """A span per Redis command or pipeline on client (sync or asyncio), while the current request is sampled."""
+    execute_command = client.execute_command
+    pipeline = client.pipeline
+
+    def command_span(args) -> Optional[Span]:
+        parent = _current.get()
+        if parent is None or not parent.sampled:
+            return None
+        return parent.child(f"redis {args[0]}", "client", **{"db.name": name})
+
+    def pipeline_span(pipe) -> Optional[Span]:
+        parent = _current.get()
+        if parent is None or not parent.sampled:
+            return None
+        return parent.child("redis PIPELINE", "client", **{"db.name": name, "redis.commands": len(pipe.command_stack)})
+
+    if _is_async(client):
+        async def traced_command(*args, **options):
+            span = command_span(args)
+            if span is None:
+                return await execute_command(*args, **options)
+            try:
+                result = await execute_command(*args, **options)
+            except BaseException as e:
+                span.end(e)
+                raise
+            span.end()
+            return result
+
+        def traced_pipeline(*args, **kwargs):
+            pipe = pipeline(*args, **kwargs)
+            execute = pipe.execute
+
+            async def traced_execute(*execute_args, **execute_kwargs):
+                span = pipeline_span(pipe)
+                if span is None:
+                    return await execute(*execute_args, **execute_kwargs)
+                try:
+                    result = await execute(*execute_args, **execute_kwargs)
+                except BaseException as e:
+                    span.end(e)
+                    raise
+                span.end()
+                return result
+
+            pipe.execute = traced_execute
+            return pipe
+    else:
+        def traced_command(*args, **options):
+            span = command_span(args)
+            if span is None:
+                return execute_command(*args, **options)
+            try:
+                result = execute_command(*args, **options)
+            except BaseException as e:
+                span.end(e)
+                raise
+            span.end()
+            return result
+
+        def traced_pipeline(*args, **kwargs):
+            pipe = pipeline(*args, **kwargs)
+            execute = pipe.execute
+
+            def traced_execute(*execute_args, **execute_kwargs):
+                span = pipeline_span(pipe)
+                if span is None:
+                    return execute(*execute_args, **execute_kwargs)
+                try:
+                    result = execute(*execute_args, **execute_kwargs)
+                except BaseException as e:
+                    span.end(e)
+                    raise
+                span.end()
+                return result
+
+            pipe.execute = traced_execute
+            return pipe
+
+    client.execute_command = traced_command
+    client.pipeline = traced_pipeline
+    return client
+
+
+def _is_async(client) -> bool:
+    return inspect.iscoroutinefunction(client.execute_command)
+
+
+#every log record carries the current trace id ("-" outside a request), for %(trace_id)s in formats
+_record_factory = logging.getLogRecordFactory()
+
+
+def _record_with_trace_id(*args, **kwargs) -> logging.LogRecord:
+    record = _record_factory(*args, **kwargs)
+    span = _current.get()
+    record.trace_id = span.trace_id if span is not None else "-"
+    return record
+
+
+logging.setLogRecordFactory(_record_with_trace_id)
@@ -1,12 +1,16 @@
 from sqlmodel import SQLModel, Field, create_engine, select, Enum, Session
-from sqlalchemy import Column, Integer, String, TIMESTAMP, func, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, TIMESTAMP, func, text, Enum as SQLEnum
 from typing import Optional
 from pydantic import EmailStr
 from models import PostCreate, PostResponse, PostEdit, PostSummary
 from datetime import datetime
 import os
 from fastapi import HTTPException
-import uuid
+from common.metrics import instrument_engine
+from common.tracing import trace_engine
+from common.ids import UUIDKey, new_id, uuid_column_upgrades
+from common.events import PostCreated, ReactionChanged
+from common.outbox import add_events
 import enum
 
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -17,6 +21,8 @@ engine = create_engine(DATABASE_URL,
                         pool_size=5,
                         max_overflow=10,
                         echo=False, )
+instrument_engine(engine, "posts")
+trace_engine(engine, "posts")
 
 
 class PostCategory(str, enum.Enum):
@@ -34,8 +40,8 @@ class PostCreateDB(SQLModel, table=True):
     
     __tablename__ = "posts"
     
-    post_id: str = Field(sa_column=Column(String, primary_key=True, unique=True))
-    user_id: str = Field(sa_column=Column(String, unique=True))
+    post_id: str = Field(sa_column=Column(UUIDKey, primary_key=True, unique=True))
+    user_id: str = Field(sa_column=Column(UUIDKey, nullable=False, index=True))
     username: str = Field(sa_column=Column(String(50), nullable=False))
     title: str = Field(sa_column=Column(String(200), nullable=False))
     category: PostCategory = Field(sa_column=Column(SQLEnum(PostCategory, name="post_category")), default="Other")
@@ -43,25 +49,47 @@ class PostCreateDB(SQLModel, table=True):
     likes: int = Field(sa_column=Column(Integer, nullable=False, default=0, server_default="0"))
     dislikes: int = Field(sa_column=Column(Integer, nullable=False, default=0, server_default="0"))
     edited_at: str = Field(sa_column=Column(TIMESTAMP, server_default=func.now(), nullable=False))
+
+
+#idempotent DDL for tables that create_all() will not touch once they exist
+SCHEMA_UPGRADES = [
+    #(category, score) index so per-category leaderboards never sort the whole table
+    "CREATE INDEX IF NOT EXISTS ix_posts_category_score ON posts (category, (likes - dislikes) DESC)",
+    #authors write many posts; user_id was wrongly declared unique
+    "ALTER TABLE posts DROP CONSTRAINT IF EXISTS posts_user_id_key",
+    "CREATE INDEX IF NOT EXISTS ix_posts_user_id ON posts (user_id)",
+    #ids used to be varchar uuid4 strings
+    *uuid_column_upgrades("posts", "post_id", "user_id"),
+]
     
     
 def init_db():
     SQLModel.metadata.create_all(engine)
+    with engine.begin() as connection:
+        for statement in SCHEMA_UPGRADES:
+            connection.execute(text(statement))
     print("Database initialized and tables created (if not exist).")
 
 
 def close_db_connection():
     engine.dispose()
     print("Database connection closed.")
+
+def ping_db():
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
     
     
 def create_new_post(session: Session, post: PostCreate) -> PostResponse:
     created = datetime.now().isoformat()
-    post_id = str(uuid.uuid4())
+    post_id = new_id()
     
     post = PostCreateDB(post_id=post_id, user_id=post.user_id, username=post.username, title=post.title, category=post.category, content=post.content, edited_at=created)
     
     session.add(post)
+    #the event commits or rolls back with the post
+    add_events(session, PostCreated(post_id=post_id, user_id=post.user_id, category=post.category))
     session.commit()
     session.flush(post)
     
@@ -93,15 +121,7 @@ def retrieve_post_summary(session: Session, post_id: str) -> PostSummary:
     if (not post):
         raise HTTPException(status_code=404, detail="Post not found")
     else:
-        summary = PostSummary(
-            post_id=post.post_id,
-            title=post.title,
-            category=post.category,
-            likes=post.likes,
-            dislikes=post.dislikes,
-            edited_at=post.edited_at
-        )
-        return summary
+        return _to_summary(post)
     
 def retrieve_user_posts(session: Session, user_id: str):
     query = select(PostCreateDB).where(PostCreateDB.user_id == user_id) 
@@ -138,6 +158,7 @@ def add_like(session: Session, post_id: str) -> PostResponse:
     setattr(post, "likes", post.likes+1)
     
     session.add(post)
+    add_events(session, ReactionChanged(target="post", target_id=post.post_id, author_id=post.user_id, likes=1))
     session.commit()
     session.refresh(post)
     
@@ -151,65 +172,101 @@ def add_dislike(session: Session, post: str) -> PostResponse:
     
     setattr(post, "dislikes", post.dislikes+1)
     session.add(post)
+    add_events(session, ReactionChanged(target="post", target_id=post.post_id, author_id=post.user_id, dislikes=1))
     session.commit()
     session.refresh(post)
     
     return post
 
 
-def get_trending_posts(session: Session) -> list[PostSummary]:
+def get_trending_posts(session: Session) -> list[PostCreateDB]:
     statement = select(PostCreateDB).order_by((PostCreateDB.likes - PostCreateDB.dislikes).desc()).limit(10)
-    results = session.exec(statement).all()
-    
-    trending_posts = []
-    for post in results:
-        summary = PostSummary(
-            post_id=post.post_id,
-            username=post.username,
-            title=post.title,
-            category=post.category,
-            likes=post.likes,
-            dislikes=post.dislikes,
-            edited_at=post.edited_at
-        )
-        trending_posts.append(summary)
-        
-    return trending_posts
+    
+    return session.exec(statement).all()
 
-def get_most_disliked(session: Session) -> list[PostSummary]:
+def get_most_disliked(session: Session) -> list[PostCreateDB]:
     statement = select(PostCreateDB).order_by(PostCreateDB.dislikes.desc()).limit(10)
-    results = session.exec(statement).all()
-    
-    disliked_posts = []
-    for post in results:
-        summary = PostSummary(
-            post_id=post.post_id,
-            username=post.username,
-            title=post.title,
-            category=post.category,
-            likes=post.likes,
-            dislikes=post.dislikes,
-            edited_at=post.edited_at
-        )
-        disliked_posts.append(summary)
-        
-    return disliked_posts
+    
+    return session.exec(statement).all()
 
-def get_most_liked(session: Session) -> list[PostSummary]:
+def get_most_liked(session: Session) -> list[PostCreateDB]:
     statement = select(PostCreateDB).order_by(PostCreateDB.likes.desc()).limit(10)
-    results = session.exec(statement).all()
-    
-    liked_posts = []
-    for post in results:
-        summary = PostSummary(
-            post_id=post.post_id,
-            username=post.username,
-            title=post.title,
-            category=post.category,
-            likes=post.likes,
-            dislikes=post.dislikes,
-            edited_at=post.edited_at
-        )
-        liked_posts.append(summary)
-        
-    return liked_posts
\ No newline at end of file
+    
+    return session.exec(statement).all()
+
+
+def get_trending_posts_by_category(session: Session, category: PostCategory, limit: int = 10) -> list[PostCreateDB]:
+    statement = (
+        select(PostCreateDB)
+        .where(PostCreateDB.category == category)
+        .order_by((PostCreateDB.likes - PostCreateDB.dislikes).desc())
+        .limit(limit)
+    )
+    return session.exec(statement).all()
+
+
+def get_posts_by_ids(session: Session, post_ids: list[str]) -> list[PostCreateDB]:
+    if not post_ids:
+        return []
+    
+    statement = select(PostCreateDB).where(PostCreateDB.post_id.in_(post_ids))
+    posts = {post.post_id: post for post in session.exec(statement).all()}
+    
+    #keep the order the caller asked for, dropping ids that no longer exist
+    return [posts[post_id] for post_id in post_ids if post_id in posts]
+
+
+def retrieve_posts(session: Session, post_ids: list[str]) -> list[PostCreateDB]:
+    if not post_ids:
+        return []
+    
+    statement = select(PostCreateDB).where(PostCreateDB.post_id.in_(post_ids))
+    posts = {post.post_id: post for post in session.exec(statement).all()}
+    
+    return [posts[post_id] for post_id in post_ids if post_id in posts]
+
+
+def get_user_post_stats(session: Session, user_ids: list[str]) -> dict[str, dict]:
+    statement = (
+        select(PostCreateDB.user_id, func.count(PostCreateDB.post_id), func.coalesce(func.sum(PostCreateDB.likes), 0), func.coalesce(func.sum(PostCreateDB.dislikes), 0))
+        .where(PostCreateDB.user_id.in_(user_ids))
+        .group_by(PostCreateDB.user_id)
+    )
+    
+    return {
+        user_id: {"count": count, "likes": int(likes), "dislikes": int(dislikes)}
+        for user_id, count, likes, dislikes in session.exec(statement).all()
+    }
+
+
+def iter_post_scores(session: Session, batch_size: int = 1000):
+    statement = select(PostCreateDB.post_id, PostCreateDB.category, PostCreateDB.likes - PostCreateDB.dislikes)
+    
+    for post_id, category, score in session.exec(statement.execution_options(yield_per=batch_size)):
+        yield post_id, category, score
+
+
+def _to_summary(post: PostCreateDB) -> PostSummary:
+    return PostSummary(
+        post_id=post.post_id,
+        username=post.username,
+        title=post.title,
+        category=post.category,
+        likes=post.likes,
+        dislikes=post.dislikes,
+        edited_at=post.edited_at
+    )
+
+
+def to_response(post: PostCreateDB) -> PostResponse:
+    return PostResponse(
+        post_id=post.post_id,
+        user_id=post.user_id,
+        username=post.username,
+        title=post.title,
+        category=post.category,
+        content=post.content,
+        likes=post.likes,
+        dislikes=post.dislikes,
+        edited_at=post.edited_at
+    )
@@ -0,0 +1,145 @@
+import os
+import uuid
+import asyncio
+import logging
+import redis
+from typing import Callable, Optional
+from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
+from db import PostCategory, iter_post_scores
+from common.tracing import trace_redis
+
+REDIS_HOST = os.getenv("REDIS_HOST", "redis")
+
+#one sorted set per category plus a global one, scored by likes - dislikes
+GLOBAL_LEADERBOARD_KEY = "trending:posts:all"
+#writes move scores by deltas, which a failed write leaves behind; the rebuild puts them back in step
+LEADERBOARD_REBUILD_INTERVAL = float(os.getenv("LEADERBOARD_REBUILD_INTERVAL", "3600"))
+#a rebuild that dies leaves its half-filled staging keys to expire
+LEADERBOARD_STAGING_TTL = 600
+
+redis_client = trace_redis(redis.Redis(
+    host=REDIS_HOST,
+    port=6379,
+    decode_responses=True
+))
+
+logger = logging.getLogger(__name__)
+
+
+def leaderboard_key(category: Optional[PostCategory] = None) -> str:
+    if category is None:
+        return GLOBAL_LEADERBOARD_KEY
+
+    return f"trending:posts:category:{PostCategory(category).value}"
+
+
+def add_post(post_id: str, category: PostCategory):
+    try:
+        pipe = redis_client.pipeline()
+        #NX so a reaction that got there first keeps its score
+        pipe.zadd(GLOBAL_LEADERBOARD_KEY, {post_id: 0}, nx=True)
+        pipe.zadd(leaderboard_key(category), {post_id: 0}, nx=True)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning("Could not add post %s to leaderboard: %s", post_id, e)
+
+
+def record_score_change(post_id: str, category: PostCategory, delta: int):
+    #increments commute, so concurrent reactions land in any order without overwriting each other
+    try:
+        pipe = redis_client.pipeline()
+        pipe.zincrby(GLOBAL_LEADERBOARD_KEY, delta, post_id)
+        pipe.zincrby(leaderboard_key(category), delta, post_id)
+        pipe.execute()
+    except redis.RedisError as e:
+        #a lost delta is put right by the next rebuild, so never fail the write over it
+        logger.warning("Could not update leaderboard for post %s: %s", post_id, e)
+
+
+def remove_post(post_id: str, category: PostCategory):
+    try:
+        pipe = redis_client.pipeline()
+        pipe.zrem(GLOBAL_LEADERBOARD_KEY, post_id)
+        pipe.zrem(leaderboard_key(category), post_id)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning("Could not remove post %s from leaderboard: %s", post_id, e)
+
+
+def top_post_ids(category: Optional[PostCategory] = None, limit: int = 10) -> list[str]:
+    return redis_client.zrevrange(leaderboard_key(category), 0, limit - 1)
+
+
+def rebuild_leaderboards(session: Session, batch_size: int = 1000, if_missing: bool = False):
+    """Recompute every leaderboard from the posts table and swap the results in.
+
+    Scores are written to staging keys and renamed over the live ones in one
+    MULTI, so readers never see a half-built board. A reaction or delete that
+    lands between reading its row and the swap is lost until the next run.
+    """
+    if if_missing and redis_client.exists(GLOBAL_LEADERBOARD_KEY):
+        return
+
+    keys = [leaderboard_key()] + [leaderboard_key(category) for category in PostCategory]
+    run = uuid.uuid4().hex
+    staging = {key: f"{key}:rebuild:{run}" for key in keys}
+    filled = set()
+
+    pipe = redis_client.pipeline(transaction=False)
+    pending = 0
+
+    for post_id, category, score in iter_post_scores(session, batch_size=batch_size):
+        for key in (GLOBAL_LEADERBOARD_KEY, leaderboard_key(category)):
+            pipe.zadd(staging[key], {post_id: score})
+            if key not in filled:
+                pipe.expire(staging[key], LEADERBOARD_STAGING_TTL)
+                filled.add(key)
+        pending += 1
+
+        if pending >= batch_size:
+            pipe.execute()
+            pending = 0
+
+    pipe.execute()
+
+    swap = redis_client.pipeline()
+    for key in keys:
+        if key in filled:
+            swap.rename(staging[key], key)
+            swap.persist(key)
+        else:
+            #no posts left in that category
+            swap.delete(key)
+    swap.execute()
+    logger.info("Trending leaderboards rebuilt from the posts table")
+
+
+class LeaderboardRebuilder:
+    """Runs rebuild_leaderboards on a fixed interval in the background."""
+
+    def __init__(self, rebuild: Callable[[], None], interval: float = LEADERBOARD_REBUILD_INTERVAL):
+        self.rebuild = rebuild
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await run_in_threadpool(self.rebuild)
+            except Exception as e:
+                logger.error("Leaderboard rebuild failed: %s", e)
@@ -1,21 +1,65 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Response, BackgroundTasks, Depends
 from datetime import datetime
-from models import PostCreate, PostResponse, PostEdit, PostSummary
-from db import init_db, close_db_connection, engine, create_new_post, retrieve_post, retrieve_post_summary, retrieve_user_posts, edit_post_info, add_like, add_dislike
+from models import PostCreate, PostResponse, PostEdit, PostSummary, PostBatchRequest, FeedPage, UserStatsRequest
+from db import init_db, close_db_connection, ping_db, engine, create_new_post, retrieve_post, retrieve_post_summary, retrieve_user_posts, edit_post_info, add_like, add_dislike, retrieve_posts, to_response, get_user_post_stats, PostCategory, get_trending_posts, get_trending_posts_by_category, get_most_liked, get_most_disliked
+from leaderboard import redis_client, add_post, record_score_change, remove_post, rebuild_leaderboards, LeaderboardRebuilder
+from timeline import distribute_post, remove_author_post, celebrity_followees, merge_feed, now_ms
+from common.health import DependencyHealth
+from common.events import PostDeleted
+from common.outbox import OutboxRelay, add_events
+from common.identity import Identity, verified_identity, ensure_user
+from common.http_cache import ETagMiddleware, publish_invalidation
+from common.metrics import add_metrics, instrument_client
+from common.tracing import add_tracing, outgoing_headers, trace_client
+from common.responses import ORJSONResponse, RowSerializer, add_compression
+from common.log_setup import configure_logging
+from typing import Optional
 import httpx
+import redis
 import logging
 from contextlib import asynccontextmanager, contextmanager
 from sqlmodel import Session
 import os
 
 USER_SERVICE_BASE = os.getenv("USER_SERVICE_BASE", "http://user-service:8000")
-COMMENT_SERVICE_BASE = os.getenv("COMMENT_SERVICE_BASE", "http://comment-service:8002")
+POST_CACHE_MAX_AGE = int(os.getenv("POST_CACHE_MAX_AGE", "60"))
+
+#shared keep-alive client for user_service calls made off the request path
+user_service_client = trace_client(instrument_client(httpx.AsyncClient(timeout=5.0), "user"))
+
+#domain events are written to the outbox table with the change and published from here
+outbox_relay = OutboxRelay(engine, redis_client)
+
+def rebuild_all_leaderboards():
+    with Session(engine) as session:
+        rebuild_leaderboards(session)
+
+
+leaderboard_rebuilder = LeaderboardRebuilder(rebuild_all_leaderboards)
+
+health = DependencyHealth(
+    "Post Service",
+    dependencies={"User Service": USER_SERVICE_BASE},
+    checks={"Database": ping_db}
+)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     init_db()
+    await health.start()
+    with Session(engine) as session:
+        try:
+            rebuild_leaderboards(session, if_missing=True)
+        except redis.RedisError as e:
+            logger.warning("Skipping leaderboard rebuild: %s", e)
+    outbox_relay.start()
+    leaderboard_rebuilder.start()
     yield
+    await leaderboard_rebuilder.close()
+    await outbox_relay.close()
+    await user_service_client.aclose()
+    await health.close()
     close_db_connection()
     
     
@@ -29,85 +73,134 @@ def get_session():
       
 
 #LOGGING SETUP
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
-        logging.FileHandler("./logs/cache_log.txt", mode="a"),
-        logging.StreamHandler()
-    ]
-)
+#reads log a 10% sample at INFO; warnings and errors are always written
+configure_logging("post_service", sample_rates={
+    "GET /posts/{post_id}": 0.1,
+    "GET /posts/{post_id}/summary": 0.1,
+    "GET /users/{user_id}/posts": 0.1,
+    "GET /users/{user_id}/feed": 0.1
+})
 
 logger = logging.getLogger(__name__)
 
 
 app = FastAPI(
     title="Post Service",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
+#writes below publish invalidations, so the gateway can hold these for a while
+app.add_middleware(ETagMiddleware, rules=[(r"^/posts/[^/]+(/summary)?$", POST_CACHE_MAX_AGE)])
+add_compression(app)
+add_metrics(app)
+add_tracing(app, "post_service")
+
+#list endpoints serialize rows straight to JSON
+post_list = RowSerializer(list[PostResponse])
+feed_page = RowSerializer(FeedPage)
+
 #endpoints
+@app.get("/livez")
+async def liveness_check():
+    return health.liveness()
+
+
+@app.get("/readyz")
+async def readiness_check(response: Response):
+    report = await health.readiness()
+    
+    if report["status"] != "healthy":
+        response.status_code = 503
+    return report
+
+
 @app.get("/health")
 async def health_check():
-    try:
-        async with httpx.AsyncClient(timeout=2.0) as client:
-            resp = await client.get(f"{USER_SERVICE_BASE}/health")
-        if resp.status_code != 200:
-            return {
-                "status": "unhealthy",
-                "details": "User Service returned non-200",
-                "code": resp.status_code
-            }
-        return {
-            "service": "Post Service",
-            "status": "healthy",
-            "dependencies": {
-                "User Service": {
-                    "status": "healthy",
-                    "response_time_ms": resp.elapsed.total_seconds() * 1000
-                }
-            }
-        }
-    except Exception as e:
-        return {
-            "status": "starting",
-            "details": f"User Service not reachable: {str(e)}"
-        }
+    return await health.readiness()
         
         
+@app.get("/outbox/stats", status_code=200)
+def get_outbox_stats():
+    #"backlog" is events committed but not yet on their streams
+    return outbox_relay.stats()
+
+
 @app.post("/posts", status_code=201, response_model=PostResponse)
-async def create_post(post: PostCreate):
+async def create_post(post: PostCreate, background_tasks: BackgroundTasks, identity: Optional[Identity] = Depends(verified_identity)):
     
-    user_req = f"{USER_SERVICE_BASE}/users/{post.user_id}"
-    user = httpx.get(user_req)
-    
-    if not user.status_code == 200:
-        raise HTTPException(status_code=404, detail= f"User {post.user_id} not found!")
+    ensure_user(identity, post.user_id, USER_SERVICE_BASE)
     
     with get_session() as session:
         new_post = create_new_post(session, post)
+        add_post(new_post["post_id"], new_post["category"])
+        
+        #timeline fan-out happens after the response is sent
+        background_tasks.add_task(
+            distribute_post, user_service_client, USER_SERVICE_BASE, post.user_id,
+            new_post["post_id"], now_ms()
+        )
         
-        logger.info(f"Post {new_post['post_id']} created by user {post.user_id}")
+        logger.info("Post %s created by user %s", new_post["post_id"], post.user_id)
         return new_post
     
 
-@app.get("/posts/{post_id}", status_code=201 ,response_model=PostResponse)
+@app.post("/posts:batch", status_code=200, response_model=list[PostResponse])
+async def get_posts_batch(batch: PostBatchRequest):
+    
+    with get_session() as session:
+        #request order is kept; deleted or unknown ids are skipped
+        return post_list.response(retrieve_posts(session, batch.post_ids))
+    
+
+@app.post("/stats/users", status_code=200)
+async def get_user_stats(request: UserStatsRequest):
+    
+    #per-author post counts and reactions received, used to reconcile user counters
+    with get_session() as session:
+        return get_user_post_stats(session, request.user_ids)
+    
+
+#trending_service reads post rankings here instead of querying the posts table itself
+@app.get("/rankings/posts", status_code=200, response_model=list[PostResponse])
+async def get_post_rankings(category: Optional[PostCategory] = None):
+    
+    with get_session() as session:
+        posts = get_trending_posts_by_category(session, category) if category is not None else get_trending_posts(session)
+        return post_list.response(posts)
+
+
+@app.get("/rankings/posts/likes", status_code=200, response_model=list[PostResponse])
+async def get_most_liked_posts():
+    
+    with get_session() as session:
+        return post_list.response(get_most_liked(session))
+
+
+@app.get("/rankings/posts/dislikes", status_code=200, response_model=list[PostResponse])
+async def get_most_disliked_posts():
+    
+    with get_session() as session:
+        return post_list.response(get_most_disliked(session))
+    
+
+@app.get("/posts/{post_id}", status_code=200, response_model=PostResponse)
 async def get_post(post_id: str):
     
     with get_session() as session:
         post = retrieve_post(session, post_id)
         
-        logger.info(f"Retrieved post {post_id}")
-        return post
+        logger.info("Retrieved post %s", post_id)
+        return to_response(post)
 
 
-@app.get("/posts/{post_id}/summary", status_code=201, response_model=PostSummary)
+@app.get("/posts/{post_id}/summary", status_code=200, response_model=PostSummary)
 async def get_post_summary(post_id: str):
     
     with get_session() as session:
         summary = retrieve_post_summary(session, post_id)
         
-        logger.info(f"Retrieved summary for post {post_id}")
+        logger.info("Retrieved summary for post %s", post_id)
         return summary
     
 
@@ -115,64 +208,71 @@ async def get_post_summary(post_id: str):
 async def get_user_post_summary(user_id: str):
     
     user_req = f"{USER_SERVICE_BASE}/users/{user_id}"
-    user = httpx.get(user_req)
+    user = httpx.head(user_req, headers=outgoing_headers())
     
     if not user.status_code == 200:
         raise HTTPException(status_code=404, detail= f"User {user_id} not found!")
     
     with get_session() as session:
         posts = retrieve_user_posts(session, user_id)
-        logger.info(f"Retrieved posts for user {user_id}")
-        return posts
+        logger.info("Retrieved posts for user %s", user_id)
+        return post_list.response(posts)
         
 
-@app.put("posts/{user_id}/{post_id}", status_code=200)
-async def edit_post(user_id: str, post_id: str, edit: PostEdit):
+@app.get("/users/{user_id}/feed", status_code=200, response_model=FeedPage)
+async def get_home_feed(user_id: str, cursor: Optional[str] = None, limit: int = Query(default=20, ge=1, le=100)):
     
-    user_req = f"{USER_SERVICE_BASE}/users/{user_id}"
-    user = httpx.get(user_req)
+    try:
+        celebrities = await celebrity_followees(user_service_client, USER_SERVICE_BASE, user_id)
+        post_ids, next_cursor = merge_feed(user_id, celebrities, cursor, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid feed cursor {cursor}")
+    except (redis.RedisError, httpx.HTTPError) as e:
+        logger.warning("Feed for user %s unavailable: %s", user_id, e)
+        raise HTTPException(status_code=503, detail="Feed temporarily unavailable")
     
-    if not user.status_code == 200:
-        raise HTTPException(status_code=404, detail= f"User {user_id} not found!")
+    with get_session() as session:
+        posts = retrieve_posts(session, post_ids)
+        
+        logger.info("Retrieved feed for user %s", user_id)
+        return feed_page.response({"posts": posts, "next_cursor": next_cursor})
+        
+
+@app.put("/posts/{user_id}/{post_id}", status_code=200)
+async def edit_post(user_id: str, post_id: str, edit: PostEdit, identity: Optional[Identity] = Depends(verified_identity)):
+    
+    ensure_user(identity, user_id, USER_SERVICE_BASE)
     
     with get_session() as session:
         updated_post = edit_post_info(session, user_id, post_id, edit)
+        publish_invalidation(redis_client, f"/posts/{post_id}")
         
-        logger.info(f"Post {post_id} edited by user {user_id}")
+        logger.info("Post %s edited by user %s", post_id, user_id)
         return updated_post
     
 
 @app.delete("/posts/delete/{user_id}/{post_id}", status_code=204)
-async def delete_post(user_id: str, post_id: str):
+async def delete_post(user_id: str, post_id: str, identity: Optional[Identity] = Depends(verified_identity)):
     
-    user_req = f"{USER_SERVICE_BASE}/users/{user_id}"
-    user = httpx.get(user_req)
-    
-    if not user.status_code == 200:
-        logger.warning(f"User {user_id} not found when trying to delete post {post_id}")
-        raise HTTPException(status_code=404, detail= f"User {user_id} not found!")
+    ensure_user(identity, user_id, USER_SERVICE_BASE)
     
     with get_session() as session:
         post = retrieve_post(session, post_id)
         
         if post.user_id != user_id:
-            logger.warning(f"User {user_id} unauthorized to delete post {post_id}")
+            logger.warning("User %s unauthorized to delete post %s", user_id, post_id)
             raise HTTPException(status_code=403, detail="User not authorized to delete this post!")
         
+        category, likes, dislikes = post.category, post.likes, post.dislikes
         session.delete(post)
+        #comment_service deletes the post's comments and user_service adjusts counters off this event
+        add_events(session, PostDeleted(post_id=post_id, user_id=user_id, category=category, likes=likes, dislikes=dislikes))
         session.commit()
-    
-    
-        #delete comments associated with post
-        post_req = f"{COMMENT_SERVICE_BASE}/posts/{post_id}/comments"
-        comments = httpx.get(post_req)
-        
-        if comments.status_code == 200:
-            for comment in comments.json():
-                delete_req = f"{COMMENT_SERVICE_BASE}/comments/delete/{user_id}/{comment['comment_id']}"
-                httpx.delete(delete_req)
+        remove_post(post_id, category)
+        remove_author_post(user_id, post_id)
+        publish_invalidation(redis_client, f"/posts/{post_id}")
         
-        logger.info(f"Post {post_id} deleted by user {user_id}")
+        logger.info("Post %s deleted by user %s", post_id, user_id)
         return {"detail": "Post deleted successfully"}
 
 
@@ -182,9 +282,11 @@ async def like_post(post_id: str):
     
     with get_session() as session:
         updated_post = add_like(session, post_id)
+        record_score_change(post_id, updated_post.category, 1)
+        publish_invalidation(redis_client, f"/posts/{post_id}")
         
         #logging
-        logger.info(f"Post {post_id} liked!")
+        logger.info("Post %s liked!", post_id)
         return updated_post
         
 
@@ -194,6 +296,8 @@ async def dislike_post(post_id: str):
     with get_session() as session:
         post = retrieve_post(session, post_id)
         updated_post = add_dislike(session, post)
+        record_score_change(post_id, updated_post.category, -1)
+        publish_invalidation(redis_client, f"/posts/{post_id}")
         
-        logger.info(f"Post {post_id} disliked!")
+        logger.info("Post %s disliked!", post_id)
         return updated_post
\ No newline at end of file
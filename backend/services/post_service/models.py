@@ -33,7 +33,7 @@ class PostResponse(BaseModel):
     content: str = Field(..., min_length=1, max_length=5000)
     likes: int
     dislikes: int
-    edited_at: str
+    edited_at: datetime
     
     
 class PostEdit(BaseModel):
@@ -47,4 +47,22 @@ class PostSummary(BaseModel):
     category: str = categoryList
     likes: int
     dislikes: int
-    edited_at: str
\ No newline at end of file
+    edited_at: datetime
+    
+    
+#most ids a single batch fetch may resolve
+POST_BATCH_LIMIT = 100
+
+
+class PostBatchRequest(BaseModel):
+    post_ids: list[str] = Field(..., min_length=1, max_length=POST_BATCH_LIMIT)
+
+
+class FeedPage(BaseModel):
+    posts: list[PostResponse]
+    #"<created ms>:<post_id>" of the last post on the page
+    next_cursor: Optional[str] = None
+
+
+class UserStatsRequest(BaseModel):
+    user_ids: list[str] = Field(..., min_length=1, max_length=1000)
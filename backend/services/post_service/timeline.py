@@ -0,0 +1,195 @@
+import os
+import time
+import logging
+import httpx
+import redis
+from typing import Iterable, Optional
+from common.tracing import trace_redis
+
+REDIS_HOST = os.getenv("REDIS_HOST", "redis")
+
+#home timelines are capped sorted sets of post ids scored by creation time (ms)
+TIMELINE_LENGTH = int(os.getenv("TIMELINE_LENGTH", "800"))
+AUTHOR_POSTS_LENGTH = int(os.getenv("AUTHOR_POSTS_LENGTH", "200"))
+
+#authors at or above this many followers are pulled at read time instead of fanned out
+CELEBRITY_FOLLOWER_THRESHOLD = int(os.getenv("CELEBRITY_FOLLOWER_THRESHOLD", "10000"))
+
+FANOUT_PAGE_SIZE = 500
+FOLLOWING_SCAN_LIMIT = int(os.getenv("FOLLOWING_SCAN_LIMIT", "5000"))
+CELEBRITY_FOLLOWEES_TTL = int(os.getenv("CELEBRITY_FOLLOWEES_TTL", "60"))
+
+CELEBRITIES_KEY = "timeline:celebrities"
+
+redis_client = trace_redis(redis.Redis(
+    host=REDIS_HOST,
+    port=6379,
+    decode_responses=True
+))
+
+logger = logging.getLogger(__name__)
+
+
+def timeline_key(user_id: str) -> str:
+    return f"timeline:{user_id}"
+
+
+def author_posts_key(user_id: str) -> str:
+    return f"timeline:author:{user_id}"
+
+
+def celebrity_followees_key(user_id: str) -> str:
+    return f"timeline:celebrity_followees:{user_id}"
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def record_author_post(author_id: str, post_id: str, created_ms: int):
+    pipe = redis_client.pipeline()
+    pipe.zadd(author_posts_key(author_id), {post_id: created_ms})
+    pipe.zremrangebyrank(author_posts_key(author_id), 0, -(AUTHOR_POSTS_LENGTH + 1))
+    pipe.execute()
+
+
+def fan_out(post_id: str, created_ms: int, follower_ids: Iterable[str]) -> int:
+    pipe = redis_client.pipeline(transaction=False)
+    writes = 0
+
+    for follower_id in follower_ids:
+        key = timeline_key(follower_id)
+        pipe.zadd(key, {post_id: created_ms})
+        pipe.zremrangebyrank(key, 0, -(TIMELINE_LENGTH + 1))
+        writes += 1
+
+    pipe.execute()
+    return writes
+
+
+async def distribute_post(client: httpx.AsyncClient, user_service_base: str, author_id: str,
+                          post_id: str, created_ms: int) -> int:
+    """Push a new post into followers' timelines; returns the number of timelines written."""
+    try:
+        record_author_post(author_id, post_id, created_ms)
+        
+        #looked up here rather than on the write path
+        resp = await client.get(f"{user_service_base}/users/{author_id}")
+        resp.raise_for_status()
+        follower_count = resp.json()["followers"]
+
+        if follower_count >= CELEBRITY_FOLLOWER_THRESHOLD:
+            #readers merge this author's recent posts in themselves
+            redis_client.sadd(CELEBRITIES_KEY, author_id)
+            return fan_out(post_id, created_ms, [author_id])
+
+        redis_client.srem(CELEBRITIES_KEY, author_id)
+        writes = fan_out(post_id, created_ms, [author_id])
+        cursor = None
+
+        while True:
+            params = {"limit": FANOUT_PAGE_SIZE}
+            if cursor:
+                params["cursor"] = cursor
+
+            resp = await client.get(f"{user_service_base}/users/{author_id}/followers", params=params)
+            resp.raise_for_status()
+            page = resp.json()
+
+            writes += fan_out(post_id, created_ms, page["user_ids"])
+            cursor = page["next_cursor"]
+            if not cursor:
+                return writes
+
+    except (redis.RedisError, httpx.HTTPError) as e:
+        logger.warning("Fan-out of post %s by %s incomplete: %s", post_id, author_id, e)
+        return 0
+
+
+def remove_author_post(author_id: str, post_id: str):
+    #timeline copies are skipped at hydration once the post row is gone
+    try:
+        redis_client.zrem(author_posts_key(author_id), post_id)
+    except redis.RedisError as e:
+        logger.warning("Could not remove post %s from author timeline: %s", post_id, e)
+
+
+async def celebrity_followees(client: httpx.AsyncClient, user_service_base: str, user_id: str) -> list[str]:
+    """Followed accounts that are pulled at read time, cached briefly per reader."""
+    key = celebrity_followees_key(user_id)
+    cached = redis_client.smembers(key)
+    if cached or redis_client.exists(f"{key}:empty"):
+        return list(cached)
+
+    following = []
+    cursor = None
+    while len(following) < FOLLOWING_SCAN_LIMIT:
+        params = {"limit": FANOUT_PAGE_SIZE}
+        if cursor:
+            params["cursor"] = cursor
+
+        resp = await client.get(f"{user_service_base}/users/{user_id}/following", params=params)
+        resp.raise_for_status()
+        page = resp.json()
+
+        following.extend(page["user_ids"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+
+    celebrities = []
+    if following:
+        flags = redis_client.smismember(CELEBRITIES_KEY, following)
+        celebrities = [followee for followee, flag in zip(following, flags) if flag]
+
+    pipe = redis_client.pipeline()
+    if celebrities:
+        pipe.sadd(key, *celebrities)
+        pipe.expire(key, CELEBRITY_FOLLOWEES_TTL)
+    else:
+        pipe.set(f"{key}:empty", 1, ex=CELEBRITY_FOLLOWEES_TTL)
+    pipe.execute()
+
+    return celebrities
+
+
+def parse_feed_cursor(cursor: str) -> tuple[int, Optional[str]]:
+    """"<score>:<post_id>" from a previous page; a bare score (older clients) skips every post at that ms."""
+    score, _, post_id = cursor.partition(":")
+    return int(score), post_id or None
+
+
+def merge_feed(user_id: str, celebrity_ids: list[str], cursor: Optional[str], limit: int) -> tuple[list[str], Optional[str]]:
+    """Merge the pushed timeline with pulled celebrity posts, newest first, after cursor in (score, post_id) order.
+
+    Raises ValueError for a malformed cursor.
+    """
+    keys = [timeline_key(user_id)] + [author_posts_key(celebrity_id) for celebrity_id in celebrity_ids]
+    pipe = redis_client.pipeline(transaction=False)
+
+    if cursor is None:
+        for key in keys:
+            pipe.zrevrangebyscore(key, "+inf", "-inf", start=0, num=limit, withscores=True)
+    else:
+        score, last_post_id = parse_feed_cursor(cursor)
+        for key in keys:
+            #posts sharing the cursor's ms are fetched whole and filtered by id; the rest are strictly older
+            pipe.zrevrangebyscore(key, score, score, withscores=True)
+            pipe.zrevrangebyscore(key, f"({score}", "-inf", start=0, num=limit, withscores=True)
+
+    entries: dict[str, float] = {}
+    for result in pipe.execute():
+        for post_id, entry_score in result:
+            entries[post_id] = entry_score
+
+    if cursor is not None:
+        entries = {
+            post_id: entry_score for post_id, entry_score in entries.items()
+            if entry_score < score or (last_post_id is not None and post_id < last_post_id)
+        }
+
+    newest = sorted(entries.items(), key=lambda entry: (entry[1], entry[0]), reverse=True)[:limit]
+    post_ids = [post_id for post_id, _ in newest]
+    next_cursor = f"{int(newest[-1][1])}:{newest[-1][0]}" if len(newest) == limit else None
+
+    return post_ids, next_cursor
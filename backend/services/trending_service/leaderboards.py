@@ -0,0 +1,57 @@
+import os
+import redis
+from datetime import datetime, timedelta
+from typing import Optional
+from common.tracing import trace_redis
+
+REDIS_HOST = os.getenv("REDIS_HOST", "redis")
+
+#post_service owns these sorted sets (post_service/leaderboard.py); this service only reads them
+GLOBAL_POST_LEADERBOARD_KEY = "trending:posts:all"
+
+redis_client = trace_redis(redis.Redis(
+    host=REDIS_HOST,
+    port=6379,
+    decode_responses=True
+))
+
+
+def post_leaderboard_key(category: Optional[str] = None) -> str:
+    if category is None:
+        return GLOBAL_POST_LEADERBOARD_KEY
+
+    return f"trending:posts:category:{category}"
+
+
+def top_post_ids(category: Optional[str] = None, limit: int = 10) -> list[str]:
+    return redis_client.zrevrange(post_leaderboard_key(category), 0, limit - 1)
+
+
+#comment_service owns the commenter counts (comment_service/commenters.py): an all-time set and one per day
+COMMENTER_ALL_TIME_KEY = "trending:commenters:all"
+COMMENTER_WINDOW_RETENTION_DAYS = int(os.getenv("COMMENTER_WINDOW_RETENTION_DAYS", "30"))
+COMMENTER_WINDOW_CACHE_SECONDS = int(os.getenv("COMMENTER_WINDOW_CACHE_SECONDS", "60"))
+
+
+def commenter_day_key(day: datetime) -> str:
+    return f"trending:commenters:day:{day.strftime('%Y%m%d')}"
+
+
+def top_commenters(limit: int = 10, days: Optional[int] = None) -> list[dict]:
+    if days is None:
+        key = COMMENTER_ALL_TIME_KEY
+    else:
+        today = datetime.now()
+        key = f"trending:commenters:window:{days}:{today.strftime('%Y%m%d')}"
+
+        #the union over the daily buckets is shared by every request in the cache window
+        if not redis_client.exists(key):
+            buckets = [commenter_day_key(today - timedelta(days=offset)) for offset in range(days)]
+            pipe = redis_client.pipeline()
+            pipe.zunionstore(key, buckets)
+            pipe.expire(key, COMMENTER_WINDOW_CACHE_SECONDS)
+            pipe.execute()
+
+    results = redis_client.zrevrange(key, 0, limit - 1, withscores=True)
+
+    return [{"user_id": user_id, "comment_count": int(count)} for user_id, count in results]
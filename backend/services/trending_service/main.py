@@ -1,267 +1,176 @@
-from fastapi import FastAPI, HTTPException
-from models import trendingCommentResponse, trendingPostResponse, trendingUsers
+from fastapi import FastAPI, HTTPException, Query, Response
+from models import PostCategory, trendingCommentResponse, trendingPostResponse, trendingUsers
+import leaderboards
 import httpx
 import os
+import redis
 import logging
-from contextlib import contextmanager
-from sqlmodel import Session
-from ..user_service import db as user_db
-from ..post_service import db as post_db
-from ..comment_service import db as comment_db
+from typing import Optional
+from contextlib import asynccontextmanager
+from common.health import DependencyHealth
+from common.http_cache import ETagMiddleware
+from common.metrics import add_metrics, instrument_client
+from common.tracing import add_tracing, trace_client
+from common.responses import ORJSONResponse, RowSerializer, add_compression
+from common.log_setup import configure_logging
 
 USER_SERVICE_BASE = os.getenv("USER_SERVICE_BASE", "http://user_service:8000")
 POST_SERVICE_BASE = os.getenv("POST_SERVICE_BASE", "http://post_service:8001")
 COMMENT_SERVICE_BASE = os.getenv("COMMENT_SERVICE_BASE", "http://comment_service:8002")
+#leaderboards change continuously; no invalidation, just a short shared lifetime
+TRENDING_CACHE_MAX_AGE = int(os.getenv("TRENDING_CACHE_MAX_AGE", "10"))
+USER_LEADERBOARD_LIMIT = 10
+
+#the rankings come from Redis and the owning services' /rankings endpoints; no database of its own
+service_client = trace_client(instrument_client(httpx.AsyncClient(timeout=5.0)))
+
+health = DependencyHealth(
+    "Trending Service",
+    dependencies={
+        "User Service": USER_SERVICE_BASE,
+        "Post Service": POST_SERVICE_BASE,
+        "Comment Service": COMMENT_SERVICE_BASE
+    }
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await health.start()
+    yield
+    await service_client.aclose()
+    await health.close()
 
-comment_engine = comment_db.engine
-post_engine = post_db.engine
-user_engine = user_db.engine
-    
 
-@contextmanager    
-def get_session(engine):
+async def fetch(method: str, url: str, **kwargs):
     try:
-        with Session(engine) as session:
-            yield session
-    finally:
-        session.close()
+        res = await service_client.request(method, url, **kwargs)
+        res.raise_for_status()
+    except httpx.HTTPError as e:
+        logger.warning("Ranking request to %s failed: %s", url, e)
+        raise HTTPException(status_code=502, detail="Rankings are unavailable")
+    
+    return res.json()
         
         
 #LOGGING SETUP
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
-        logging.FileHandler("./logs/cache_log.txt", mode="a"),
-        logging.StreamHandler()
-    ]
-)
+configure_logging("trending_service")
 
 logger = logging.getLogger(__name__)
    
 
 app = FastAPI(
-    title="Comment Service"
+    title="Trending Service",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
+app.add_middleware(ETagMiddleware, rules=[(r"^/trending/", TRENDING_CACHE_MAX_AGE)])
+add_compression(app)
+add_metrics(app)
+add_tracing(app, "trending_service")
+
+#leaderboards are serialized straight from the rows, no per-row models in Python
+post_list = RowSerializer(list[trendingPostResponse])
+comment_list = RowSerializer(list[trendingCommentResponse])
+user_list = RowSerializer(list[trendingUsers])
+
 #endpoints
+@app.get("/livez")
+async def liveness_check():
+    return health.liveness()
+
+
+@app.get("/readyz")
+async def readiness_check(response: Response):
+    report = await health.readiness()
+    
+    if report["status"] != "healthy":
+        response.status_code = 503
+    return report
+
+
 @app.get("/health")
 async def health_check():
-    try:
-        async with httpx.AsyncClient(timeout=2.0) as client:
-            user_resp = await client.get(f"{USER_SERVICE_BASE}/health")
-        if user_resp.status_code != 200:
-            return {
-                "status": "unhealthy",
-                "details": "User Service returned non-200",
-                "code": user_resp.status_code
-            }
-            
-        async with httpx.AsyncClient(timeout=2.0) as client:
-            post_resp = await client.get(f"{POST_SERVICE_BASE}/health")
-            
-        if post_resp.status_code != 200:
-            return {
-                "status": "unhealthy",
-                "details": "Post Service returned non-200",
-                "code": post_resp.status_code
-            }
-            
-        async with httpx.AsyncClient(timeout=2.0) as client:
-            comment_resp = await client.get(f"{COMMENT_SERVICE_BASE}/health")
-            
-        if comment_resp.status_code != 200:
-            return {
-                "status": "unhealthy",
-                "details": "Comment Service returned non-200",
-                "code": comment_resp.status_code
-            }
-            
-        return {
-            "service": "Comment Service",
-            "status": "healthy",
-            "dependencies": {
-                "User Service": {
-                    "status": "healthy",
-                    "response_time_ms": user_resp.elapsed.total_seconds() * 1000
-                }, 
-                    "Post Service": {
-                    "status": "healthy",
-                    "response_time_ms": post_resp.elapsed.total_seconds() * 1000
-                },
-                "Comment Service": {
-                    "status": "healthy",
-                    "response_time_ms": comment_resp.elapsed.total_seconds() * 1000
-                },
-            }
-        }
-    except Exception as e:
-        return {
-            "status": "starting",
-            "details": f"Trending Service not reachable: {str(e)}"
-        }
-        
-        
+    return await health.readiness()
         
         
 @app.get("/trending/posts", status_code=200)
-async def get_trending_posts():
+async def get_trending_posts(category: Optional[PostCategory] = None):
     
-    with get_session(post_engine) as post_session:
-        trending_posts = post_db.get_trending_posts(post_session)
-        
-        posts_list = []
-        
-        for post in trending_posts:
-            posts_list.append(trendingPostResponse(
-                post_id=post.post_id,
-                title=post.title,
-                category=post.category,
-                likes=post.likes,
-                dislikes=post.dislikes,
-                edited_at=post.edited_at
-            ))
-            
-        
-        return posts_list
+    try:
+        post_ids = leaderboards.top_post_ids(category.value if category is not None else None)
+    except redis.RedisError as e:
+        logger.warning("Leaderboard unavailable, falling back to post_service: %s", e)
+        post_ids = []
+    
+    if post_ids:
+        trending_posts = await fetch("POST", f"{POST_SERVICE_BASE}/posts:batch", json={"post_ids": post_ids})
+    else:
+        params = {"category": category.value} if category is not None else None
+        trending_posts = await fetch("GET", f"{POST_SERVICE_BASE}/rankings/posts", params=params)
+    
+    return post_list.response(trending_posts)
     
     
 @app.get("/trending/posts/likes", status_code=200)
 async def get_trending_posts_by_likes():
     
-    with get_session(post_engine) as post_session:
-        liked_posts = post_db.get_most_liked(post_session)
-        
-        posts_list = []
-        
-        for post in liked_posts:
-            posts_list.append(trendingPostResponse(
-                post_id=post.post_id,
-                title=post.title,
-                category=post.category,
-                likes=post.likes,
-                dislikes=post.dislikes,
-                edited_at=post.edited_at
-            ))
-        
-        return posts_list
+    return post_list.response(await fetch("GET", f"{POST_SERVICE_BASE}/rankings/posts/likes"))
     
 
 @app.get("/trending/posts/dislikes", status_code=200)
 async def get_trending_posts_by_dislikes():
     
-    with get_session(post_engine) as post_session:
-        disliked_posts = post_db.get_most_disliked(post_session)
-        
-        posts_list = []
-        
-        for post in disliked_posts:
-            posts_list.append(trendingPostResponse(
-                post_id=post.post_id,
-                title=post.title,
-                category=post.category,
-                likes=post.likes,
-                dislikes=post.dislikes,
-                edited_at=post.edited_at
-            ))
-        
-        return posts_list
+    return post_list.response(await fetch("GET", f"{POST_SERVICE_BASE}/rankings/posts/dislikes"))
     
     
 @app.get("/trending/comments", status_code=200)
 async def get_trending_comments():
     
-    with get_session(comment_engine) as comment_session:
-        trending_comments = comment_db.get_trending_comments(comment_session)
-        
-        comment_list = []
-        
-        for comment in trending_comments:
-            comment_list.append(trendingCommentResponse(
-                comment_id=comment.comment_id,
-                content=comment.content,
-                likes=comment.likes,
-                dislikes=comment.dislikes,
-                edited_at=comment.edited_at
-            ))
-            
-        return comment_list
+    return comment_list.response(await fetch("GET", f"{COMMENT_SERVICE_BASE}/rankings/comments"))
     
 
 @app.get("/trending/comments/likes", status_code=200)
 async def get_trending_comments_likes():
     
-    with get_session(comment_engine) as comment_session:
-        liked_comments = comment_db.get_most_liked_comments(comment_session)
-        
-        comment_list = []
-        
-        for comment in liked_comments:
-            comment_list.append(trendingCommentResponse(
-                comment_id=comment.comment_id,
-                content=comment.content,
-                likes=comment.likes,
-                dislikes=comment.dislikes,
-                edited_at=comment.edited_at
-            ))
-            
-        return comment_list
+    return comment_list.response(await fetch("GET", f"{COMMENT_SERVICE_BASE}/rankings/comments/likes"))
     
 
 @app.get("/trending/comments/dislikes", status_code=200)
 async def get_trending_comments_dislikes():
     
-    with get_session(comment_engine) as comment_session:
-        disliked_comments = comment_db.get_most_disliked_comments(comment_session)
-        
-        
-        comment_list = []
-        
-        for comment in disliked_comments:
-            comment_list.append(trendingCommentResponse(
-                comment_id=comment.comment_id,
-                content=comment.content,
-                likes=comment.likes,
-                dislikes=comment.dislikes,
-                edited_at=comment.edited_at
-            ))
-            
-        return comment_list
+    return comment_list.response(await fetch("GET", f"{COMMENT_SERVICE_BASE}/rankings/comments/dislikes"))
     
     
-@app.get("/trending/users/activity", status_code=200)
-async def get_trending_users():
+@app.get("/trending/users/activity", status_code=200, response_model=list[trendingUsers])
+async def get_trending_users(limit: int = Query(default=USER_LEADERBOARD_LIMIT, ge=1, le=100)):
     
-    with get_session(user_engine) as user_session:
-        trending_users = user_db.most_active_users(user_session)
-        
-        users_list = []
-        
-        for user in trending_users:
-            users_list.append(trendingUsers(
-                user_id=user.user_id,
-                username=user.username,
-                total_likes=user.total_likes,
-                total_dislikes=user.total_dislikes
-            ))
-            
-        return users_list
+    #activity is posts + comments
+    return user_list.response(await fetch("GET", f"{USER_SERVICE_BASE}/rankings/users/activity", params={"limit": limit}))
 
 
-@app.get("/trending/users/followers", status_code=200)
-async def get_trending_user_followers():
+@app.get("/trending/users/posts", status_code=200, response_model=list[trendingUsers])
+async def get_trending_user_posts(limit: int = Query(default=USER_LEADERBOARD_LIMIT, ge=1, le=100)):
     
-    with get_session(user_engine) as user_session:
-        trending_users = user_db.most_followed_users(user_session)
-        
-        users_list = []
+    return user_list.response(await fetch("GET", f"{USER_SERVICE_BASE}/rankings/users/posts", params={"limit": limit}))
+
+
+@app.get("/trending/users/followers", status_code=200, response_model=list[trendingUsers])
+async def get_trending_user_followers(limit: int = Query(default=USER_LEADERBOARD_LIMIT, ge=1, le=100)):
+    
+    return user_list.response(await fetch("GET", f"{USER_SERVICE_BASE}/rankings/users/followers", params={"limit": limit}))
+
+
+@app.get("/trending/users/commenters", status_code=200)
+async def get_top_commenters(days: Optional[int] = Query(default=None, ge=1, le=leaderboards.COMMENTER_WINDOW_RETENTION_DAYS)):
+    
+    try:
+        return leaderboards.top_commenters(days=days)
+    except redis.RedisError as e:
+        if days is not None:
+            raise HTTPException(status_code=503, detail="Windowed commenter counts are unavailable")
         
-        for user in trending_users:
-            users_list.append(trendingUsers(
-                user_id=user.user_id,
-                username=user.username,
-                total_likes=user.total_likes,
-                total_dislikes=user.total_dislikes
-            ))
-            
-        return users_list
+        logger.warning("Commenter counts unavailable, falling back to comment_service: %s", e)
+    
+    return await fetch("GET", f"{COMMENT_SERVICE_BASE}/rankings/commenters")
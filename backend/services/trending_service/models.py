@@ -1,22 +1,44 @@
 from pydantic import BaseModel, Field, EmailStr
 from datetime import datetime
 from typing import Annotated, Optional
+import enum
+
+
+#post_service's categories; its leaderboards are keyed by the value
+class PostCategory(str, enum.Enum):
+    Lifestyle = "Lifestyle"
+    Food = "Food"
+    Travel = "Travel"
+    Finance = "Finance"
+    Technology = "Technology"
+    Business = "Business"
+    HealthAndFitness = "Health and Fitness"
+    Other = "Other"
+
 
 class trendingPostResponse(BaseModel):
-    username: str
+    post_id: str
+    username: Optional[str] = None
     title: str
-    content: str = Field(..., min_length=1, max_length=5000)
+    category: str
     likes: int
     dislikes: int
+    edited_at: datetime
     
 class trendingCommentResponse(BaseModel):
+    comment_id: str
+    post_id: str
     username: str
     content: str = Field(..., min_length=1, max_length=500)
     likes: int
     dislikes: int
+    edited_at: datetime
     
 class trendingUsers(BaseModel):
+    user_id: str
     username: str
-    email: EmailStr
-    full_name: str
-    followers: int
\ No newline at end of file
+    followers: int
+    posts: int
+    comments: int
+    total_likes: int
+    total_dislikes: int
\ No newline at end of file
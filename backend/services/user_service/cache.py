@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import logging
+import threading
+import redis
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+from common.http_cache import HTTP_INVALIDATION_CHANNEL
+from common.tracing import trace_redis
+
+REDIS_HOST = os.getenv("REDIS_HOST", "redis")
+
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "10000"))
+PROFILE_LOCAL_TTL = float(os.getenv("PROFILE_LOCAL_TTL", "30"))
+PROFILE_REDIS_TTL = int(os.getenv("PROFILE_REDIS_TTL", "300"))
+#per-user invalidation counters outlive any load they have to guard
+PROFILE_GENERATION_TTL = 2 * PROFILE_REDIS_TTL
+
+INVALIDATION_CHANNEL = "user_profiles:invalidate"
+
+redis_client = trace_redis(redis.Redis(
+    host=REDIS_HOST,
+    port=6379,
+    decode_responses=True
+))
+
+logger = logging.getLogger(__name__)
+
+
+class ProfileCache:
+    """Read-through cache of public user profiles.
+
+    Lookups hit a small in-process LRU first, then Redis, then the loader (the
+    database). Writers call invalidate(), which drops the Redis copy, bumps the
+    profile's generation and tells every replica over pub/sub to drop its local
+    copy. A loaded profile is only cached if its generation did not move while
+    it was being read, so a load racing an update cannot cache the old row.
+    """
+
+    def __init__(self, client: redis.Redis, max_size: int = PROFILE_CACHE_SIZE,
+                 local_ttl: float = PROFILE_LOCAL_TTL, redis_ttl: int = PROFILE_REDIS_TTL):
+        self.client = client
+        self.max_size = max_size
+        self.local_ttl = local_ttl
+        self.redis_ttl = redis_ttl
+
+        self._local: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._listener = None
+        self._stats = {"local_hits": 0, "redis_hits": 0, "misses": 0, "invalidations": 0}
+
+    @staticmethod
+    def key(user_id: str) -> str:
+        return f"user_profile:{user_id}"
+
+    @staticmethod
+    def generation_key(user_id: str) -> str:
+        return f"user_profile:{user_id}:gen"
+
+    def get(self, user_id: str, loader: Callable[[str], Optional[dict]]) -> Optional[dict]:
+        return self.get_many([user_id], lambda missing: _load_each(missing, loader)).get(user_id)
+
+    def get_many(self, user_ids: Iterable[str], loader: Callable[[list[str]], dict[str, dict]]) -> dict[str, dict]:
+        found: dict[str, dict] = {}
+        missing = []
+
+        for user_id in dict.fromkeys(user_ids):
+            profile = self._get_local(user_id)
+            if profile is not None:
+                found[user_id] = profile
+            else:
+                missing.append(user_id)
+
+        if missing:
+            from_redis = self._get_redis(missing)
+            found.update(from_redis)
+            missing = [user_id for user_id in missing if user_id not in from_redis]
+
+        if missing:
+            generations = self._get_generations(missing)
+            loaded = loader(missing)
+            self._count("misses", len(missing))
+            self._set(loaded, generations)
+            found.update(loaded)
+
+        return found
+
+    def invalidate(self, *user_ids: str):
+        for user_id in user_ids:
+            self._evict_local(user_id)
+        self._count("invalidations", len(user_ids))
+
+        try:
+            pipe = self.client.pipeline()
+            pipe.delete(*(self.key(user_id) for user_id in user_ids))
+            for user_id in user_ids:
+                pipe.incr(self.generation_key(user_id))
+                pipe.expire(self.generation_key(user_id), PROFILE_GENERATION_TTL)
+                pipe.publish(INVALIDATION_CHANNEL, user_id)
+                pipe.publish(HTTP_INVALIDATION_CHANNEL, f"/users/{user_id}")
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning("Could not invalidate cached profiles %s: %s", user_ids, e)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["local_entries"] = len(self._local)
+
+        lookups = stats["local_hits"] + stats["redis_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["local_hits"] + stats["redis_hits"]) / lookups, 4) if lookups else 0.0
+        stats["local_hit_rate"] = round(stats["local_hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+    def start(self):
+        try:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{INVALIDATION_CHANNEL: lambda message: self._evict_local(message["data"])})
+            self._listener = pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+        except redis.RedisError as e:
+            logger.warning("Profile invalidation listener not started, relying on local TTL: %s", e)
+
+    def close(self):
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+    def _get_local(self, user_id: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._local.get(user_id)
+            if entry is None:
+                return None
+
+            expires, profile = entry
+            if expires < time.monotonic():
+                del self._local[user_id]
+                return None
+
+            self._local.move_to_end(user_id)
+            self._stats["local_hits"] += 1
+            return profile
+
+    def _get_redis(self, user_ids: list[str]) -> dict[str, dict]:
+        try:
+            values = self.client.mget([self.key(user_id) for user_id in user_ids])
+        except redis.RedisError as e:
+            logger.warning("Profile cache unavailable, reading from the database: %s", e)
+            return {}
+
+        found = {user_id: json.loads(value) for user_id, value in zip(user_ids, values) if value}
+        self._count("redis_hits", len(found))
+        self._set_local(found)
+        return found
+
+    def _get_generations(self, user_ids: list[str]) -> Optional[dict[str, Optional[str]]]:
+        try:
+            values = self.client.mget([self.generation_key(user_id) for user_id in user_ids])
+        except redis.RedisError as e:
+            logger.warning("Could not read profile generations: %s", e)
+            return None
+        return dict(zip(user_ids, values))
+
+    def _set(self, profiles: dict[str, dict], generations: Optional[dict[str, Optional[str]]]):
+        if not profiles:
+            return
+        if generations is None:
+            #Redis was down when the load started: no invalidations to miss, and nowhere to write
+            self._set_local(profiles)
+            return
+
+        keys = [self.generation_key(user_id) for user_id in profiles]
+        fresh = {}
+        try:
+            with self.client.pipeline() as pipe:
+                #WATCH fails the write if an invalidation bumps a generation between this check and EXEC
+                pipe.watch(*keys)
+                current = dict(zip(profiles, pipe.mget(keys)))
+                fresh = {user_id: profile for user_id, profile in profiles.items() if current[user_id] == generations.get(user_id)}
+
+                #cached locally before EXEC, so an eviction broadcast after it cannot arrive first
+                self._set_local(fresh)
+                pipe.multi()
+                for user_id, profile in fresh.items():
+                    pipe.set(self.key(user_id), json.dumps(profile), ex=self.redis_ttl)
+                pipe.execute()
+        except redis.WatchError:
+            #an update landed mid-write; the next read loads again
+            for user_id in fresh:
+                self._evict_local(user_id)
+        except redis.RedisError as e:
+            logger.warning("Could not cache profiles: %s", e)
+
+    def _set_local(self, profiles: dict[str, dict]):
+        expires = time.monotonic() + self.local_ttl
+
+        with self._lock:
+            for user_id, profile in profiles.items():
+                self._local[user_id] = (expires, profile)
+                self._local.move_to_end(user_id)
+
+            while len(self._local) > self.max_size:
+                self._local.popitem(last=False)
+
+    def _evict_local(self, user_id: str):
+        with self._lock:
+            self._local.pop(user_id, None)
+
+    def _count(self, stat: str, amount: int = 1):
+        with self._lock:
+            self._stats[stat] += amount
+
+
+def _load_each(user_ids: list[str], loader: Callable[[str], Optional[dict]]) -> dict[str, dict]:
+    loaded = {}
+    for user_id in user_ids:
+        profile = loader(user_id)
+        if profile is not None:
+            loaded[user_id] = profile
+    return loaded
+
+
+profile_cache = ProfileCache(redis_client)
@@ -0,0 +1,221 @@
+import os
+import asyncio
+import logging
+import httpx
+import redis
+from contextlib import asynccontextmanager
+from typing import Callable, Optional
+from starlette.concurrency import run_in_threadpool
+from common.counters import drain_counter_deltas, pending_counter_deltas, record_counter_deltas_once, requeue_counter_deltas
+from common.events import Event, PostCreated, PostDeleted, CommentCreated, CommentDeleted, ReactionChanged
+
+COUNTER_FLUSH_INTERVAL = float(os.getenv("COUNTER_FLUSH_INTERVAL", "2"))
+COUNTER_FLUSH_BATCH = int(os.getenv("COUNTER_FLUSH_BATCH", "500"))
+COUNTER_RECONCILE_INTERVAL = float(os.getenv("COUNTER_RECONCILE_INTERVAL", "3600"))
+COUNTER_RECONCILE_PAGE = int(os.getenv("COUNTER_RECONCILE_PAGE", "500"))
+#how long an event id is remembered; covers stream redeliveries and a relay re-publishing a batch after a crash
+COUNTER_EVENT_DEDUPE_TTL = int(os.getenv("COUNTER_EVENT_DEDUPE_TTL", str(24 * 3600)))
+
+logger = logging.getLogger(__name__)
+
+
+#the events that move an author's counters
+COUNTER_EVENTS = (PostCreated, PostDeleted, CommentCreated, CommentDeleted, ReactionChanged)
+
+
+def event_counter_deltas(event: Event) -> tuple[str, dict[str, int]]:
+    """The user whose counters an event changes, and by how much."""
+    if isinstance(event, PostCreated):
+        return event.user_id, {"posts": 1}
+    if isinstance(event, PostDeleted):
+        return event.user_id, {"posts": -1, "total_likes": -event.likes, "total_dislikes": -event.dislikes}
+    if isinstance(event, CommentCreated):
+        return event.user_id, {"comments": 1}
+    if isinstance(event, CommentDeleted):
+        return event.user_id, {"comments": -1, "total_likes": -event.likes, "total_dislikes": -event.dislikes}
+    if isinstance(event, ReactionChanged):
+        return event.author_id, {"total_likes": event.likes, "total_dislikes": event.dislikes}
+    raise ValueError(f"{event.type} does not change user counters")
+
+
+def queue_event_deltas(client: redis.Redis, event: Event, ttl: int = COUNTER_EVENT_DEDUPE_TTL) -> bool:
+    """Queue an event's counter deltas once per event_id; redeliveries are skipped."""
+    user_id, deltas = event_counter_deltas(event)
+    return record_counter_deltas_once(client, event.event_id, user_id, ttl, **deltas)
+
+
+class CounterFlusher:
+    """Applies the post/comment/reaction counter deltas queued in Redis.
+
+    Producers only HINCRBY a per-user hash, so any number of events for one user
+    between flushes collapse into a single row update here.
+    """
+
+    def __init__(self, client: redis.Redis, apply: Callable[[dict[str, dict[str, int]]], None],
+                 on_applied: Optional[Callable[[list[str]], None]] = None,
+                 interval: float = COUNTER_FLUSH_INTERVAL, batch_size: int = COUNTER_FLUSH_BATCH):
+        self.client = client
+        self.apply = apply
+        self.on_applied = on_applied
+        self.interval = interval
+        self.batch_size = batch_size
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def flush(self) -> int:
+        async with self._lock:
+            return await self._flush()
+
+    @asynccontextmanager
+    async def paused(self):
+        """Apply what is queued, then leave new deltas queued until the block exits."""
+        async with self._lock:
+            await self._flush()
+            yield
+
+    async def _flush(self) -> int:
+        applied = 0
+
+        while True:
+            try:
+                deltas = await run_in_threadpool(drain_counter_deltas, self.client, self.batch_size)
+            except redis.RedisError as e:
+                logger.warning("Could not drain counter deltas: %s", e)
+                return applied
+
+            if not deltas:
+                return applied
+
+            try:
+                await run_in_threadpool(self.apply, deltas)
+            except Exception as e:
+                logger.error("Applying counter deltas failed, requeueing %s users: %s", len(deltas), e)
+                await run_in_threadpool(requeue_counter_deltas, self.client, deltas)
+                return applied
+
+            if self.on_applied:
+                self.on_applied(list(deltas))
+            applied += len(deltas)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Counter flush failed: %s", e)
+
+
+async def reconcile_counters(client: httpx.AsyncClient, post_service_base: str, comment_service_base: str,
+                             next_page: Callable[[Optional[str], int], list[str]],
+                             repair: Callable[[dict[str, dict[str, int]]], list[str]],
+                             flusher: "CounterFlusher", page_size: int = COUNTER_RECONCILE_PAGE) -> int:
+    """Recompute every user's counters from post_service and comment_service and fix drift.
+
+    Each page is flushed, recounted and repaired with the flusher paused, so
+    writes are only held back for one page at a time. Users whose queued deltas
+    moved during the recount are skipped until the next run, since the recount
+    may or may not include those changes. What remains is an event committed
+    before the recount but not yet queued (outbox relay plus consumer lag, under
+    a second normally): it is counted by the recount and applied again when it
+    is consumed, leaving that user at most the in-flight deltas off until the
+    next run recounts them.
+    """
+    repaired = 0
+    cursor = None
+
+    while True:
+        user_ids = await run_in_threadpool(next_page, cursor, page_size)
+        if not user_ids:
+            return repaired
+
+        async with flusher.paused():
+            before = await run_in_threadpool(pending_counter_deltas, flusher.client, user_ids)
+
+            post_resp, comment_resp = await asyncio.gather(
+                client.post(f"{post_service_base}/stats/users", json={"user_ids": user_ids}),
+                client.post(f"{comment_service_base}/stats/users", json={"user_ids": user_ids})
+            )
+            post_resp.raise_for_status()
+            comment_resp.raise_for_status()
+            post_stats, comment_stats = post_resp.json(), comment_resp.json()
+
+            expected = {}
+            for user_id in user_ids:
+                posts = post_stats.get(user_id, {})
+                comments = comment_stats.get(user_id, {})
+                expected[user_id] = {
+                    "posts": posts.get("count", 0),
+                    "comments": comments.get("count", 0),
+                    "total_likes": posts.get("likes", 0) + comments.get("likes", 0),
+                    "total_dislikes": posts.get("dislikes", 0) + comments.get("dislikes", 0)
+                }
+
+            expected = await run_in_threadpool(exclude_pending, flusher.client, expected, before)
+            if expected:
+                repaired += len(await run_in_threadpool(repair, expected))
+        cursor = user_ids[-1]
+
+
+def exclude_pending(client: redis.Redis, expected: dict[str, dict[str, int]],
+                    before: dict[str, dict[str, int]]) -> dict[str, dict[str, int]]:
+    """Subtract the deltas still queued for each user from their recounted values.
+
+    The flusher adds those deltas on top of whatever the repair writes, so the
+    row must be set to the recount minus them. `before` is the queue as read
+    ahead of the recount; users whose deltas changed since are left out, as
+    there is no telling which of those changes the recount saw. Call with the
+    flusher paused so nothing is drained between the two reads and the repair.
+    """
+    pending = pending_counter_deltas(client, list(expected))
+
+    return {
+        user_id: {field: value - pending.get(user_id, {}).get(field, 0) for field, value in counters.items()}
+        for user_id, counters in expected.items()
+        if pending.get(user_id, {}) == before.get(user_id, {})
+    }
+
+
+class CounterReconciler:
+    """Runs reconcile_counters on a fixed interval in the background."""
+
+    def __init__(self, run_once: Callable[[], "asyncio.Future[int]"], interval: float = COUNTER_RECONCILE_INTERVAL):
+        self.run_once = run_once
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                repaired = await self.run_once()
+                logger.info("Counter reconciliation repaired %s users", repaired)
+            except Exception as e:
+                logger.error("Counter reconciliation failed: %s", e)
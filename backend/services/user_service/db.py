@@ -1,13 +1,16 @@
 from sqlmodel import SQLModel, Field, create_engine, select, Enum, Session
-from sqlalchemy import Column, Integer, String, TIMESTAMP, Boolean, func
+from sqlalchemy import Column, Integer, String, TIMESTAMP, text, Boolean, case, func, update, delete, exists
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
 from typing import Optional
 from pydantic import EmailStr
 from models import UserCreate, UserCreateResponse, UserUpdate
 from datetime import datetime
-from security import get_password_hash
 import os
 from fastapi import HTTPException
-import uuid
+from common.metrics import instrument_engine
+from common.tracing import trace_engine
+from common.ids import UUIDKey, new_id, uuid_column_upgrades
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
@@ -15,6 +18,8 @@ engine = create_engine(DATABASE_URL,
                         pool_size=5,
                         max_overflow=10,
                         echo=False, )
+instrument_engine(engine, "users")
+trace_engine(engine, "users")
 
 
 
@@ -22,7 +27,7 @@ class UserCreateDB(SQLModel, table=True):
     
     __tablename__ = "users"
     
-    user_id: str = Field(sa_column=Column(String, primary_key=True, unique=True))
+    user_id: str = Field(sa_column=Column(UUIDKey, primary_key=True, unique=True))
     username: str = Field(sa_column=Column(String(50), nullable=False))
     hashed_password: str = Field(sa_column=Column(String(255), nullable=False))
     email: str = Field(sa_column=Column(String(255), unique=True, nullable=False))
@@ -32,28 +37,73 @@ class UserCreateDB(SQLModel, table=True):
     posts: int = Field(sa_column=Column(Integer, nullable=False, default=0, server_default="0"))
     comments: int = Field(sa_column=Column(Integer, nullable=False, default=0, server_default="0"))
     active: int = Field(sa_column=Column(Boolean, nullable=False, default=True, server_default="true"))
+    following: int = Field(sa_column=Column(Integer, nullable=False, default=0, server_default="0"))
+    total_likes: int = Field(sa_column=Column(Integer, nullable=False, default=0, server_default="0"))
+    total_dislikes: int = Field(sa_column=Column(Integer, nullable=False, default=0, server_default="0"))
+    
+    
+class FollowDB(SQLModel, table=True):
+    
+    __tablename__ = "follows"
+    
+    #the primary key serves "who does X follow", ix_follows_followee serves "who follows X"
+    follower_id: str = Field(sa_column=Column(UUIDKey, primary_key=True))
+    followee_id: str = Field(sa_column=Column(UUIDKey, primary_key=True))
+    created_at: str = Field(sa_column=Column(TIMESTAMP, server_default=func.now(), nullable=False))
     
      
     
+#idempotent DDL for tables that create_all() will not touch once they exist
+SCHEMA_UPGRADES = [
+    #case-insensitive unique usernames; also serves every login and availability lookup.
+    #INCLUDE (username) lets the availability check be an index-only scan, which a bare expression index cannot give
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_users_username_lower_incl ON users (lower(username)) INCLUDE (username)",
+    "DROP INDEX IF EXISTS ux_users_username_lower",
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS following INTEGER NOT NULL DEFAULT 0",
+    "CREATE INDEX IF NOT EXISTS ix_follows_followee ON follows (followee_id, follower_id)",
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS total_likes INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS total_dislikes INTEGER NOT NULL DEFAULT 0",
+    #(score DESC, user_id) indexes for the user leaderboards; must match the ORDER BY in _top_users
+    "CREATE INDEX IF NOT EXISTS ix_users_followers_rank ON users (followers DESC, user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_users_posts_rank ON users (posts DESC, user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_users_activity_rank ON users ((posts + comments) DESC, user_id)",
+    #ids used to be varchar uuid1 strings
+    *uuid_column_upgrades("users", "user_id"),
+    *uuid_column_upgrades("follows", "follower_id", "followee_id"),
+]
+    
+    
 def init_db():
     SQLModel.metadata.create_all(engine)
+    #a failed upgrade stops startup: duplicate usernames must not leave the service running without the unique index
+    with engine.begin() as connection:
+        for statement in SCHEMA_UPGRADES:
+            connection.execute(text(statement))
     print("Database initialized and tables created (if not exist).")
 
 
 def close_db_connection():
     engine.dispose()
     print("Database connection closed.")
+
+def ping_db():
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
     
     
-def create_user(session: Session, user: UserCreate) -> UserCreateResponse:
+def create_user(session: Session, user: UserCreate, password_hash: str) -> UserCreateResponse:
     created = str(datetime.now().isoformat())
-    user_id = str(uuid.uuid1())
-    password_hash = get_password_hash(user.password)
+    user_id = new_id()
     
     user = UserCreateDB(user_id=user_id, username=user.username, hashed_password=password_hash, email=user.email, full_name=user.full_name, created_at=created)
     
     session.add(user)
-    session.commit()
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        raise HTTPException(status_code=409, detail="Username or email is already registered!")
     session.refresh(user)
     
     response = {
@@ -63,14 +113,35 @@ def create_user(session: Session, user: UserCreate) -> UserCreateResponse:
         "full_name": user.full_name,
         "created_at": created,
         "followers": 0,
+        "following": 0,
         "posts": 0,
         "comments": 0,
+        "total_likes": 0,
+        "total_dislikes": 0,
         "active": True
     }
     
     return response
     
     
+def user_profile(user: UserCreateDB) -> dict:
+    #public fields only, never the password hash
+    return {
+        "user_id": str(user.user_id),
+        "username": user.username,
+        "email": user.email,
+        "full_name": user.full_name,
+        "created_at": str(user.created_at),
+        "followers": user.followers,
+        "following": user.following,
+        "posts": user.posts,
+        "comments": user.comments,
+        "total_likes": user.total_likes,
+        "total_dislikes": user.total_dislikes,
+        "active": user.active
+    }
+    
+    
 def get_user_info(session: Session, user_id: str) -> UserCreateResponse:
     user = session.get(UserCreateDB, user_id)
     
@@ -80,8 +151,14 @@ def get_user_info(session: Session, user_id: str) -> UserCreateResponse:
         return user
     
 
+def get_user_profiles(session: Session, user_ids: list[str]) -> dict[str, dict]:
+    query = select(UserCreateDB).where(UserCreateDB.user_id.in_(user_ids))
+    
+    return {str(user.user_id): user_profile(user) for user in session.exec(query).all()}
+    
+
 def get_user_by_username(session: Session, username: str) -> UserCreateResponse:
-    query = select(UserCreateDB).where(UserCreateDB.username == username)
+    query = select(UserCreateDB).where(func.lower(UserCreateDB.username) == username.lower())
     result = session.exec(query).first()
     
     if (not result):
@@ -89,13 +166,23 @@ def get_user_by_username(session: Session, username: str) -> UserCreateResponse:
     else:
         return result  
 
+
+def is_username_available(session: Session, username: str) -> bool:
+    #EXISTS over a constant reads nothing from the row, so postgres answers from ux_users_username_lower_incl alone
+    query = select(exists().where(func.lower(UserCreateDB.username) == username.lower()))
+    
+    return not session.exec(query).one()
+
  
-def edit_user_info(session: Session, original_user: UserCreateResponse, update: UserUpdate) -> UserCreateResponse:
-    updated_info = update.model_dump(exclude_unset=True)
+def edit_user_info(session: Session, original_user: UserCreateResponse, update: UserUpdate, password_hash: Optional[str] = None) -> UserCreateResponse:
+    updated_info = update.model_dump(exclude_unset=True, exclude={"password"})
     
     for field, value in updated_info.items():
         setattr(original_user, field, value)
         
+    if password_hash is not None:
+        setattr(original_user, "hashed_password", password_hash)
+        
     session.add(original_user)
     session.commit()
     session.refresh(original_user)
@@ -103,37 +190,176 @@ def edit_user_info(session: Session, original_user: UserCreateResponse, update:
     return original_user
 
 
-def add_followers(session: Session, user_id: str) -> UserCreateResponse:
-    user = session.get(UserCreateDB, user_id)
+def update_password_hash(session: Session, user_id: str, password_hash: str):
+    session.execute(update(UserCreateDB).where(UserCreateDB.user_id == user_id).values(hashed_password=password_hash))
+    session.commit()
+
+
+def follow_user(session: Session, follower_id: str, followee_id: str) -> bool:
+    _check_follow_pair(session, follower_id, followee_id)
     
-    setattr(user, "followers", user.followers+1)
+    #the composite primary key makes a repeated follow a no-op
+    inserted = session.execute(
+        insert(FollowDB)
+        .values(follower_id=follower_id, followee_id=followee_id)
+        .on_conflict_do_nothing()
+        .returning(FollowDB.follower_id)
+    ).first()
     
-    session.add(user)
-    session.commit()
-    session.refresh(user)
+    if inserted:
+        _adjust_follow_counts(session, follower_id, followee_id, 1)
     
-    return user
+    session.commit()
+    return inserted is not None
 
-def remove_followers(session: Session, user_id: str) -> UserCreateResponse:
-    user = session.get(UserCreateDB, user_id)
+
+def unfollow_user(session: Session, follower_id: str, followee_id: str) -> bool:
+    _check_follow_pair(session, follower_id, followee_id)
     
-    setattr(user, "followers", user.followers-1)
+    deleted = session.execute(
+        delete(FollowDB)
+        .where(FollowDB.follower_id == follower_id, FollowDB.followee_id == followee_id)
+        .returning(FollowDB.follower_id)
+    ).first()
+    
+    if deleted:
+        _adjust_follow_counts(session, follower_id, followee_id, -1)
     
-    session.add(user)
     session.commit()
-    session.refresh(user)
+    return deleted is not None
+
+
+def get_followers(session: Session, user_id: str, cursor: Optional[str] = None, limit: int = 50) -> tuple[list[str], Optional[str]]:
+    query = select(FollowDB.follower_id).where(FollowDB.followee_id == user_id)
+    if cursor:
+        query = query.where(FollowDB.follower_id > cursor)
+    
+    return _page(session.exec(query.order_by(FollowDB.follower_id).limit(limit + 1)).all(), limit)
+
+
+def get_following(session: Session, user_id: str, cursor: Optional[str] = None, limit: int = 50) -> tuple[list[str], Optional[str]]:
+    query = select(FollowDB.followee_id).where(FollowDB.follower_id == user_id)
+    if cursor:
+        query = query.where(FollowDB.followee_id > cursor)
     
-    return user
+    return _page(session.exec(query.order_by(FollowDB.followee_id).limit(limit + 1)).all(), limit)
+
+
+def remove_user_follows(session: Session, user_id: str):
+    #keep everyone else's counts right before the user's edges disappear
+    followees = select(FollowDB.followee_id).where(FollowDB.follower_id == user_id)
+    followers = select(FollowDB.follower_id).where(FollowDB.followee_id == user_id)
+    
+    session.execute(update(UserCreateDB).where(UserCreateDB.user_id.in_(followees)).values(followers=func.greatest(UserCreateDB.followers - 1, 0)))
+    session.execute(update(UserCreateDB).where(UserCreateDB.user_id.in_(followers)).values(following=func.greatest(UserCreateDB.following - 1, 0)))
+    session.execute(delete(FollowDB).where((FollowDB.follower_id == user_id) | (FollowDB.followee_id == user_id)))
+
 
-def most_active_users(session: Session) -> list[UserCreateResponse]:
-    query = select(UserCreateDB).order_by(UserCreateDB.posts.desc())
-    results = session.exec(query).limit(10).all()
+def _check_follow_pair(session: Session, follower_id: str, followee_id: str):
+    if follower_id == followee_id:
+        raise HTTPException(status_code=400, detail="Users cannot follow themselves!")
     
-    return results
+    for user_id in (follower_id, followee_id):
+        if not session.get(UserCreateDB, user_id):
+            raise HTTPException(status_code=404, detail=f"User {user_id} does not exists!")
 
-def most_followed_users(session: Session) -> list[UserCreateResponse]:
-    query = select(UserCreateDB).order_by(UserCreateDB.followers.desc())
-    results = session.exec(query).limit(10).all()
+
+def _adjust_follow_counts(session: Session, follower_id: str, followee_id: str, delta: int):
+    #relative updates in the same transaction as the edge, never read-modify-write.
+    #A follows B while B follows A touches the same two rows: lock them in user_id order first so
+    #the two transactions queue instead of deadlocking, then update both in one statement
+    pair = [follower_id, followee_id]
+    session.execute(select(UserCreateDB.user_id).where(UserCreateDB.user_id.in_(pair)).order_by(UserCreateDB.user_id).with_for_update())
+    session.execute(
+        update(UserCreateDB)
+        .where(UserCreateDB.user_id.in_(pair))
+        .values(
+            followers=case((UserCreateDB.user_id == followee_id, func.greatest(UserCreateDB.followers + delta, 0)), else_=UserCreateDB.followers),
+            following=case((UserCreateDB.user_id == follower_id, func.greatest(UserCreateDB.following + delta, 0)), else_=UserCreateDB.following)
+        )
+    )
+
+
+def _page(rows: list[str], limit: int) -> tuple[list[str], Optional[str]]:
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1]
+    return rows, None
+
+
+def apply_counter_deltas(session: Session, deltas: dict[str, dict[str, int]]):
+    #one statement per batch: each user's coalesced deltas joined in as a VALUES list
+    rows = []
+    params = {}
+    for i, (user_id, changes) in enumerate(deltas.items()):
+        rows.append(f"(:user_id_{i}, :posts_{i}, :comments_{i}, :likes_{i}, :dislikes_{i})")
+        params.update({
+            f"user_id_{i}": user_id,
+            f"posts_{i}": changes.get("posts", 0),
+            f"comments_{i}": changes.get("comments", 0),
+            f"likes_{i}": changes.get("total_likes", 0),
+            f"dislikes_{i}": changes.get("total_dislikes", 0)
+        })
     
-    return results
+    if not rows:
+        return
+    
+    session.execute(text(f"""
+        UPDATE users SET
+            posts = greatest(users.posts + d.posts, 0),
+            comments = greatest(users.comments + d.comments, 0),
+            total_likes = greatest(users.total_likes + d.likes, 0),
+            total_dislikes = greatest(users.total_dislikes + d.dislikes, 0)
+        FROM (VALUES {", ".join(rows)}) AS d (user_id, posts, comments, likes, dislikes)
+        WHERE users.user_id = CAST(d.user_id AS uuid)
+    """), params)
+    session.commit()
+
+
+def get_user_id_page(session: Session, cursor: Optional[str] = None, limit: int = 500) -> list[str]:
+    query = select(UserCreateDB.user_id)
+    if cursor:
+        query = query.where(UserCreateDB.user_id > cursor)
+    
+    return list(session.exec(query.order_by(UserCreateDB.user_id).limit(limit)).all())
+
+
+def set_user_counters(session: Session, counters: dict[str, dict[str, int]]) -> list[str]:
+    """Overwrite counters that drifted from the given true values; returns the repaired user ids."""
+    current = session.exec(select(UserCreateDB).where(UserCreateDB.user_id.in_(list(counters)))).all()
+    repaired = []
+    
+    for user in current:
+        expected = counters[str(user.user_id)]
+        changed = {field: value for field, value in expected.items() if getattr(user, field) != value}
+        
+        if changed:
+            for field, value in changed.items():
+                setattr(user, field, value)
+            session.add(user)
+            repaired.append(str(user.user_id))
+    
+    session.commit()
+    return repaired
+
+
+USER_LEADERBOARD_LIMIT = 10
+
+
+def _top_users(session: Session, score, limit: int) -> list[UserCreateDB]:
+    #walks the matching ix_users_*_rank index and stops after limit rows; ties go to the lowest user_id
+    query = select(UserCreateDB).order_by(score.desc(), UserCreateDB.user_id).limit(limit)
+    return session.exec(query).all()
+
+
+def most_active_users(session: Session, limit: int = USER_LEADERBOARD_LIMIT) -> list[UserCreateDB]:
+    return _top_users(session, UserCreateDB.posts + UserCreateDB.comments, limit)
+
+
+def most_posting_users(session: Session, limit: int = USER_LEADERBOARD_LIMIT) -> list[UserCreateDB]:
+    return _top_users(session, UserCreateDB.posts, limit)
+
+
+def most_followed_users(session: Session, limit: int = USER_LEADERBOARD_LIMIT) -> list[UserCreateDB]:
+    return _top_users(session, UserCreateDB.followers, limit)
     
\ No newline at end of file
@@ -1,23 +1,57 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Response
 from datetime import datetime
-from models import UserCreate, UserCreateResponse, UserUpdate, UserLogin
-from security import verify_password, get_password_hash
-from db import init_db, close_db_connection, engine, create_user, edit_user_info, get_user_info, get_user_by_username, add_followers, remove_followers
+from models import UserCreate, UserCreateResponse, UserProfile, UserUpdate, UserLogin, UserBatchRequest, UserBatchResponse, FollowPage
+from security import password_hasher
+from cache import profile_cache, redis_client
+from counters import COUNTER_EVENTS, CounterFlusher, CounterReconciler, queue_event_deltas, reconcile_counters
+from db import UserCreateDB, init_db, close_db_connection, ping_db, engine, user_profile, create_user, edit_user_info, get_user_info, get_user_profiles, get_user_by_username, is_username_available, update_password_hash, follow_user, unfollow_user, get_followers, get_following, remove_user_follows, apply_counter_deltas, get_user_id_page, set_user_counters, USER_LEADERBOARD_LIMIT, most_active_users, most_posting_users, most_followed_users
+from common.health import DependencyHealth
+from common.http_cache import ETagMiddleware
+from common.sessions import revoke_user_sessions
+from common.events import EventConsumer, UserFollowed, publish
+from common.metrics import add_metrics, instrument_client
+from common.tracing import add_tracing, trace_client
+from common.responses import ORJSONResponse, add_compression
+from common.log_setup import configure_logging
 from contextlib import asynccontextmanager, contextmanager
 from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
 import logging
 import httpx
 import os
 import socket
+from typing import Optional
 
 HOSTNAME = socket.gethostname()
 
+POST_SERVICE_BASE = os.getenv("POST_SERVICE_BASE", "http://post_service:8000")
+COMMENT_SERVICE_BASE = os.getenv("COMMENT_SERVICE_BASE", "http://comment_service:8000")
+USER_CACHE_MAX_AGE = int(os.getenv("USER_CACHE_MAX_AGE", "60"))
+
+#shared client for the reconciliation job's calls to post_service and comment_service
+service_client = trace_client(instrument_client(httpx.AsyncClient(timeout=10.0)))
+
+health = DependencyHealth("User Service", checks={"Database": ping_db})
+
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     init_db()
+    await health.start()
+    password_hasher.start()
+    profile_cache.start()
+    counter_flusher.start()
+    counter_reconciler.start()
+    counter_events.start()
     yield
+    await counter_events.close()
+    await counter_reconciler.close()
+    await counter_flusher.close()
+    await service_client.aclose()
+    profile_cache.close()
+    password_hasher.close()
+    await health.close()
     close_db_connection()
     
     
@@ -31,23 +65,59 @@ def get_session():
       
 
 #LOGGING SETUP
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
-        logging.FileHandler("./logs/cache_log.txt", mode="a"),
-        logging.StreamHandler()
-    ]
-)
+configure_logging("user_service")
 
 logger = logging.getLogger(__name__)
     
 
 app = FastAPI(
     title="User Service",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
+#profile_cache.invalidate() also invalidates the gateway's copies
+app.add_middleware(ETagMiddleware, rules=[(r"^/users/[^/]+(/profile)?$", USER_CACHE_MAX_AGE)])
+add_compression(app)
+add_metrics(app)
+add_tracing(app, "user_service")
+
+
+#USER COUNTERS
+def apply_deltas(deltas: dict[str, dict[str, int]]):
+    with get_session() as session:
+        apply_counter_deltas(session, deltas)
+
+
+def next_user_page(cursor: Optional[str], limit: int) -> list[str]:
+    with get_session() as session:
+        return get_user_id_page(session, cursor=cursor, limit=limit)
+
+
+def repair_counters(counters: dict[str, dict[str, int]]) -> list[str]:
+    with get_session() as session:
+        repaired = set_user_counters(session, counters)
+    
+    if repaired:
+        profile_cache.invalidate(*repaired)
+    return repaired
+
+
+async def run_reconciliation() -> int:
+    #the flusher is paused one page at a time while that page is recounted and repaired
+    return await reconcile_counters(service_client, POST_SERVICE_BASE, COMMENT_SERVICE_BASE, next_user_page, repair_counters, counter_flusher)
+
+
+def on_counter_event(event):
+    #only queues deltas, once per event id
+    if not queue_event_deltas(redis_client, event):
+        logger.info("Skipped redelivered %s %s", event.type, event.event_id)
+
+
+counter_flusher = CounterFlusher(redis_client, apply_deltas, on_applied=lambda user_ids: profile_cache.invalidate(*user_ids))
+counter_reconciler = CounterReconciler(run_reconciliation)
+counter_events = EventConsumer(redis_client, "user_counters", {event_type: on_counter_event for event_type in COUNTER_EVENTS})
+
 
 #endpoints
 
@@ -60,116 +130,236 @@ async def root():
     }
     
     
+@app.get("/livez")
+async def liveness_check():
+    return health.liveness()
+
+
+@app.get("/readyz")
+async def readiness_check(response: Response):
+    report = await health.readiness()
+    
+    if report["status"] != "healthy":
+        response.status_code = 503
+    return report
+    
+    
 @app.get("/health")
 async def health_check():
-    return {
-        "service": "User Service",
-        "status": "healthy",
-    }
+    return await health.readiness()
 
 
 @app.post("/auth/verify")
-def verify_user_credentials(credentials: UserLogin):
+async def verify_user_credentials(credentials: UserLogin):
+    
+    user = await run_in_threadpool(find_user_by_username, credentials.username)
     
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    
+    #bcrypt runs in the hashing pool, not on the event loop or a request thread
+    verified, new_hash = await password_hasher.verify(credentials.password, user.hashed_password)
+    
+    if not verified:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    
+    #hashes made with an older cost are upgraded transparently
+    if new_hash:
+        await run_in_threadpool(store_password_hash, user.user_id, new_hash)
+    
+    return {
+        "user_id": str(user.user_id),
+        "username": user.username,
+        "active": user.active
+    }
+    
+    
+def find_user_by_username(username: str):
     with get_session() as session:
-        user = get_user_by_username(session, username=credentials.username)
-        
-        if not user:
-            raise HTTPException(status_code=401, detail="Invalid credentials")
-        
-        if not verify_password(credentials.password, user.hashed_password):
-            raise HTTPException(status_code=401, detail="Invalid credentials")
+        return get_user_by_username(session, username=username)
+    
+    
+def store_password_hash(user_id: str, password_hash: str):
+    with get_session() as session:
+        update_password_hash(session, user_id, password_hash)
         
-        return {
-            "user_id": str(user.user_id),
-            "username": user.username,
-            "active": user.active
-        }
 
 @app.post("/users", status_code=201, response_model=UserCreateResponse)
-def create_new_user(user: UserCreate):
+async def create_new_user(user: UserCreate):
     
+    password_hash = await password_hasher.hash(user.password)
+    
+    #the session is synchronous, so it runs off the event loop
+    return await run_in_threadpool(store_new_user, user, password_hash)
+
+
+def store_new_user(user: UserCreate, password_hash: str):
     with get_session() as session:
-        response = create_user(session, user)
-        return response
+        return create_user(session, user, password_hash)
 
 
 
 @app.get("/users/{user_id}", status_code=200, response_model=UserCreateResponse)
 def get_user(user_id: str):
     
+    profile = profile_cache.get(user_id, load_profile)
+    
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"User {user_id} does not exists!")
+    return profile
+
+
+@app.head("/users/{user_id}", status_code=200)
+def user_exists(user_id: str):
+    
+    if profile_cache.get(user_id, load_profile) is None:
+        return Response(status_code=404)
+    return Response(status_code=200)
+
+
+def load_profile(user_id: str):
     with get_session() as session:
-        user = get_user_info(session=session, user_id=user_id)
+        user = session.get(UserCreateDB, user_id)
+        return user_profile(user) if user else None
+    
+
+@app.post("/users:batch", status_code=200, response_model=UserBatchResponse)
+def get_users_batch(batch: UserBatchRequest):
+    
+    profiles = profile_cache.get_many(batch.user_ids, load_profiles)
+    
+    #one entry per requested id, in request order; unknown ids come back as null
+    return {"users": [profiles.get(user_id) for user_id in batch.user_ids]}
+
+
+def load_profiles(user_ids: list[str]) -> dict[str, dict]:
+    with get_session() as session:
+        return get_user_profiles(session, user_ids)
+    
+
+@app.post("/admin/counters/reconcile", status_code=200)
+async def reconcile_user_counters():
+    
+    repaired = await run_reconciliation()
+    logger.info("Counter reconciliation repaired %s users", repaired)
+    return {"repaired": repaired}
+    
+
+@app.get("/cache/stats", status_code=200)
+def get_cache_stats():
+    return profile_cache.stats()
+
+
+@app.get("/events/stats", status_code=200)
+def get_event_stats():
+    #"lag" is events the counter consumers have not read yet, "pending" read but not acked
+    return counter_events.stats()
+    
+
+#the user leaderboards trending_service serves; UserProfile leaves the email out
+@app.get("/rankings/users/activity", status_code=200, response_model=list[UserProfile])
+def get_most_active_users(limit: int = Query(default=USER_LEADERBOARD_LIMIT, ge=1, le=100)):
+    
+    #activity is posts + comments
+    with get_session() as session:
+        return [user_profile(user) for user in most_active_users(session, limit)]
+
+
+@app.get("/rankings/users/posts", status_code=200, response_model=list[UserProfile])
+def get_most_posting_users(limit: int = Query(default=USER_LEADERBOARD_LIMIT, ge=1, le=100)):
+    
+    with get_session() as session:
+        return [user_profile(user) for user in most_posting_users(session, limit)]
+
+
+@app.get("/rankings/users/followers", status_code=200, response_model=list[UserProfile])
+def get_most_followed_users(limit: int = Query(default=USER_LEADERBOARD_LIMIT, ge=1, le=100)):
+    
+    with get_session() as session:
+        return [user_profile(user) for user in most_followed_users(session, limit)]
+
+
+@app.get("/users/by-username/{username}", status_code=200, response_model=UserCreateResponse)
+def get_user_by_name(username: str):
+    
+    with get_session() as session:
+        user = get_user_by_username(session=session, username=username)
         
+        return user_profile(user)
+    
+    
+@app.get("/users/availability/{username}", status_code=200)
+def check_username_availability(username: str):
+    
+    with get_session() as session:
         return {
-            "user_id": str(user.user_id),
-            "username": user.username,
-            "email": user.email,
-            "full_name": user.full_name,
-            "created_at": str(user.created_at),
-            "followers": user.followers,
-            "posts": user.posts,
-            "comments": user.comments,
-            "active": user.active
+            "username": username,
+            "available": is_username_available(session=session, username=username)
         }
     
 
 @app.put("/users/{user_id}", status_code=200, response_model=UserCreateResponse)
-def update_user_info(user_id: str, user_update: UserUpdate):
+async def update_user_info(user_id: str, user_update: UserUpdate):
+    
+    password_hash = None
+    if user_update.password is not None:
+        password_hash = await password_hasher.hash(user_update.password)
     
+    return await run_in_threadpool(store_user_update, user_id, user_update, password_hash)
+
+
+def store_user_update(user_id: str, user_update: UserUpdate, password_hash: Optional[str]):
     with get_session() as session:
         original = get_user_info(session=session, user_id=user_id)
-        updated_user = edit_user_info(session=session, original_user=original, update=user_update)
+        updated_user = edit_user_info(session=session, original_user=original, update=user_update, password_hash=password_hash)
+        profile_cache.invalidate(user_id)
         
-        return UserCreateResponse({
-            "user_id": str(updated_user.user_id),
-            "username": updated_user.username,
-            "email": updated_user.email,
-            "full_name": updated_user.full_name,
-            "created_at": str(updated_user.created_at),
-            "followers": updated_user.followers,
-            "posts": updated_user.posts,
-            "comments": updated_user.comments,
-            "active": updated_user.active
-        })
+        #a new password or deactivation ends every refresh session; access tokens lapse on their own
+        if password_hash is not None or user_update.active is False:
+            revoke_user_sessions(redis_client, user_id)
+        
+        return user_profile(updated_user)
         
         
 
-@app.put("/users/follow/{user_id}", response_model=UserCreateResponse)
-async def add_follower(user_id: str):
+@app.put("/users/{follower_id}/follow/{followee_id}", response_model=UserCreateResponse)
+def add_follower(follower_id: str, followee_id: str):
     
     with get_session() as session:
-        updated_user = add_followers(session=session, user_id=user_id)
-        
-        return {
-            "user_id": str(updated_user.user_id),
-            "username": updated_user.username,
-            "email": updated_user.email,
-            "full_name": updated_user.full_name,
-            "created_at": str(updated_user.created_at),
-            "followers": updated_user.followers,
-            "posts": updated_user.posts,
-            "comments": updated_user.comments,
-            "active": updated_user.active
-        }
+        if follow_user(session=session, follower_id=follower_id, followee_id=followee_id):
+            profile_cache.invalidate(follower_id, followee_id)
+            publish(redis_client, UserFollowed(follower_id=follower_id, followee_id=followee_id))
+            logger.info("User %s followed user %s", follower_id, followee_id)
         
-@app.put("/users/unfollow/{user_id}", response_model=UserCreateResponse)
-async def remove_follower(user_id: str):
+        return user_profile(session.get(UserCreateDB, followee_id))
+    
+    
+@app.delete("/users/{follower_id}/follow/{followee_id}", response_model=UserCreateResponse)
+def remove_follower(follower_id: str, followee_id: str):
     
     with get_session() as session:
-        updated_user = remove_followers(session=session, user_id=user_id)
+        if unfollow_user(session=session, follower_id=follower_id, followee_id=followee_id):
+            profile_cache.invalidate(follower_id, followee_id)
+            publish(redis_client, UserFollowed(follower_id=follower_id, followee_id=followee_id, following=False))
+            logger.info("User %s unfollowed user %s", follower_id, followee_id)
         
-        return {
-            "user_id": str(updated_user.user_id),
-            "username": updated_user.username,
-            "email": updated_user.email,
-            "full_name": updated_user.full_name,
-            "created_at": str(updated_user.created_at),
-            "followers": updated_user.followers,
-            "posts": updated_user.posts,
-            "comments": updated_user.comments,
-            "active": updated_user.active
-        }
+        return user_profile(session.get(UserCreateDB, followee_id))
+    
+    
+@app.get("/users/{user_id}/followers", response_model=FollowPage)
+def list_followers(user_id: str, cursor: Optional[str] = None, limit: int = Query(default=50, ge=1, le=500)):
+    
+    with get_session() as session:
+        user_ids, next_cursor = get_followers(session=session, user_id=user_id, cursor=cursor, limit=limit)
+        return {"user_ids": user_ids, "next_cursor": next_cursor}
+    
+    
+@app.get("/users/{user_id}/following", response_model=FollowPage)
+def list_following(user_id: str, cursor: Optional[str] = None, limit: int = Query(default=50, ge=1, le=500)):
+    
+    with get_session() as session:
+        user_ids, next_cursor = get_following(session=session, user_id=user_id, cursor=cursor, limit=limit)
+        return {"user_ids": user_ids, "next_cursor": next_cursor}
     
 
 @app.get("/users/posts/{user_id}", response_model=UserCreateResponse)
@@ -180,6 +370,28 @@ async def get_posts(user_id: str):
 async def get_comments(user_id: str):
     pass
 
+#the public view the gateway serves; declared after the fixed /users/<name>/ routes so those win
+@app.get("/users/{user_id}/profile", status_code=200, response_model=UserProfile)
+def get_public_profile(user_id: str):
+    
+    profile = profile_cache.get(user_id, load_profile)
+    
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"User {user_id} does not exists!")
+    return profile
+
+
 @app.delete("/users/{user_id}", status_code=204)
 def delete_user(user_id: str):
-    pass
\ No newline at end of file
+    
+    with get_session() as session:
+        user = get_user_info(session=session, user_id=user_id)
+        
+        remove_user_follows(session=session, user_id=user_id)
+        session.delete(user)
+        session.commit()
+        profile_cache.invalidate(user_id)
+        revoke_user_sessions(redis_client, user_id)
+        
+        logger.info("User %s deleted", user_id)
+    return Response(status_code=204)
\ No newline at end of file
@@ -23,8 +23,26 @@ class UserCreateResponse(BaseModel):
     full_name: str | None = None
     created_at: str
     followers: int
+    following: int = 0
     posts: int
     comments: int
+    total_likes: int = 0
+    total_dislikes: int = 0
+    active: bool
+
+
+class UserProfile(BaseModel):
+    #what anyone may see of a user; no email
+    user_id: str
+    username: str
+    full_name: str | None = None
+    created_at: str
+    followers: int
+    following: int = 0
+    posts: int
+    comments: int
+    total_likes: int = 0
+    total_dislikes: int = 0
     active: bool
     
 class UserUpdate(BaseModel):
@@ -32,5 +50,20 @@ class UserUpdate(BaseModel):
     full_name: Optional[str] = Field(default=None, max_length=100)
     password: Optional[str] =  Field(default=None, min_length=8)
     active: Optional[bool] = Field(default=None)
-    
 
+
+#most ids a single batch lookup may resolve
+USER_BATCH_LIMIT = 100
+
+
+class UserBatchRequest(BaseModel):
+    user_ids: list[str] = Field(..., min_length=1, max_length=USER_BATCH_LIMIT)
+
+
+class UserBatchResponse(BaseModel):
+    users: list[Optional[UserCreateResponse]]
+
+
+class FollowPage(BaseModel):
+    user_ids: list[str]
+    next_cursor: Optional[str] = None
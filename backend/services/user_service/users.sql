@@ -8,7 +8,20 @@ CREATE TABLE IF NOT EXISTS users (
     full_name    VARCHAR(255),
     created_at   TIMESTAMP NOT NULL DEFAULT NOW(),
     followers    INTEGER NOT NULL DEFAULT 0,
+    following    INTEGER NOT NULL DEFAULT 0,
     posts        INTEGER NOT NULL DEFAULT 0,
     comments     INTEGER NOT NULL DEFAULT 0,
     active       BOOLEAN NOT NULL DEFAULT TRUE
-);
\ No newline at end of file
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_users_username_lower_incl ON users (lower(username)) INCLUDE (username);
+
+CREATE TABLE IF NOT EXISTS follows (
+    follower_id  VARCHAR NOT NULL,
+    followee_id  VARCHAR NOT NULL,
+    created_at   TIMESTAMP NOT NULL DEFAULT NOW(),
+
+    PRIMARY KEY (follower_id, followee_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_follows_followee ON follows (followee_id, follower_id);
@@ -0,0 +1,83 @@
+"""End-to-end latency of POST /posts with user_service's profile cache warm.
+
+Every post write checks the author against user_service, so this measures the
+full post_service -> user_service -> post_db path. Run against a live stack:
+
+    python tests/Benchmarks/bench_create_post.py --requests 500 --concurrency 16
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+import httpx
+
+USER_SERVICE_URL = "http://localhost:8000"
+POST_SERVICE_URL = "http://localhost:8001"
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def create_user(client: httpx.AsyncClient) -> tuple[str, str]:
+    username = f"poster_{uuid.uuid4().hex[:12]}"
+
+    res = await client.post(f"{USER_SERVICE_URL}/users", json={
+        "username": username,
+        "email": f"{username}@example.com",
+        "password": "benchpassword123"
+    })
+    res.raise_for_status()
+
+    return res.json()["user_id"], username
+
+
+async def post_loop(client: httpx.AsyncClient, user_id: str, username: str, count: int, latencies: list[float]):
+    for i in range(count):
+        started = time.perf_counter()
+        res = await client.post(f"{POST_SERVICE_URL}/posts", json={
+            "user_id": user_id,
+            "username": username,
+            "title": f"Benchmark post {i}",
+            "category": "Other",
+            "content": "Measuring the write path with a warm profile cache."
+        })
+        latencies.append((time.perf_counter() - started) * 1000)
+        res.raise_for_status()
+
+
+async def run(requests: int, concurrency: int):
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        user_id, username = await create_user(client)
+
+        #warm both cache tiers before measuring
+        (await client.get(f"{USER_SERVICE_URL}/users/{user_id}")).raise_for_status()
+        before = (await client.get(f"{USER_SERVICE_URL}/cache/stats")).json()
+
+        latencies: list[float] = []
+        per_worker = max(1, requests // concurrency)
+        started = time.perf_counter()
+        await asyncio.gather(*(post_loop(client, user_id, username, per_worker, latencies) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+        after = (await client.get(f"{USER_SERVICE_URL}/cache/stats")).json()
+
+    print(f"POST /posts n={len(latencies)} in {elapsed:.1f}s ({len(latencies) / elapsed:.1f}/s) "
+          f"p50={statistics.median(latencies):.1f}ms "
+          f"p95={percentile(latencies, 95):.1f}ms "
+          f"p99={percentile(latencies, 99):.1f}ms")
+
+    lookups = {stat: after[stat] - before[stat] for stat in ("local_hits", "redis_hits", "misses")}
+    print(f"profile cache during run: {lookups}, overall hit rate {after['hit_rate']:.2%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.requests, args.concurrency))
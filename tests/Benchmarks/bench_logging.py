@@ -0,0 +1,152 @@
+"""Request latency under load with the old and the new logging setup.
+
+Drives an in-process app (no network, no database) whose handler logs a few
+INFO lines per request, like the services' read endpoints, with many
+requests in flight on one event loop. Compares:
+  sync      FileHandler plus StreamHandler on the root logger, f-string messages (the old basicConfig)
+  queue     configure_logging: QueueHandler to a writer thread, JSON, rotation, lazy %s messages
+  sampled   the same with the route sampled at --sample-rate
+Console output goes to /dev/null in every mode; the file goes to --dir.
+--flush-delay-ms adds a sleep to every flush of the log file, standing in for
+a slow disk or a container log driver that is not keeping up.
+
+    python tests/Benchmarks/bench_logging.py --requests 20000 --concurrency 64 --flush-delay-ms 0.2
+"""
+import argparse
+import asyncio
+import atexit
+import logging
+import os
+import sys
+import tempfile
+import time
+import httpx
+from fastapi import FastAPI
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "backend", "services"))
+
+from common.log_setup import configure_logging  # noqa: E402
+from common.tracing import TracingMiddleware  # noqa: E402
+
+ROUTE = "GET /posts/{post_id}"
+logger = logging.getLogger("bench")
+
+
+class SlowStream:
+    """A file whose flush() blocks for delay seconds first."""
+
+    def __init__(self, stream, delay: float):
+        self.stream = stream
+        self.delay = delay
+
+    def flush(self):
+        time.sleep(self.delay)
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def make_app(lazy: bool) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(TracingMiddleware, sample_rate=0.0)
+
+    @app.get("/posts/{post_id}")
+    async def get_post(post_id: str):
+        if lazy:
+            logger.info("Retrieved post %s", post_id)
+            logger.info("Post %s served from %s", post_id, "cache")
+            logger.info("Retrieved comments for post %s", post_id)
+        else:
+            logger.info(f"Retrieved post {post_id}")
+            logger.info(f"Post {post_id} served from {'cache'}")
+            logger.info(f"Retrieved comments for post {post_id}")
+        return {"post_id": post_id}
+
+    return app
+
+
+def reset_root():
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+
+
+def setup(mode: str, path: str, sample_rate: float, flush_delay: float):
+    reset_root()
+    if mode == "sync":
+        file_handler = logging.FileHandler(path, mode="a")
+        logging.basicConfig(
+            level=logging.INFO,
+            format="%(asctime)s [%(levelname)s] %(message)s",
+            handlers=[file_handler, logging.StreamHandler(open(os.devnull, "w"))],
+            force=True
+        )
+        listener = None
+    else:
+        #configure_logging writes the console copy to stdout
+        stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+        try:
+            listener = configure_logging("bench", sample_rates={ROUTE: sample_rate} if mode == "sampled" else None, path=path)
+        finally:
+            sys.stdout = stdout
+        file_handler = listener.handlers[0]
+
+    if flush_delay:
+        file_handler.stream = SlowStream(file_handler.stream, flush_delay)
+    return listener
+
+
+async def drive(app: FastAPI, requests: int, concurrency: int) -> list[float]:
+    latencies = []
+    counter = iter(range(requests))
+
+    async def worker(client: httpx.AsyncClient):
+        for i in counter:
+            started = time.perf_counter()
+            await client.get(f"/posts/{i}")
+            latencies.append(time.perf_counter() - started)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return latencies
+
+
+def run(requests: int, concurrency: int, sample_rate: float, flush_delay_ms: float, directory: str):
+    #keep the benchmark's own output off the handlers being measured
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    for mode in ("sync", "queue", "sampled"):
+        path = os.path.join(directory, f"bench_{mode}.log")
+        listener = setup(mode, path, sample_rate, flush_delay_ms / 1000)
+        app = make_app(lazy=mode != "sync")
+
+        asyncio.run(drive(app, 500, concurrency))
+        started = time.perf_counter()
+        latencies = sorted(asyncio.run(drive(app, requests, concurrency)))
+        elapsed = time.perf_counter() - started
+
+        if listener is not None:
+            #time until everything queued is on disk
+            listener.stop()
+            atexit.unregister(listener.stop)
+        drained = time.perf_counter() - started
+        reset_root()
+
+        p = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000
+        print(f"{mode:<8} {requests / elapsed:8.0f} req/s   p50 {p(0.5):7.2f}ms   p99 {p(0.99):7.2f}ms   "
+              f"max {latencies[-1] * 1000:7.2f}ms   on disk after {drained:5.2f}s   {os.path.getsize(path) / 1024:8.0f}KB")
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--sample-rate", type=float, default=0.1)
+    parser.add_argument("--flush-delay-ms", type=float, default=0.0)
+    parser.add_argument("--dir", default=tempfile.gettempdir(), help="where the log files go; point it at a slow disk to see more")
+    args = parser.parse_args()
+
+    run(args.requests, args.concurrency, args.sample_rate, args.flush_delay_ms, args.dir)
@@ -0,0 +1,88 @@
+"""Login storm: p99 of GET /users/{id} on user_service while bcrypt logins are in flight.
+
+Run against a live stack (docker compose up):
+
+    python tests/Benchmarks/bench_login_storm.py --logins 64 --duration 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+import httpx
+
+USER_SERVICE_URL = "http://localhost:8000"
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def create_user(client: httpx.AsyncClient) -> tuple[str, str, str]:
+    username = f"storm_{uuid.uuid4().hex[:12]}"
+    password = "stormpassword123"
+
+    res = await client.post(f"{USER_SERVICE_URL}/users", json={
+        "username": username,
+        "email": f"{username}@example.com",
+        "password": password
+    })
+    res.raise_for_status()
+
+    return res.json()["user_id"], username, password
+
+
+async def login_loop(client: httpx.AsyncClient, username: str, password: str, stop: float, stats: dict):
+    while time.perf_counter() < stop:
+        res = await client.post(f"{USER_SERVICE_URL}/auth/verify", json={"username": username, "password": password})
+        stats[res.status_code] = stats.get(res.status_code, 0) + 1
+
+
+async def probe_loop(client: httpx.AsyncClient, user_id: str, stop: float, latencies: list[float], interval: float):
+    while time.perf_counter() < stop:
+        started = time.perf_counter()
+        res = await client.get(f"{USER_SERVICE_URL}/users/{user_id}")
+        latencies.append((time.perf_counter() - started) * 1000)
+        res.raise_for_status()
+        await asyncio.sleep(interval)
+
+
+async def run(logins: int, duration: float, interval: float):
+    limits = httpx.Limits(max_connections=logins + 4)
+
+    async with httpx.AsyncClient(timeout=30.0, limits=limits) as client:
+        user_id, username, password = await create_user(client)
+
+        baseline: list[float] = []
+        await probe_loop(client, user_id, time.perf_counter() + min(5.0, duration), baseline, interval)
+
+        storm: list[float] = []
+        statuses: dict[int, int] = {}
+        stop = time.perf_counter() + duration
+        await asyncio.gather(
+            probe_loop(client, user_id, stop, storm, interval),
+            *(login_loop(client, username, password, stop, statuses) for _ in range(logins))
+        )
+
+    for label, samples in (("idle", baseline), ("login storm", storm)):
+        print(f"GET /users/{{id}} [{label}] n={len(samples)} "
+              f"p50={statistics.median(samples):.1f}ms "
+              f"p95={percentile(samples, 95):.1f}ms "
+              f"p99={percentile(samples, 99):.1f}ms")
+
+    total = sum(statuses.values())
+    print(f"POST /auth/verify: {total} requests in {duration:.0f}s ({total / duration:.1f}/s), statuses={statuses}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=64, help="concurrent login loops")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of login storm")
+    parser.add_argument("--interval", type=float, default=0.02, help="delay between profile probes")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.logins, args.duration, args.interval))
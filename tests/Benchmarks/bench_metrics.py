@@ -0,0 +1,86 @@
+"""Per-request cost of the /metrics instrumentation.
+
+Runs the same small FastAPI app with and without add_metrics in process (no
+network, no database), so the difference per request is the middleware plus
+its counter, gauge and histogram updates. Also times a bare Histogram.observe
+and a full /metrics render with the given number of route series.
+
+    python tests/Benchmarks/bench_metrics.py --requests 20000 --routes 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import httpx
+from fastapi import FastAPI
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "backend", "services"))
+
+from common.metrics import HTTP_LATENCY, add_metrics  # noqa: E402
+from common.responses import ORJSONResponse  # noqa: E402
+
+
+def make_app(instrumented: bool) -> FastAPI:
+    app = FastAPI(default_response_class=ORJSONResponse)
+    if instrumented:
+        add_metrics(app)
+
+    @app.get("/posts/{post_id}")
+    async def get_post(post_id: str):
+        return {"post_id": post_id, "title": "A post", "likes": 3}
+
+    return app
+
+
+async def drive(app: FastAPI, requests: int) -> list[float]:
+    latencies = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for i in range(requests):
+            started = time.perf_counter()
+            await client.get(f"/posts/{i}")
+            latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def report(label: str, latencies: list[float]) -> float:
+    latencies.sort()
+    mean = statistics.fmean(latencies) * 1_000_000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1_000_000
+    print(f"{label:<14} mean {mean:8.1f}us   p50 {latencies[len(latencies) // 2] * 1_000_000:8.1f}us   p99 {p99:8.1f}us")
+    return mean
+
+
+def micro(routes: int, repeat: int):
+    started = time.perf_counter()
+    for i in range(repeat):
+        HTTP_LATENCY.observe(0.004, "GET", f"/bench/{i % routes}")
+    print(f"{'observe':<14} {(time.perf_counter() - started) / repeat * 1_000_000_000:8.0f}ns per call")
+
+    app = make_app(True)
+    render = next(route.endpoint for route in app.routes if getattr(route, "path", None) == "/metrics")
+    started = time.perf_counter()
+    body = render().body
+    print(f"{'render':<14} {(time.perf_counter() - started) * 1000:8.2f}ms for {len(body)} bytes")
+
+
+def run(requests: int, routes: int):
+    #warm up both so imports and first-request setup stay out of the numbers
+    for instrumented in (False, True):
+        asyncio.run(drive(make_app(instrumented), 500))
+
+    baseline = report("plain", asyncio.run(drive(make_app(False), requests)))
+    instrumented = report("instrumented", asyncio.run(drive(make_app(True), requests)))
+    print(f"{'overhead':<14} {instrumented - baseline:8.1f}us per request ({(instrumented - baseline) / baseline:.1%})")
+
+    micro(routes, requests * 10)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--routes", type=int, default=50, help="distinct route series to render")
+    args = parser.parse_args()
+
+    run(args.requests, args.routes)
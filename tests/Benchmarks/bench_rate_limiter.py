@@ -0,0 +1,68 @@
+"""Per-request overhead of the gateway rate limiter against a real Redis.
+
+Calls RateLimiter.acquire directly, the way the route dependencies do, for a
+set of subjects with a bucket large enough never to deny. Compares leasing one
+token per Redis call (every request is a round trip) with batched leases.
+
+    REDIS_HOST=localhost python tests/Benchmarks/bench_rate_limiter.py --requests 50000 --subjects 100
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("REDIS_HOST", "localhost")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "backend", "services"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "backend", "gateway"))
+
+import redis.asyncio as aioredis  # noqa: E402
+from app.core.ratelimit import RateLimiter, RatePolicy  # noqa: E402
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def measure(lease: int, requests: int, subjects: int, concurrency: int) -> tuple[list[float], dict]:
+    client = aioredis.Redis(host=os.environ["REDIS_HOST"], port=6379, decode_responses=True)
+    limiter = RateLimiter(client)
+    policy = RatePolicy(f"bench{lease}", rate=1_000_000, burst=1_000_000, lease=lease)
+    latencies: list[float] = []
+
+    async def worker(offset: int):
+        for i in range(offset, requests, concurrency):
+            started = time.perf_counter()
+            wait = await limiter.acquire(policy, f"bench-subject-{i % subjects}")
+            latencies.append((time.perf_counter() - started) * 1_000_000)
+            assert wait == 0
+
+    await asyncio.gather(*(worker(offset) for offset in range(concurrency)))
+
+    keys = [key async for key in client.scan_iter(f"ratelimit:{policy.name}:*")]
+    if keys:
+        await client.delete(*keys)
+    stats = limiter.stats()
+    await limiter.close()
+
+    return latencies, stats
+
+
+async def run(requests: int, subjects: int, concurrency: int, leases: list[int]):
+    for lease in leases:
+        latencies, stats = await measure(lease, requests, subjects, concurrency)
+        print(f"lease={lease:<4} p50={statistics.median(latencies):8.1f}us p99={percentile(latencies, 99):8.1f}us "
+              f"mean={statistics.fmean(latencies):8.1f}us redis calls/request={stats['redis_calls'] / requests:.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50_000)
+    parser.add_argument("--subjects", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--leases", type=int, nargs="+", default=[1, 5, 20, 100])
+    args = parser.parse_args()
+
+    asyncio.run(run(args.requests, args.subjects, args.concurrency, args.leases))
@@ -0,0 +1,116 @@
+"""Serialization CPU per response for post lists and comment threads.
+
+Builds ORM rows in memory (no database) and times, per response:
+  default   per-row response models, jsonable_encoder, json.dumps (FastAPI's stock path)
+  orjson    the same, with the ORJSONResponse default_response_class
+  rows      RowSerializer: pydantic-core validates the rows and dumps JSON in one pass
+and the extra CPU and the size saved by gzip at the services' level.
+
+    python tests/Benchmarks/bench_serialization.py --sizes 20 100 500 --repeat 200
+"""
+import argparse
+import gzip
+import importlib
+import json
+import os
+import sys
+import time
+import warnings
+from datetime import datetime
+
+SERVICES = os.path.join(os.path.dirname(__file__), "..", "..", "backend", "services")
+sys.path.insert(0, SERVICES)
+#the models only; the engine is created but never connected
+os.environ.setdefault("DATABASE_URL", "sqlite:////tmp/bench_serialization.db")
+#dumping a raw row warns once per row that edited_at holds a datetime, not the declared str
+warnings.filterwarnings("ignore", category=UserWarning, module="pydantic")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from common.ids import new_id  # noqa: E402
+from common.responses import GZIP_LEVEL, ORJSONResponse, RowSerializer  # noqa: E402
+
+
+def load_service(name: str):
+    #every service has top-level db.py and models.py, so import one at a time
+    path = os.path.join(SERVICES, name)
+    sys.path.insert(0, path)
+    try:
+        db, models = importlib.import_module("db"), importlib.import_module("models")
+    finally:
+        sys.path.remove(path)
+        sys.modules.pop("db", None)
+        sys.modules.pop("models", None)
+    return db, models
+
+
+post_db, post_models = load_service("post_service")
+comment_db, comment_models = load_service("comment_service")
+
+
+def make_posts(count: int) -> list:
+    return [
+        post_db.PostCreateDB(post_id=new_id(), user_id=new_id(), username=f"author_{i % 50}", title=f"Post title number {i}",
+                             category="Technology", content="Lorem ipsum dolor sit amet. " * 20, likes=i * 3, dislikes=i,
+                             edited_at=datetime.now())
+        for i in range(count)
+    ]
+
+
+def make_comments(count: int) -> list:
+    post_id = new_id()
+    return [
+        comment_db.CommentCreateDB(comment_id=new_id(), user_id=new_id(), post_id=post_id, username=f"reader_{i % 200}",
+                                   content="Great post, thanks for sharing! " * 3, likes=i % 7, dislikes=i % 3,
+                                   edited_at=datetime.now())
+        for i in range(count)
+    ]
+
+
+def cpu_per_call(fn, repeat: int) -> tuple[float, bytes]:
+    body = fn()
+    started = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - started) / repeat * 1_000_000, body
+
+
+def compare(label: str, rows: list, model, to_model, repeat: int):
+    serializer = RowSerializer(list[model])
+    orjson_response = ORJSONResponse(content=None)
+
+    paths = {
+        "default": lambda: json.dumps(jsonable_encoder([to_model(row) for row in rows]), separators=(",", ":")).encode(),
+        "orjson": lambda: orjson_response.render(jsonable_encoder([to_model(row) for row in rows])),
+        "rows": lambda: serializer.dump(rows),
+    }
+
+    results = {name: cpu_per_call(fn, repeat) for name, fn in paths.items()}
+    baseline = results["default"][0]
+    for name, (micros, body) in results.items():
+        print(f"{label:<22} {name:<8} {micros:10.1f}us/response  {baseline / micros:5.1f}x  {len(body):8d} bytes")
+
+    body = results["rows"][1]
+    gzip_micros, compressed = cpu_per_call(lambda: gzip.compress(body, compresslevel=GZIP_LEVEL), repeat)
+    print(f"{label:<22} {'gzip':<8} {gzip_micros:10.1f}us/response         {len(compressed):8d} bytes ({len(compressed) / len(body):.0%})")
+
+
+def to_post_response(post):
+    return post_models.PostResponse(post_id=post.post_id, user_id=post.user_id, username=post.username, title=post.title,
+                                    category=post.category, content=post.content, likes=post.likes, dislikes=post.dislikes,
+                                    edited_at=post.edited_at)
+
+
+def run(sizes: list[int], repeat: int):
+    for size in sizes:
+        compare(f"post list ({size})", make_posts(size), post_models.PostResponse, to_post_response, repeat)
+        #comment threads used to go out as raw SQLModel rows
+        compare(f"comment thread ({size})", make_comments(size), comment_models.CommentResponse, lambda comment: comment, repeat)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 100, 500])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    run(args.sizes, args.repeat)
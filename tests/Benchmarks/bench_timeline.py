@@ -0,0 +1,116 @@
+"""Home timeline on a synthetic social graph: write amplification and read latency.
+
+Drives post_service's timeline module directly against a Redis instance, with a
+heavy-tailed follower distribution, and compares pure fan-out-on-write with the
+hybrid model where authors above the celebrity threshold are pulled at read time.
+
+    REDIS_HOST=localhost python tests/Benchmarks/bench_timeline.py --users 50000 --posts 2000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+os.environ.setdefault("REDIS_HOST", "localhost")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "backend", "services", "post_service"))
+
+import timeline  # noqa: E402
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def build_graph(users: int, seed: int) -> tuple[list[str], dict[str, list[str]], dict[str, list[str]]]:
+    rng = random.Random(seed)
+    user_ids = [f"bench-user-{i}" for i in range(users)]
+
+    #pareto-distributed follower counts: most accounts are small, a handful are huge
+    followers: dict[str, list[str]] = {}
+    following: dict[str, list[str]] = {user_id: [] for user_id in user_ids}
+    for user_id in user_ids:
+        count = min(users - 1, int(rng.paretovariate(1.2) * 5))
+        followers[user_id] = rng.sample(user_ids, count)
+        for follower_id in followers[user_id]:
+            following[follower_id].append(user_id)
+
+    return user_ids, followers, following
+
+
+def publish(user_ids, followers, posts: int, threshold: float, seed: int) -> tuple[int, list[float]]:
+    rng = random.Random(seed)
+    writes = 0
+    latencies = []
+
+    for i in range(posts):
+        author_id = rng.choice(user_ids)
+        post_id = f"bench-post-{i}"
+        created_ms = timeline.now_ms()
+
+        started = time.perf_counter()
+        timeline.record_author_post(author_id, post_id, created_ms)
+        if len(followers[author_id]) >= threshold:
+            timeline.redis_client.sadd(timeline.CELEBRITIES_KEY, author_id)
+            writes += timeline.fan_out(post_id, created_ms, [author_id])
+        else:
+            writes += timeline.fan_out(post_id, created_ms, [author_id, *followers[author_id]])
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    return writes, latencies
+
+
+def read_feeds(user_ids, followers, following, readers: int, threshold: float, seed: int) -> list[float]:
+    rng = random.Random(seed)
+    latencies = []
+
+    for reader_id in rng.sample(user_ids, readers):
+        celebrities = [followee for followee in following[reader_id] if len(followers[followee]) >= threshold]
+
+        started = time.perf_counter()
+        post_ids, cursor = timeline.merge_feed(reader_id, celebrities, None, 20)
+        if cursor is not None:
+            timeline.merge_feed(reader_id, celebrities, cursor, 20)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    return latencies
+
+
+def cleanup():
+    for pattern in ("timeline:bench-user-*", "timeline:author:bench-user-*"):
+        keys = list(timeline.redis_client.scan_iter(pattern, count=1000))
+        for start in range(0, len(keys), 1000):
+            timeline.redis_client.delete(*keys[start:start + 1000])
+    timeline.redis_client.delete(timeline.CELEBRITIES_KEY)
+
+
+def run(users: int, posts: int, readers: int, threshold: int, seed: int):
+    user_ids, followers, following = build_graph(users, seed)
+    sizes = sorted(len(f) for f in followers.values())
+    print(f"graph: {users} users, {sum(sizes)} edges, median followers {statistics.median(sizes)}, max {sizes[-1]}, "
+          f"{sum(1 for size in sizes if size >= threshold)} accounts >= {threshold} followers")
+
+    for label, cutoff in (("push only", float("inf")), (f"hybrid (threshold {threshold})", threshold)):
+        cleanup()
+        writes, write_latencies = publish(user_ids, followers, posts, cutoff, seed)
+        read_latencies = read_feeds(user_ids, followers, following, readers, cutoff, seed)
+
+        print(f"[{label}] write amplification {writes / posts:.1f} timelines/post, "
+              f"fan-out p50={statistics.median(write_latencies):.2f}ms p99={percentile(write_latencies, 99):.2f}ms max={max(write_latencies):.2f}ms")
+        print(f"[{label}] feed read (2 pages) p50={statistics.median(read_latencies):.2f}ms p99={percentile(read_latencies, 99):.2f}ms")
+
+    cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--posts", type=int, default=2_000)
+    parser.add_argument("--readers", type=int, default=1_000)
+    parser.add_argument("--threshold", type=int, default=timeline.CELEBRITY_FOLLOWER_THRESHOLD)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    run(args.users, args.posts, args.readers, args.threshold, args.seed)
@@ -0,0 +1,49 @@
+import uuid
+import httpx
+
+
+USER_SERVICE_URL = "http://localhost:8000"
+
+
+def test_username_lookup_is_case_insensitive_and_unique():
+
+    username = f"Lookup_{uuid.uuid4().hex[:8]}"
+
+    availability = httpx.get(f"{USER_SERVICE_URL}/users/availability/{username}", timeout=5.0)
+
+    assert availability.status_code == 200
+    assert availability.json()["available"] is True
+
+    signup_response = httpx.post(
+        f"{USER_SERVICE_URL}/users",
+        json={
+            "username": username,
+            "email": f"{username.lower()}@example.com",
+            "password": "peterpiper123"
+        },
+        timeout=5.0
+    )
+
+    assert signup_response.status_code == 201
+    user_id = signup_response.json()["user_id"]
+
+    lookup = httpx.get(f"{USER_SERVICE_URL}/users/by-username/{username.upper()}", timeout=5.0)
+
+    assert lookup.status_code == 200
+    assert lookup.json()["user_id"] == user_id
+    assert "hashed_password" not in lookup.json()
+
+    availability = httpx.get(f"{USER_SERVICE_URL}/users/availability/{username.lower()}", timeout=5.0)
+    assert availability.json()["available"] is False
+
+    duplicate = httpx.post(
+        f"{USER_SERVICE_URL}/users",
+        json={
+            "username": username.lower(),
+            "email": f"other_{username.lower()}@example.com",
+            "password": "peterpiper123"
+        },
+        timeout=5.0
+    )
+
+    assert duplicate.status_code == 409
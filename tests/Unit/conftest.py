@@ -0,0 +1,50 @@
+import os
+import sys
+import socket
+import threading
+import time
+import pytest
+import uvicorn
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "backend", "services"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "backend", "gateway"))
+
+#no span files from the apps under test
+os.environ.setdefault("TRACE_EXPORT_PATH", "")
+
+
+#unit tests run without the compose stack, so skip waiting for the gateway
+@pytest.fixture(scope="session", autouse=True)
+def wait_for_gateway():
+    pass
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope="session")
+def serve_stub():
+    """Runs an ASGI app on a local port for the session; returns its base URL."""
+    servers = []
+
+    def serve(app) -> str:
+        port = free_port()
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        threading.Thread(target=server.run, daemon=True).start()
+
+        start = time.time()
+        while not server.started:
+            if time.time() - start > 10:
+                raise RuntimeError("Stub upstream did not start")
+            time.sleep(0.05)
+
+        servers.append(server)
+        return f"http://127.0.0.1:{port}"
+
+    yield serve
+
+    for server in servers:
+        server.should_exit = True
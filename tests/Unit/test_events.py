@@ -0,0 +1,101 @@
+import time
+import fakeredis
+import pytest
+
+from common.events import EventConsumer, PostCreated, POST_STREAM, dead_letter_stream, publish
+
+
+class FlakyHandler:
+    """Fails its first `failures` calls, then records the events it handles."""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.handled = []
+
+    def __call__(self, event):
+        if self.failures > 0:
+            self.failures -= 1
+            raise RuntimeError("handler failed")
+        self.handled.append(event.post_id)
+
+
+@pytest.fixture
+def client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def make_consumer(client, handler, consumer="c1", claim_idle_ms=20, max_deliveries=3) -> EventConsumer:
+    events = EventConsumer(client, "counters", {PostCreated: handler}, consumer=consumer, block_ms=1,
+                           claim_idle_ms=claim_idle_ms, max_deliveries=max_deliveries)
+    events.ensure_groups()
+    return events
+
+
+def created(post_id: str) -> PostCreated:
+    return PostCreated(post_id=post_id, user_id="u1", category="tech")
+
+
+def pending(client) -> int:
+    return client.xpending(POST_STREAM, "counters")["pending"]
+
+
+def test_handled_events_are_acked(client):
+    handler = FlakyHandler()
+    events = make_consumer(client, handler)
+    publish(client, created("p1"), created("p2"))
+
+    assert events.poll() == 2
+    assert handler.handled == ["p1", "p2"]
+    assert pending(client) == 0
+
+
+def test_failed_event_stays_pending_and_is_reclaimed_after_the_idle_time(client):
+    handler = FlakyHandler(failures=1)
+    first = make_consumer(client, handler)
+    publish(client, created("p1"))
+
+    first.poll()
+    assert handler.handled == [] and pending(client) == 1
+
+    #not idle long enough yet
+    second = make_consumer(client, handler, consumer="c2", claim_idle_ms=60000)
+    assert second.reclaim() == 0
+
+    time.sleep(0.05)
+    second = make_consumer(client, handler, consumer="c2")
+    assert second.reclaim() == 1
+    assert handler.handled == ["p1"]
+    assert pending(client) == 0
+
+
+def test_event_is_dead_lettered_after_max_deliveries(client):
+    handler = FlakyHandler(failures=100)
+    events = make_consumer(client, handler, max_deliveries=2)
+    publish(client, created("p1"))
+
+    events.poll()
+    time.sleep(0.05)
+    events.reclaim()
+    time.sleep(0.05)
+    events.reclaim()
+
+    dead = client.xrange(dead_letter_stream(POST_STREAM))
+    assert len(dead) == 1
+    assert dead[0][1]["type"] == "PostCreated"
+    assert dead[0][1]["group"] == "counters"
+    assert pending(client) == 0
+    assert events.stats()["dead_lettered"] == 1
+
+
+def test_event_trimmed_while_pending_is_acked_without_a_handler_call(client):
+    handler = FlakyHandler(failures=1)
+    events = make_consumer(client, handler)
+    publish(client, created("p1"))
+    events.poll()
+    message_id = client.xpending_range(POST_STREAM, "counters", min="-", max="+", count=1)[0]["message_id"]
+
+    #older Redis returns a trimmed entry from XCLAIM with no fields
+    events._handle(POST_STREAM, [(message_id, {})])
+
+    assert handler.handled == []
+    assert pending(client) == 0
@@ -0,0 +1,52 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.routes import auth
+from app.core import ratelimit
+from app.core.clients import clients
+
+
+class StubUserService:
+    """Answers /auth/verify with a fixed response."""
+
+    def __init__(self, status: int, headers: dict = None, body: dict = None):
+        self.response = httpx.Response(status, headers=headers, json=body or {"detail": "stub"})
+
+    async def post(self, path: str, **kwargs) -> httpx.Response:
+        return self.response
+
+
+@pytest.fixture
+def login(monkeypatch):
+    async def no_limit(policy, subject):
+        pass
+
+    monkeypatch.setattr(ratelimit, "enforce", no_limit)
+
+    app = FastAPI()
+    app.include_router(auth.router)
+    client = TestClient(app)
+
+    def call(stub: StubUserService) -> httpx.Response:
+        monkeypatch.setitem(clients.upstreams, "user", stub)
+        return client.post("/auth/login", json={"username": "ada", "password": "secret"})
+
+    return call
+
+
+def test_wrong_password_is_401(login):
+    assert login(StubUserService(401)).status_code == 401
+
+
+def test_hashing_overload_passes_429_and_retry_after_through(login):
+    res = login(StubUserService(429, headers={"Retry-After": "1"}))
+
+    assert res.status_code == 429
+    assert res.headers["Retry-After"] == "1"
+
+
+def test_upstream_failure_is_not_reported_as_a_bad_password(login):
+    assert login(StubUserService(500)).status_code == 503
+    assert login(StubUserService(404)).status_code == 502
@@ -0,0 +1,190 @@
+import asyncio
+import time
+import httpx
+import pytest
+from fastapi import FastAPI, Request, Response
+
+from app.core.clients import Upstream
+from app.core.resilience import DEADLINE_HEADER, CircuitBreaker, CircuitOpenError, DeadlineExceeded, RetryBudget, _deadline
+
+
+#fault injection: each test sets how the stub answers its next calls
+faults = {"fail_next": 0, "status": 503, "slow_every": 0, "delay": 0.0}
+calls = {"count": 0}
+
+stub = FastAPI()
+
+
+@stub.api_route("/items/{item_id}", methods=["GET", "POST"])
+async def item(item_id: str, request: Request):
+    calls["count"] += 1
+
+    #slow_every=n delays calls 1, n+1, 2n+1...; 0 delays them all
+    if faults["delay"] and (not faults["slow_every"] or calls["count"] % faults["slow_every"] == 1):
+        await asyncio.sleep(faults["delay"])
+
+    if faults["fail_next"] > 0:
+        faults["fail_next"] -= 1
+        return Response(status_code=faults["status"])
+
+    return {"item_id": item_id, "deadline": request.headers.get(DEADLINE_HEADER)}
+
+
+@pytest.fixture(scope="module")
+def stub_url(serve_stub):
+    return serve_stub(stub)
+
+
+@pytest.fixture(autouse=True)
+def reset_faults():
+    faults.update(fail_next=0, status=503, slow_every=0, delay=0.0)
+    calls["count"] = 0
+
+
+def run(upstream: Upstream, scenario):
+    async def main():
+        upstream.start()
+        try:
+            return await scenario()
+        finally:
+            await upstream.close()
+
+    return asyncio.run(main())
+
+
+def test_get_is_retried_on_503(stub_url):
+    upstream = Upstream("stub", stub_url, retries=1)
+    faults["fail_next"] = 1
+
+    res = run(upstream, lambda: upstream.get("/items/1"))
+
+    assert res.status_code == 200
+    assert calls["count"] == 2
+    assert upstream.stats()["retries"] == 1
+
+
+def test_post_is_never_retried(stub_url):
+    upstream = Upstream("stub", stub_url, retries=3)
+    faults["fail_next"] = 1
+
+    res = run(upstream, lambda: upstream.post("/items/1"))
+
+    assert res.status_code == 503
+    assert calls["count"] == 1
+
+
+def test_retry_budget_caps_retries(stub_url):
+    upstream = Upstream("stub", stub_url, retries=1, budget=RetryBudget(ratio=0.0, min_per_second=0.2, window=10.0))
+    faults["fail_next"] = 100
+
+    async def scenario():
+        return [await upstream.get("/items/1") for _ in range(10)]
+
+    results = run(upstream, scenario)
+
+    #10 requests, but the budget only pays for 2 retries in the window
+    assert all(res.status_code == 503 for res in results)
+    assert calls["count"] == 12
+    assert upstream.stats()["retry_budget_exhausted"] == 8
+
+
+def test_breaker_opens_then_recovers(stub_url):
+    breaker = CircuitBreaker(min_calls=5, error_rate=0.5, open_seconds=0.3, half_open_calls=1)
+    upstream = Upstream("stub", stub_url, retries=0, breaker=breaker)
+    faults.update(fail_next=5, status=500)
+
+    async def scenario():
+        for _ in range(5):
+            await upstream.get("/items/1")
+        assert breaker.state == CircuitBreaker.OPEN
+
+        #rejected locally: the stub is not called while the breaker is open
+        with pytest.raises(CircuitOpenError):
+            await upstream.get("/items/1")
+        assert calls["count"] == 5
+
+        await asyncio.sleep(0.35)
+        res = await upstream.get("/items/1")
+        assert res.status_code == 200
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    run(upstream, scenario)
+    assert upstream.stats()["breaker"]["trips"] == 1
+
+
+def test_breaker_opens_on_slow_calls(stub_url):
+    breaker = CircuitBreaker(min_calls=3, slow_call=0.05, slow_rate=0.6, open_seconds=5)
+    upstream = Upstream("stub", stub_url, retries=0, breaker=breaker)
+    faults["delay"] = 0.08
+
+    async def scenario():
+        for _ in range(3):
+            await upstream.get("/items/1")
+
+    run(upstream, scenario)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_hedged_read_beats_slow_primary(stub_url):
+    upstream = Upstream("stub", stub_url, retries=0, hedge=True, budget=RetryBudget(ratio=1.0))
+
+    async def scenario():
+        #learn a fast p95 first
+        for _ in range(60):
+            await upstream.get("/items/1")
+        #a warm-up call can itself land past the p95 once hedging kicks in at 50 samples
+        upstream.hedges = upstream.hedge_wins = 0
+
+        faults.update(slow_every=2, delay=1.0)
+        calls["count"] = 0
+        started = time.perf_counter()
+        res = await upstream.get("/items/1")
+        return res, time.perf_counter() - started
+
+    res, elapsed = run(upstream, scenario)
+
+    assert res.status_code == 200
+    assert elapsed < 0.5
+    assert upstream.stats()["hedges"] == 1
+    assert upstream.stats()["hedge_wins"] == 1
+
+
+def test_deadline_is_forwarded_and_enforced(stub_url):
+    upstream = Upstream("stub", stub_url, retries=1)
+
+    async def scenario():
+        _deadline.set(time.monotonic() + 2.0)
+        res = await upstream.get("/items/1")
+        forwarded = int(res.json()["deadline"])
+
+        faults["delay"] = 0.5
+        _deadline.set(time.monotonic() + 0.1)
+        with pytest.raises(DeadlineExceeded):
+            await upstream.get("/items/1")
+
+        return forwarded
+
+    forwarded = run(upstream, scenario)
+
+    assert 0 < forwarded <= 2000
+    #the caller gave up, not the upstream: no failure recorded against it
+    assert upstream.breaker.stats()["window_calls"] == 1
+    assert upstream.stats()["deadline_exceeded"] == 1
+
+
+def test_open_breaker_maps_to_503():
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.core.clients import clients
+
+    breaker = clients["trending"].breaker
+    breaker.state, breaker.opened_at = CircuitBreaker.OPEN, time.monotonic()
+
+    try:
+        with TestClient(app) as client:
+            res = client.get("/trending/posts")
+    finally:
+        breaker.state = CircuitBreaker.CLOSED
+
+    assert res.status_code == 503
+    assert int(res.headers["retry-after"]) >= 1
@@ -0,0 +1,71 @@
+import os
+import sys
+import tempfile
+import fakeredis
+import pytest
+
+POST_SERVICE = os.path.join(os.path.dirname(__file__), "..", "..", "backend", "services", "post_service")
+#db builds its engine at import; the rebuild reads rows through a stub, so it is never connected
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.gettempdir()}/test_leaderboard.db")
+
+#user_service's db and models may already be imported under the same names; load post_service's beside them
+shadowed = {name: sys.modules.pop(name) for name in ("db", "models") if name in sys.modules}
+sys.path.insert(0, POST_SERVICE)
+try:
+    import leaderboard  # noqa: E402
+finally:
+    sys.path.remove(POST_SERVICE)
+    for name in ("db", "models"):
+        sys.modules.pop(name, None)
+    sys.modules.update(shadowed)
+
+from leaderboard import GLOBAL_LEADERBOARD_KEY, add_post, leaderboard_key, rebuild_leaderboards, record_score_change  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def redis_client(monkeypatch):
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(leaderboard, "redis_client", client)
+    return client
+
+
+@pytest.fixture
+def posts(monkeypatch):
+    rows = []
+    monkeypatch.setattr(leaderboard, "iter_post_scores", lambda session, batch_size: iter(list(rows)))
+    return rows
+
+
+def test_reactions_applied_out_of_order_keep_every_change(redis_client):
+    add_post("p1", "Food")
+    #two likes and a dislike whose writes reach Redis in a different order than they committed
+    for delta in (-1, 1, 1):
+        record_score_change("p1", "Food", delta)
+    add_post("p1", "Food")
+
+    assert redis_client.zscore(GLOBAL_LEADERBOARD_KEY, "p1") == 1
+    assert redis_client.zscore(leaderboard_key("Food"), "p1") == 1
+
+
+def test_rebuild_replaces_drifted_scores(redis_client, posts):
+    #a like whose ZINCRBY was lost while Redis was unreachable, and a post deleted since
+    redis_client.zadd(GLOBAL_LEADERBOARD_KEY, {"p1": 2, "gone": 9})
+    redis_client.zadd(leaderboard_key("Travel"), {"gone": 9})
+    posts.extend([("p1", "Food", 3), ("p2", "Food", 1)])
+
+    rebuild_leaderboards(session=None)
+
+    assert redis_client.zrevrange(GLOBAL_LEADERBOARD_KEY, 0, -1, withscores=True) == [("p1", 3), ("p2", 1)]
+    assert redis_client.zrevrange(leaderboard_key("Food"), 0, -1) == ["p1", "p2"]
+    assert not redis_client.exists(leaderboard_key("Travel"))
+    assert redis_client.ttl(GLOBAL_LEADERBOARD_KEY) == -1
+    assert not redis_client.keys("*:rebuild:*")
+
+
+def test_startup_rebuild_leaves_existing_boards_alone(redis_client, posts):
+    redis_client.zadd(GLOBAL_LEADERBOARD_KEY, {"p1": 5})
+    posts.append(("p1", "Food", 3))
+
+    rebuild_leaderboards(session=None, if_missing=True)
+
+    assert redis_client.zscore(GLOBAL_LEADERBOARD_KEY, "p1") == 5
@@ -0,0 +1,99 @@
+import asyncio
+import atexit
+import json
+import logging
+import threading
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from common.log_setup import configure_logging, parse_sample_rates
+from common.tracing import TracingMiddleware
+
+logger = logging.getLogger("test_log_setup")
+
+app = FastAPI()
+app.add_middleware(TracingMiddleware, sample_rate=0.0)
+
+
+class Formatted:
+    """Records which thread turned it into text."""
+
+    threads = []
+
+    def __str__(self):
+        Formatted.threads.append(threading.current_thread().name)
+        return "formatted"
+
+
+@app.get("/posts/{post_id}")
+async def get_post(post_id: str):
+    logger.info("Retrieved post %s", post_id)
+    return {}
+
+
+@app.get("/posts/{post_id}/slow")
+async def get_slow_post(post_id: str):
+    logger.info("Retrieved slow post %s", Formatted())
+    logger.warning("Slow post %s", post_id)
+    return {}
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    path = tmp_path / "service.log"
+
+    listener = configure_logging("test_service", sample_rates={"GET /posts/{post_id}": 0.0}, path=str(path))
+
+    def read() -> list[dict]:
+        listener.stop()
+        atexit.unregister(listener.stop)
+        return [json.loads(line) for line in path.read_text().splitlines()]
+
+    yield read
+
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def get(*paths: str):
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://service") as client:
+            for path in paths:
+                await client.get(path)
+
+    asyncio.run(scenario())
+
+
+def test_sampled_routes_drop_info_but_keep_warnings(log_file):
+    get("/posts/1", "/posts/2", "/posts/3/slow")
+
+    messages = [entry["message"] for entry in log_file() if entry["logger"] == "test_log_setup"]
+
+    #GET /posts/{post_id} keeps none of its info records; the slow route is not sampled
+    assert messages == ["Retrieved slow post formatted", "Slow post 3"]
+
+
+def test_records_are_json_with_trace_ids_and_formatted_off_the_request_thread(log_file):
+    Formatted.threads.clear()
+    get("/posts/3/slow")
+
+    entry = next(entry for entry in log_file() if entry["message"] == "Slow post 3")
+
+    assert entry["service"] == "test_service"
+    assert entry["level"] == "WARNING"
+    assert len(entry["trace_id"]) == 32
+    #the writer thread builds the message (pytest's own capture handler formats it on the main thread too)
+    assert any(name != threading.main_thread().name for name in Formatted.threads)
+
+
+def test_sample_rates_parse_from_env_format():
+    assert parse_sample_rates("GET /posts/{post_id}=0.01, GET /users/{user_id}/feed=0.1,") == {
+        "GET /posts/{post_id}": 0.01,
+        "GET /users/{user_id}/feed": 0.1,
+    }
@@ -0,0 +1,70 @@
+import asyncio
+import httpx
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from common.metrics import (DB_CHECKOUT_WAIT, DB_CONNECTIONS_IN_USE, HTTP_REQUESTS, UPSTREAM_LATENCY, Histogram,
+                            add_metrics, instrument_client, instrument_engine)
+
+
+app = FastAPI()
+add_metrics(app)
+
+
+@app.get("/things/{thing_id}")
+def get_thing(thing_id: str):
+    if thing_id == "missing":
+        raise HTTPException(status_code=404, detail="Thing not found")
+    return {"thing_id": thing_id}
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_seconds", "Test.", ("route",), buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(seconds, "/a")
+
+    lines = histogram.render()
+
+    assert 'test_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{route="/a",le="1.0"} 3' in lines
+    assert 'test_seconds_bucket{route="/a",le="+Inf"} 4' in lines
+    assert 'test_seconds_count{route="/a"} 4' in lines
+    assert lines[:2] == ["# HELP test_seconds Test.", "# TYPE test_seconds histogram"]
+
+
+def test_requests_are_labelled_by_route_template():
+    client = TestClient(app)
+    client.get("/things/1")
+    client.get("/things/2")
+    client.get("/things/missing")
+
+    assert HTTP_REQUESTS._series[("GET", "/things/{thing_id}", 200)] == 2
+    assert HTTP_REQUESTS._series[("GET", "/things/{thing_id}", 404)] == 1
+
+    res = client.get("/metrics")
+    assert res.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'http_request_duration_seconds_count{method="GET",route="/things/{thing_id}"} 3' in res.text
+
+
+def test_engine_checkouts_are_timed():
+    engine = create_engine("sqlite://")
+    instrument_engine(engine, "scratch")
+
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+        assert DB_CONNECTIONS_IN_USE._series[("scratch",)] == 1
+
+    assert DB_CONNECTIONS_IN_USE._series[("scratch",)] == 0
+    assert sum(DB_CHECKOUT_WAIT._series[("scratch",)][:-1]) == 1
+
+
+def test_outbound_calls_are_timed_by_upstream():
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with instrument_client(httpx.AsyncClient(transport=transport, base_url="http://things"), "things") as client:
+            await client.get("/things/1")
+
+    asyncio.run(scenario())
+
+    assert sum(UPSTREAM_LATENCY._series[("things", "GET", 200)][:-1]) == 1
@@ -0,0 +1,72 @@
+import fakeredis
+import pytest
+import redis
+from sqlalchemy import create_engine
+from sqlmodel import Session
+
+from common.events import POST_STREAM, PostCreated, decode
+from common.outbox import OutboxRecord, OutboxRelay, add_events
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'outbox.db'}")
+    OutboxRecord.__table__.create(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def created(post_id: str) -> PostCreated:
+    return PostCreated(post_id=post_id, user_id="u1", category="tech")
+
+
+def write(engine, *events, commit: bool = True):
+    with Session(engine) as session:
+        add_events(session, *events)
+        if commit:
+            session.commit()
+        else:
+            session.rollback()
+
+
+def test_committed_events_are_published_in_order_and_deleted(engine, server):
+    client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    relay = OutboxRelay(engine, client, batch_size=10)
+    write(engine, created("p1"), created("p2"))
+
+    assert relay.relay_once() == 2
+
+    published = [decode(fields).post_id for _, fields in client.xrange(POST_STREAM)]
+    assert published == ["p1", "p2"]
+    assert relay.backlog() == 0
+    assert relay.stats()["relayed"] == 2
+
+
+def test_rolled_back_transaction_publishes_nothing(engine, server):
+    client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    relay = OutboxRelay(engine, client)
+    write(engine, created("p1"), commit=False)
+
+    assert relay.relay_once() == 0
+    assert client.xlen(POST_STREAM) == 0
+
+
+def test_rows_stay_in_the_outbox_while_redis_is_down(engine, server):
+    client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    relay = OutboxRelay(engine, client)
+    write(engine, created("p1"))
+
+    server.connected = False
+    with pytest.raises(redis.ConnectionError):
+        relay.relay_once()
+    assert relay.backlog() == 1
+
+    server.connected = True
+    assert relay.relay_once() == 1
+    assert relay.backlog() == 0
+    assert client.xlen(POST_STREAM) == 1
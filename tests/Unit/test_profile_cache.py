@@ -0,0 +1,43 @@
+import os
+import sys
+import fakeredis
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "..", "backend", "services", "user_service"))
+
+from cache import ProfileCache  # noqa: E402
+
+
+@pytest.fixture
+def cache():
+    return ProfileCache(fakeredis.FakeRedis(decode_responses=True))
+
+
+def test_loaded_profiles_are_cached(cache):
+    loads = []
+
+    def loader(user_id):
+        loads.append(user_id)
+        return {"user_id": user_id, "full_name": "Ada"}
+
+    cache.get("u1", loader)
+    cache.get("u1", loader)
+
+    assert loads == ["u1"]
+    assert cache.client.get(cache.key("u1")) is not None
+
+
+def test_load_racing_an_update_does_not_cache_the_old_row(cache):
+    row = {"full_name": "Ada"}
+
+    def slow_loader(user_id):
+        old = {"user_id": user_id, **row}
+        #the update commits and invalidates after the row was read, before it is cached
+        row["full_name"] = "Ada Lovelace"
+        cache.invalidate(user_id)
+        return old
+
+    assert cache.get("u1", slow_loader)["full_name"] == "Ada"
+
+    assert cache.client.get(cache.key("u1")) is None
+    assert cache.get("u1", lambda user_id: {"user_id": user_id, **row})["full_name"] == "Ada Lovelace"
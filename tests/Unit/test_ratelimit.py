@@ -0,0 +1,82 @@
+import asyncio
+import ipaddress
+import fakeredis
+import pytest
+from starlette.requests import Request
+
+from app.core import ratelimit
+from app.core.ratelimit import RateLimiter, RatePolicy, client_ip
+
+
+def request(headers: dict, client=("203.0.113.7", 5000)) -> Request:
+    return Request({
+        "type": "http",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+        "client": client,
+    })
+
+
+@pytest.fixture
+def trust_proxy(monkeypatch):
+    monkeypatch.setattr(ratelimit, "TRUSTED_PROXIES", [ipaddress.ip_network("10.0.0.0/8")])
+
+
+def test_direct_clients_cannot_pick_their_bucket_with_headers():
+    spoofed = request({"X-Real-IP": "1.1.1.1", "X-Forwarded-For": "2.2.2.2, 3.3.3.3"})
+
+    assert client_ip(spoofed) == "203.0.113.7"
+
+
+def test_forwarded_for_is_read_from_the_right_behind_a_trusted_proxy(trust_proxy):
+    #the client prepended 1.1.1.1 itself; the proxy appended the address it saw
+    first = client_ip(request({"X-Forwarded-For": "1.1.1.1, 198.51.100.4"}, client=("10.0.0.2", 80)))
+    second = client_ip(request({"X-Forwarded-For": "2.2.2.2, 198.51.100.4"}, client=("10.0.0.2", 80)))
+
+    assert first == second == "198.51.100.4"
+
+
+def test_real_ip_from_a_trusted_proxy_and_the_peer_as_fallback(trust_proxy):
+    assert client_ip(request({"X-Real-IP": "198.51.100.4"}, client=("10.0.0.2", 80))) == "198.51.100.4"
+    assert client_ip(request({}, client=("10.0.0.2", 80))) == "10.0.0.2"
+    assert client_ip(request({}, client=None)) == "unknown"
+
+
+def limiter(server=None) -> RateLimiter:
+    return RateLimiter(fakeredis.FakeAsyncRedis(server=server or fakeredis.FakeServer(), decode_responses=True))
+
+
+def test_leased_tokens_are_spent_without_going_to_redis():
+    rate_limiter = limiter()
+    policy = RatePolicy("test", rate=1, burst=10, lease=5)
+
+    async def scenario():
+        return [await rate_limiter.acquire(policy, "ip:a") for _ in range(5)]
+
+    assert asyncio.run(scenario()) == [0] * 5
+    assert rate_limiter.stats()["redis_calls"] == 1
+    assert rate_limiter.stats()["local"] == 4
+
+
+def test_denials_are_cached_until_the_bucket_refills():
+    rate_limiter = limiter()
+    policy = RatePolicy("test", rate=0.1, burst=1, lease=1)
+
+    async def scenario():
+        return [await rate_limiter.acquire(policy, "ip:a") for _ in range(3)]
+
+    allowed, denied, denied_again = asyncio.run(scenario())
+
+    assert allowed == 0
+    assert 0 < denied_again <= denied <= 10
+    #the third call was answered from the local block, not Redis
+    assert rate_limiter.stats()["redis_calls"] == 2
+    assert rate_limiter.stats()["denied"] == 2
+
+
+def test_fails_open_when_redis_is_down():
+    server = fakeredis.FakeServer()
+    server.connected = False
+    rate_limiter = limiter(server)
+
+    assert asyncio.run(rate_limiter.acquire(RatePolicy("test", rate=1, burst=1, lease=1), "ip:a")) == 0
+    assert rate_limiter.stats()["errors"] == 1
@@ -0,0 +1,164 @@
+import asyncio
+import fakeredis
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from app.core import cache
+from app.core.cache import ResponseCache, cached_get
+from common.http_cache import ETagMiddleware
+
+
+def user_service(state: dict, during=None) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(ETagMiddleware, rules=[(r"^/users/[^/]+$", 60)])
+
+    @app.get("/users/{user_id}")
+    def get_user(user_id: str):
+        state["calls"] += 1
+        user = {"user_id": user_id, "full_name": state["name"]}
+        if during:
+            during()
+        return user
+
+    @app.get("/users/{user_id}/sessions")
+    def list_sessions(user_id: str):
+        return []
+
+    return app
+
+
+@pytest.fixture
+def state():
+    return {"name": "Ada", "calls": 0}
+
+
+@pytest.fixture
+def response_cache(monkeypatch):
+    response_cache = ResponseCache(client=fakeredis.FakeRedis(decode_responses=True))
+    monkeypatch.setattr(cache, "response_cache", response_cache)
+    return response_cache
+
+
+def serve_from(monkeypatch, app: FastAPI):
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://user")
+    monkeypatch.setattr(cache, "clients", {"user": client})
+
+
+def request(path: str, headers: dict = None) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "query_string": b"",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+    })
+
+
+def get(path: str, headers: dict = None):
+    return asyncio.run(cached_get(request(path, headers), "user", path))
+
+
+def test_etags_and_shared_max_age_on_matching_gets(state):
+    client = TestClient(user_service(state))
+
+    res = client.get("/users/u1")
+    assert res.headers["etag"] and "s-maxage=60" in res.headers["cache-control"]
+
+    assert client.get("/users/u1", headers={"If-None-Match": res.headers["etag"]}).status_code == 304
+    assert "etag" not in client.get("/users/u1/sessions").headers
+
+
+def test_fresh_entries_are_served_without_the_upstream(monkeypatch, state, response_cache):
+    serve_from(monkeypatch, user_service(state))
+
+    first, second = get("/users/u1"), get("/users/u1")
+
+    assert first.body == second.body
+    assert state["calls"] == 1
+    assert response_cache.stats()["hits"] == 1
+
+
+def test_matching_if_none_match_is_answered_with_304(monkeypatch, state, response_cache):
+    serve_from(monkeypatch, user_service(state))
+    etag = get("/users/u1").headers["etag"]
+
+    res = get("/users/u1", headers={"If-None-Match": etag})
+
+    assert res.status_code == 304 and not res.body
+    assert state["calls"] == 1
+
+
+def test_stale_entries_are_revalidated(monkeypatch, state, response_cache):
+    serve_from(monkeypatch, user_service(state))
+    body = get("/users/u1").body
+    response_cache.get("/users/u1").expires = 0
+
+    res = get("/users/u1")
+
+    assert res.body == body
+    assert state["calls"] == 2
+    assert response_cache.stats()["revalidated"] == 1
+    assert response_cache.get("/users/u1").expires > 0
+
+
+def test_invalidated_paths_are_fetched_again(monkeypatch, state, response_cache):
+    serve_from(monkeypatch, user_service(state))
+    get("/users/u1")
+
+    state["name"] = "Ada Lovelace"
+    response_cache.invalidate("/users/u1")
+
+    assert b"Ada Lovelace" in get("/users/u1").body
+    assert state["calls"] == 2
+
+
+def test_least_recently_used_entries_are_evicted(monkeypatch, state, response_cache):
+    response_cache.max_entries = 2
+    serve_from(monkeypatch, user_service(state))
+
+    get("/users/u1")
+    get("/users/u2")
+    get("/users/u1")
+    get("/users/u3")
+
+    assert response_cache.get("/users/u2") is None
+    assert response_cache.get("/users/u1") is not None
+    assert response_cache.stats()["evictions"] == 1
+
+
+def test_a_fill_racing_an_invalidation_is_not_stored(monkeypatch, state, response_cache):
+    def update():
+        #the change commits and its invalidation arrives while the old body is on its way back
+        state["name"] = "Ada Lovelace"
+        response_cache.invalidate("/users/u1")
+
+    serve_from(monkeypatch, user_service(state, during=update))
+
+    assert b'"Ada"' in get("/users/u1").body
+    assert response_cache.get("/users/u1") is None
+    assert response_cache.stats()["stale_fills"] == 1
+
+
+def test_unrelated_invalidations_do_not_void_a_fill(monkeypatch, state, response_cache):
+    serve_from(monkeypatch, user_service(state, during=lambda: response_cache.invalidate("/users/u2")))
+
+    get("/users/u1")
+
+    assert response_cache.get("/users/u1") is not None
+
+
+def test_fills_older_than_the_invalidation_log_are_refused(monkeypatch, state):
+    response_cache = ResponseCache(client=fakeredis.FakeRedis(decode_responses=True), invalidation_log=1)
+    monkeypatch.setattr(cache, "response_cache", response_cache)
+
+    def churn():
+        response_cache.invalidate("/users/u2")
+        response_cache.invalidate("/users/u3")
+
+    serve_from(monkeypatch, user_service(state, during=churn))
+    get("/users/u1")
+
+    assert response_cache.get("/users/u1") is None
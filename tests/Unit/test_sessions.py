@@ -0,0 +1,50 @@
+import asyncio
+import fakeredis
+import pytest
+
+from app.core.sessions import RefreshTokenReused, SessionStore
+from common.sessions import successor_key
+
+USER = {"user_id": "u1", "username": "ada", "active": True}
+
+
+@pytest.fixture
+def store():
+    return SessionStore(fakeredis.FakeAsyncRedis(decode_responses=True))
+
+
+def test_rotation_issues_a_new_token_and_retires_the_old(store):
+    async def scenario():
+        token = await store.create(USER)
+        user, rotated = await store.rotate(token)
+        assert user == USER
+        assert rotated != token
+        assert (await store.rotate(rotated))[0] == USER
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_refreshes_within_the_grace_window_share_the_successor(store):
+    async def scenario():
+        token = await store.create(USER)
+        first, second = await asyncio.gather(store.rotate(token), store.rotate(token))
+
+        assert first[1] == second[1]
+        #the session is still alive
+        assert (await store.rotate(first[1]))[0] == USER
+
+    asyncio.run(scenario())
+
+
+def test_reuse_after_the_grace_window_revokes_the_session(store):
+    async def scenario():
+        token = await store.create(USER)
+        _, rotated = await store.rotate(token)
+        #the grace window lapses
+        await store.client.delete(successor_key(token))
+
+        with pytest.raises(RefreshTokenReused):
+            await store.rotate(token)
+        assert await store.rotate(rotated) is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,47 @@
+import os
+import sys
+import fakeredis
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "..", "backend", "services", "post_service"))
+
+import timeline  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def redis_client(monkeypatch):
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(timeline, "redis_client", client)
+    return client
+
+
+def read_all(user_id: str, celebrity_ids: list[str], limit: int) -> list[str]:
+    post_ids, cursor = timeline.merge_feed(user_id, celebrity_ids, None, limit)
+    while cursor is not None:
+        page, cursor = timeline.merge_feed(user_id, celebrity_ids, cursor, limit)
+        post_ids += page
+    return post_ids
+
+
+def test_posts_sharing_a_millisecond_are_not_skipped_across_pages(redis_client):
+    #a fan-out and a celebrity pull landing in the same ms, straddling the page edge
+    redis_client.zadd(timeline.timeline_key("reader"), {"p1": 1000, "p2": 1000, "p5": 900})
+    redis_client.zadd(timeline.author_posts_key("celebrity"), {"p3": 1000, "p4": 1000})
+
+    post_ids = read_all("reader", ["celebrity"], limit=2)
+
+    assert post_ids == ["p4", "p3", "p2", "p1", "p5"]
+
+
+def test_cursor_names_the_last_post_on_the_page(redis_client):
+    redis_client.zadd(timeline.timeline_key("reader"), {"p1": 1000, "p2": 2000, "p3": 3000})
+
+    post_ids, cursor = timeline.merge_feed("reader", [], None, 2)
+
+    assert post_ids == ["p3", "p2"]
+    assert cursor == "2000:p2"
+
+
+def test_malformed_cursor_is_rejected():
+    with pytest.raises(ValueError):
+        timeline.merge_feed("reader", [], "yesterday", 20)
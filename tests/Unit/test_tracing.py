@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import fakeredis
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+from sqlalchemy import create_engine, text
+
+from common import tracing
+from common.tracing import TRACEPARENT, Span, TracingMiddleware, trace_client, trace_engine, trace_redis
+
+
+@pytest.fixture
+def spans(monkeypatch):
+    exported = []
+    monkeypatch.setattr(tracing.exporter, "export", lambda span, duration_ms: exported.append(span))
+    return exported
+
+
+@pytest.fixture
+def sampled_request():
+    token = tracing._current.set(Span(tracing._new_trace_id(), None, "GET /test", "server", True))
+    yield tracing._current.get()
+    tracing._current.reset(token)
+
+
+downstream = FastAPI()
+downstream.add_middleware(TracingMiddleware, sample_rate=0.0)
+
+
+@downstream.get("/echo")
+async def echo(request: Request):
+    logging.getLogger("downstream").info("handling echo")
+    return {"traceparent": request.headers.get(TRACEPARENT)}
+
+
+def make_gateway(sample_rate: float) -> FastAPI:
+    gateway = FastAPI()
+    gateway.add_middleware(TracingMiddleware, sample_rate=sample_rate)
+
+    @gateway.get("/proxy")
+    async def proxy():
+        client = trace_client(httpx.AsyncClient(transport=httpx.ASGITransport(app=downstream), base_url="http://downstream"))
+        async with client:
+            return (await client.get("/echo")).json()
+
+    return gateway
+
+
+def call(app: FastAPI, **headers) -> httpx.Response:
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://gateway") as client:
+            return await client.get("/proxy", headers=headers)
+
+    return asyncio.run(scenario())
+
+
+def test_trace_is_propagated_downstream(spans):
+    res = call(make_gateway(sample_rate=1.0))
+
+    trace_id = res.headers["X-Trace-Id"]
+    assert res.json()["traceparent"].startswith(f"00-{trace_id}-")
+    assert res.json()["traceparent"].endswith("-01")
+
+    #the downstream sampled because its caller did, despite its own rate of 0
+    by_name = {span.name: span for span in spans}
+    assert set(by_name) == {"GET /echo", "GET downstream", "GET /proxy"}
+    assert {span.trace_id for span in spans} == {trace_id}
+    assert by_name["GET /echo"].parent_id == by_name["GET downstream"].span_id
+    assert by_name["GET downstream"].parent_id == by_name["GET /proxy"].span_id
+
+
+def test_incoming_traceparent_is_continued(spans):
+    trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+    res = call(make_gateway(sample_rate=0.0), traceparent=f"00-{trace_id}-00f067aa0ba902b7-01")
+
+    assert res.headers["X-Trace-Id"] == trace_id
+    assert next(span for span in spans if span.name == "GET /proxy").parent_id == "00f067aa0ba902b7"
+
+
+def test_unsampled_requests_record_no_spans(spans):
+    res = call(make_gateway(sample_rate=0.0))
+
+    #the trace id still goes downstream, for logs, with the sampled flag off
+    assert spans == []
+    assert res.json()["traceparent"].startswith(f"00-{res.headers['X-Trace-Id']}-")
+    assert res.json()["traceparent"].endswith("-00")
+
+
+def test_queries_and_redis_calls_get_spans(spans, sampled_request):
+    engine = create_engine("sqlite://")
+    trace_engine(engine, "scratch")
+    client = trace_redis(fakeredis.FakeRedis())
+
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+    client.set("key", "value")
+    pipe = client.pipeline()
+    pipe.get("key")
+    pipe.get("key")
+    pipe.execute()
+
+    assert [span.name for span in spans] == ["db.query", "redis SET", "redis PIPELINE"]
+    assert spans[0].attributes["db.statement"] == "SELECT 1"
+    assert spans[2].attributes["redis.commands"] == 2
+    assert all(span.parent_id == sampled_request.span_id for span in spans)
+
+
+def test_log_records_carry_the_trace_id(sampled_request):
+    record = logging.getLogger("test").makeRecord("test", logging.INFO, __file__, 1, "message", (), None)
+
+    assert record.trace_id == sampled_request.trace_id